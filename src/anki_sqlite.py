@@ -0,0 +1,102 @@
+from absl import logging
+from typing import Dict, Text, Tuple
+import json
+import os
+import sqlite3
+import urllib.parse
+
+from src import headword_index as headword_index_lib
+
+
+def _unicase(a: Text, b: Text) -> int:
+    # The newer schema's name indexes use this collation, which Anki's backend
+    # registers; sqlite refuses to query those tables without it.
+    a, b = a.casefold(), b.casefold()
+    return (a > b) - (a < b)
+
+
+class SqliteAnkiReader():
+    """
+    A read-only AnkiReader which opens the collection's SQLite file directly,
+    instead of through anki.collection.Collection. This skips loading the Anki
+    backend and doesn't take the collection lock, at the cost of not seeing
+    changes made after it was opened until refresh() is called.
+
+    The collection is opened immutable, so it must not be written to, e.g. by
+    a running Anki, while it is being read. Both the older schema, where note
+    types and decks are JSON in the `col` table, and the newer one, where they
+    have their own tables, are understood.
+    """
+
+    def __init__(self, collection_path: Text):
+        self._uri = "file:{}?immutable=1".format(
+            urllib.parse.quote(os.path.abspath(collection_path)))
+        self._index = headword_index_lib.HeadwordIndex()
+        self.refresh()
+
+    def close(self):
+        self._index = None
+
+    @staticmethod
+    def _has_table(conn: sqlite3.Connection, name: Text) -> bool:
+        return conn.execute(
+            "select 1 from sqlite_master where type = 'table' and name = ?",
+            (name,)).fetchone() is not None
+
+    @staticmethod
+    def _note_types(conn: sqlite3.Connection
+                    ) -> Dict[int, Tuple[Text, Dict[Text, int]]]:
+        # Note type id => (its name, field name => ordinal).
+        if SqliteAnkiReader._has_table(conn, "notetypes"):
+            note_types = {ntid: (name, {}) for ntid, name in conn.execute(
+                "select id, name from notetypes")}
+            for ntid, name, field_ord in conn.execute(
+                    "select ntid, name, ord from fields"):
+                note_types[ntid][1][name] = field_ord
+            return note_types
+        (models,) = conn.execute("select models from col").fetchone()
+        return {int(mid): (model["name"],
+                           {f["name"]: f["ord"] for f in model["flds"]})
+                for mid, model in json.loads(models).items()}
+
+    @staticmethod
+    def _deck_names(conn: sqlite3.Connection) -> Dict[int, Text]:
+        if SqliteAnkiReader._has_table(conn, "decks"):
+            # The newer schema separates deck name components with \x1f.
+            return {did: name.replace("\x1f", "::")
+                    for did, name in conn.execute("select id, name from decks")}
+        (decks,) = conn.execute("select decks from col").fetchone()
+        return {int(did): deck["name"]
+                for did, deck in json.loads(decks).items()}
+
+    def refresh(self):
+        """Re-reads the collection."""
+        index = headword_index_lib.HeadwordIndex()
+        conn = sqlite3.connect(self._uri, uri=True)
+        conn.create_collation("unicase", _unicase)
+        try:
+            note_types = self._note_types(conn)
+            deck_names = self._deck_names(conn)
+            for mid, flds, did, card_type in conn.execute(
+                    "select n.mid, n.flds, c.did, c.type "
+                    "from cards c join notes n on c.nid = n.id"):
+                headword_index_lib.AddToIndex(
+                    index, *note_types.get(mid, ("", {})), flds,
+                    deck_names.get(did, ""), card_type)
+        finally:
+            conn.close()
+        logging.info(f"Indexed {len(index)} headwords.")
+        self._index = index
+
+    def snapshot(self) -> headword_index_lib.HeadwordIndex:
+        """Every headword's decks, card types and fields, as last read."""
+        return self._index
+
+    def listening_v1_contains(self, headword: Text) -> bool:
+        return self._index.in_deck(headword, "zw::listening_v1")
+
+    def vocab_v1_contains(self, headword: Text) -> bool:
+        return self._index.in_deck(headword, "zw::vocab_v1")
+
+    def get_type(self, headword: Text) -> headword_index_lib.CardType:
+        return self._index.get_type(headword)
@@ -0,0 +1,75 @@
+from src import anki_sqlite as anki_sqlite_lib
+from src import anki_testing
+from src import anki_utils as anki_utils_lib
+
+import genanki
+import os
+import sqlite3
+import tempfile
+import zipfile
+from absl.testing import absltest
+
+_MODEL = genanki.Model(
+    1234, "zw", fields=[{"name": "pinyin"}, {"name": "characters"}],
+    templates=[{"name": "forwards", "qfmt": "{{characters}}", "afmt": "x"},
+               {"name": "backwards", "qfmt": "{{pinyin}}", "afmt": "x"}])
+
+
+def _make_legacy_collection(directory):
+    # genanki writes the older schema, with note types and decks in `col`.
+    decks = [genanki.Deck(1, "zw::vocab_v1"),
+             genanki.Deck(2, "zw::listening_v1::sub")]
+    for deck, headword in [(0, "感冒"), (1, "黑"), (0, "进行")]:
+        decks[deck].add_note(genanki.Note(_MODEL, ["pinyin", headword]))
+    apkg = os.path.join(directory, "test.apkg")
+    genanki.Package(decks).write_to_file(apkg)
+    with zipfile.ZipFile(apkg) as z:
+        path = z.extract("collection.anki2", directory)
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "update cards set type = 2 where nid in (select id from notes where "
+        "flds like '%黑')")
+    conn.execute(
+        "update cards set type = 2 where ord = 0 and nid in "
+        "(select id from notes where flds like '%进行')")
+    conn.commit()
+    conn.close()
+    return path
+
+
+class SqliteAnkiReaderTest(absltest.TestCase):
+
+    def _check(self, reader):
+        self.assertTrue(reader.vocab_v1_contains("感冒"))
+        self.assertFalse(reader.vocab_v1_contains("黑"))
+        self.assertTrue(reader.listening_v1_contains("黑"))
+        self.assertFalse(reader.listening_v1_contains("感冒"))
+        self.assertEqual(reader.get_type("感冒"), anki_utils_lib.CardType.New)
+        self.assertEqual(reader.get_type("进行"), anki_utils_lib.CardType.New)
+        self.assertEqual(reader.get_type("黑"), anki_utils_lib.CardType.Mature)
+        self.assertEqual(reader.get_type("白"), anki_utils_lib.CardType.Absent)
+        snapshot = reader.snapshot()
+        self.assertIn("黑", snapshot)
+        self.assertEqual(snapshot.decks("黑"), {"zw::listening_v1::sub"})
+        self.assertEqual(snapshot.note("zw", "黑"),
+                         ({"pinyin": "pinyin"}, {"zw::listening_v1::sub"}))
+        self.assertIsNone(snapshot.note("model_zw_vocab_v2", "黑"))
+
+    def test_legacy_schema(self):
+        with tempfile.TemporaryDirectory() as d:
+            reader = anki_sqlite_lib.SqliteAnkiReader(
+                _make_legacy_collection(d))
+            self._check(reader)
+            reader.close()
+
+    def test_current_schema(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "collection.anki2")
+            anki_testing.MakeCollection(path)
+            reader = anki_sqlite_lib.SqliteAnkiReader(path)
+            self._check(reader)
+            reader.close()
+
+
+if __name__ == "__main__":
+    absltest.main()
@@ -0,0 +1,34 @@
+from anki.collection import Collection
+from typing import Text
+
+
+def MakeCollection(path: Text):
+    # A collection with two decks and a note type with a `characters` field.
+    col = Collection(path)
+    mm = col.models
+    model = mm.new("zw")
+    for name in ["characters", "pinyin"]:
+        mm.add_field(model, mm.new_field(name))
+    for name, front, back in [("forwards", "characters", "pinyin"),
+                              ("backwards", "pinyin", "characters")]:
+        template = mm.new_template(name)
+        template["qfmt"] = f"{{{{{front}}}}}"
+        template["afmt"] = f"{{{{{back}}}}}"
+        mm.add_template(model, template)
+    mm.add(model)
+    model = mm.by_name("zw")
+    for headword, deck in [("感冒", "zw::vocab_v1"),
+                           ("黑", "zw::listening_v1::sub"),
+                           ("进行", "zw::vocab_v1")]:
+        note = col.new_note(model)
+        note["characters"] = headword
+        note["pinyin"] = "pinyin"
+        col.add_note(note, col.decks.id(deck))
+    # One review card for 进行, so its minimum type is still New.
+    card_id = col.find_cards("characters:进行")[0]
+    col.db.execute("update cards set type = 2 where id = ?", card_id)
+    # Both review cards for 黑.
+    col.db.execute(
+        "update cards set type = 2 where nid in (select id from notes where "
+        "flds like '黑%')")
+    col.close()
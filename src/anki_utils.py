@@ -1,14 +1,26 @@
-import networkx as nx
-from anki.collection import Collection
 from absl import logging
-from enum import Enum, auto
-from typing import Text, Mapping, List
-import genanki
+from concurrent import futures
+from typing import TYPE_CHECKING, Dict, Text, Mapping, List, Optional, Tuple
+import functools
+import hashlib
+import json
+import os
+import re
+import threading
 
+from src import apkg_writer as apkg_writer_lib
 from src import card as card_lib
 from src import categorizer as categorizer_lib
 from src import decomposer as decomposer_lib
+from src import headword_index as headword_index_lib
 from src import hsk_utils as hsk_utils_lib
+from src import metrics as metrics_lib
+from src import pipeline as pipeline_lib
+from src import tts as tts_lib
+
+if TYPE_CHECKING:
+    # For annotations; each function imports it when called, as it's slow.
+    import genanki
 
 
 _SCRIPT = """
@@ -44,6 +56,9 @@ _CSS = """
 .night_mode font[color="grey"  ] { color: grey;   }
 """
 
+# The font files which _CSS expects to find in collection.media.
+FONT_FILES = re.findall(r'url\("([^"]+)"\)', _CSS)
+
 
 def _to_span_html(fieldname: Text):
     return f"<span id='{fieldname}'>{{{{{fieldname}}}}}</span>"
@@ -62,74 +77,137 @@ def _gen_template(idx, map_from: List[Text], map_to: List[Text]):
     }
 
 
-_VOCAB_MODEL = genanki.Model(
-    12345,
-    "model_zw_vocab_v2",
-    fields=[
-        {'name': 'characters'},
-        {'name': 'pinyin'},
-        {'name': 'meaning'},
-        {'name': 'audio'},
-    ],
-    templates=[
-        _gen_template(
-            1, ["characters", "meaning"], ["pinyin", "audio"]),
-        _gen_template(
-            2, ["characters", "pinyin", "audio"], ["meaning"]),
-        _gen_template(
-            3, ["pinyin", "audio", "meaning"], ["characters"]),
-        _gen_template(
-            4, ["characters"], ["pinyin", "meaning", "audio"]),
-    ],
-    css=_CSS)
-
-_LISTENING_V2_MODEL = genanki.Model(
-    12345,
-    "model_zw_listening_v2",
-    fields=[
-        {'name': 'audio'},
-        {'name': 'meaning'},
-        {'name': 'pinyin'},
-        {'name': 'characters'},
-    ],
-    templates=[
-        _gen_template(
-            1, ["audio"], ["characters", "pinyin", "meaning"]),
-    ],
-    css=_CSS)
-
-
-class CardType(Enum):
-    New = auto()
-    Learning = auto()
-    Mature = auto()
-    Absent = auto()
-    Other = auto()
+# Model and deck ids must be stable across runs, and distinct from each other,
+# so that re-importing a package updates the notes it previously created.
+# Model ids are shared by every collection, so they are large and random,
+# as genanki advises, lest they collide with another package's.
+_VOCAB_MODEL_ID = 1819894676
+_LISTENING_V2_MODEL_ID = 1868500883
+_DECK_ID_BASE = 1900000000
 
-    @staticmethod
-    def parse(s):
-        return {
-            0: CardType.New,
-            1: CardType.Learning,
-            2: CardType.Mature,
-        }.get(s, CardType.Other)
+
+@functools.lru_cache(maxsize=None)
+def VocabModel() -> "genanki.Model":
+    import genanki
+    return genanki.Model(
+        _VOCAB_MODEL_ID,
+        "model_zw_vocab_v2",
+        fields=[
+            {'name': 'characters'},
+            {'name': 'pinyin'},
+            {'name': 'meaning'},
+            {'name': 'audio'},
+        ],
+        templates=[
+            _gen_template(
+                1, ["characters", "meaning"], ["pinyin", "audio"]),
+            _gen_template(
+                2, ["characters", "pinyin", "audio"], ["meaning"]),
+            _gen_template(
+                3, ["pinyin", "audio", "meaning"], ["characters"]),
+            _gen_template(
+                4, ["characters"], ["pinyin", "meaning", "audio"]),
+        ],
+        css=_CSS)
+
+
+@functools.lru_cache(maxsize=None)
+def ListeningV2Model() -> "genanki.Model":
+    import genanki
+    return genanki.Model(
+        _LISTENING_V2_MODEL_ID,
+        "model_zw_listening_v2",
+        fields=[
+            {'name': 'audio'},
+            {'name': 'meaning'},
+            {'name': 'pinyin'},
+            {'name': 'characters'},
+        ],
+        templates=[
+            _gen_template(
+                1, ["audio"], ["characters", "pinyin", "meaning"]),
+        ],
+        css=_CSS)
+
+
+# Re-exported from headword_index, which the SQLite reader uses without Anki.
+CardType = headword_index_lib.CardType
+HeadwordIndex = headword_index_lib.HeadwordIndex
+SNAPSHOT_FIELDS = headword_index_lib.SNAPSHOT_FIELDS
+AddToIndex = headword_index_lib.AddToIndex
 
 
 class AnkiReader():
-    def __init__(self, collection_path: Text):
+    def __init__(self, collection_path: Text, bulk: bool = False):
+        from anki.collection import Collection
         self._collection = Collection(collection_path)
+        # If |bulk|, every query is answered from an index of the whole
+        # collection rather than by one or more searches per headword. It is
+        # built by the first query, as a build may never query at all.
+        self._bulk = bulk
+        self._index: Optional[HeadwordIndex] = None
+        self._index_lock = threading.Lock()
+
+    def close(self):
+        self._collection.close()
+
+    def refresh(self):
+        """Drops the bulk index, so that the next query reads it afresh."""
+        with self._index_lock:
+            self._index = None
+
+    def _bulk_index(self, build: bool) -> Optional[HeadwordIndex]:
+        # Builds the index if |build| and it isn't built already.
+        with self._index_lock:
+            if self._index is None and build:
+                self._index = self._build_index()
+            return self._index
+
+    def _build_index(self) -> HeadwordIndex:
+        index = HeadwordIndex()
+        note_type_by_mid = {}
+        deck_name_by_did = {}
+        for mid, flds, did, card_type in self._collection.db.execute(
+                "select n.mid, n.flds, c.did, c.type "
+                "from cards c join notes n on c.nid = n.id"):
+            if mid not in note_type_by_mid:
+                model = self._collection.models.get(mid)
+                note_type_by_mid[mid] = (
+                    model["name"],
+                    {f["name"]: f["ord"] for f in model["flds"]})
+            if did not in deck_name_by_did:
+                deck_name_by_did[did] = self._collection.decks.name(did)
+            AddToIndex(index, *note_type_by_mid[mid], flds,
+                       deck_name_by_did[did], card_type)
+        logging.info(f"Indexed {len(index)} headwords.")
+        return index
+
+    def snapshot(self) -> HeadwordIndex:
+        """Every headword's decks, card types and fields, read in bulk."""
+        return self._bulk_index(build=True)
 
     def listening_v1_contains(self, headword: Text) -> bool:
         # returns True if the headword already exists in `deck:listening`
+        index = self._bulk_index(build=self._bulk)
+        if index is not None:
+            return index.in_deck(headword, "zw::listening_v1")
         return len(self._collection.find_notes(
             f"deck:zw::listening_v1 characters:{headword}")) != 0
 
     def vocab_v1_contains(self, headword: Text) -> bool:
         # returns True if the headword already exists in `deck:zw::vocab`
+        index = self._bulk_index(build=self._bulk)
+        if index is not None:
+            return index.in_deck(headword, "zw::vocab_v1")
         return len(self._collection.find_notes(
             f"deck:zw::vocab_v1 characters:{headword}")) != 0
 
     def get_type(self, headword: Text) -> CardType:
+        index = self._bulk_index(build=self._bulk)
+        if index is not None:
+            # NB: the minimum over the cards of every note with this headword,
+            # rather than of the first note found.
+            return index.get_type(headword)
         try:
             # # This is 0 for learning cards,
             # # 1 for review cards,
@@ -145,52 +223,220 @@ class AnkiReader():
             return CardType.Absent
 
 
+def DeckId(deck: categorizer_lib.Deck) -> int:
+    return _DECK_ID_BASE + int(deck)
+
+
+def NoteGuid(headword: Text, model: "genanki.Model") -> Text:
+    # genanki derives the guid from all fields by default, so any edit to a
+    # definition would make a new note rather than update the old one.
+    import genanki
+    return genanki.guid_for(headword, model.name)
+
+
+class DeltaManifest():
+    """
+    Remembers what was last emitted for each note guid, so that a delta package
+    only contains notes which are new or whose fields or deck changed.
+    """
+
+    def __init__(self, path: Optional[Text] = None):
+        self._path = path
+        self._hashes: Dict[Text, Text] = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self._hashes = json.load(f)
+
+    @staticmethod
+    def _hash(deck_id: int, fields: List[Text]) -> Text:
+        return hashlib.sha256(
+            "\x1f".join([str(deck_id)] + fields).encode("utf-8")).hexdigest()
+
+    def changed(self, guid: Text, deck_id: int, fields: List[Text]) -> bool:
+        return self._hashes.get(guid) != self._hash(deck_id, fields)
+
+    def record(self, guid: Text, deck_id: int, fields: List[Text]):
+        self._hashes[guid] = self._hash(deck_id, fields)
+
+    def save(self):
+        if not self._path:
+            return
+        tmp = f"{self._path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._hashes, f, ensure_ascii=False, sort_keys=True)
+        os.replace(tmp, self._path)
+
+
 class AnkiBuilder():
     def __init__(self,
                  audio_dir: Text,
                  categorizer: categorizer_lib.Categorizer,
                  pleco_cards: Mapping[Text,
-                                      card_lib.Card]):
+                                      card_lib.Card],
+                 tts_pool: Optional[tts_lib.RenderPool] = None,
+                 delta_manifest: Optional[DeltaManifest] = None,
+                 package_writer: Optional[
+                     apkg_writer_lib.StreamingPackageWriter] = None,
+                 package_media: bool = False,
+                 metrics: Optional[metrics_lib.Metrics] = None):
         self._audio_dir = audio_dir
         self._categorizer = categorizer
         self._pleco_cards = pleco_cards
+        # If set, audio renders in the background instead of inline.
+        self._tts_pool = tts_pool
+        # If set, only notes which changed since the manifest was written are
+        # added.
+        self._delta_manifest = delta_manifest
+        # If set, notes are streamed into the package as they are made rather
+        # than held in self._decks until make_package().
+        self._package_writer = package_writer
+        # If set, the package also carries each note's audio.
+        self._package_media = package_media
+        self._metrics = metrics or metrics_lib.Metrics(enabled=False)
 
-        # TODO Rather than write apkg, why not reach into anki db and create
-        # cards / set tags?
-        self._decks = {e: genanki.Deck(123, str(e))
+        # See anki_writer.CollectionUpserter for writing these decks straight
+        # into a collection instead of into an .apkg.
+        import genanki
+        self._decks = {e: genanki.Deck(DeckId(e), str(e))
                        for e in categorizer_lib.Deck}
 
+    def _make_notes(self, card_obj: card_lib.Card) -> List["genanki.Note"]:
+        import genanki
+        notes = [(VocabModel(), [
+            card_obj._headword,
+            card_obj._pinyin_html,
+            card_obj._defn_html,
+            card_obj._sound,
+        ])]
+        if len(card_obj._headword) > 1:
+            notes.append((ListeningV2Model(), [
+                card_obj._sound,
+                card_obj._defn_html,
+                card_obj._pinyin_html,
+                card_obj._headword,
+            ]))
+        return [genanki.Note(model=model, fields=fields,
+                             guid=NoteGuid(card_obj._headword, model))
+                for model, fields in notes]
+
     def process(self, headword):
-        if headword not in self._pleco_cards:
+        with self._metrics.timer("categorize"):
+            categorized = self.categorize(headword)
+        if categorized is None:
             return False
+        card_obj, deck = categorized
+        with self._metrics.timer("render_html"):
+            notes = self._make_notes(card_obj)
+        with self._metrics.timer("synthesize"):
+            future = self.synthesize(card_obj)
+        with self._metrics.timer("package"):
+            return self.emit(card_obj, deck, notes, future)
+
+    def categorize(self, headword: Text
+                   ) -> Optional[Tuple[card_lib.Card, categorizer_lib.Deck]]:
+        """Returns the card and its deck, or None if it gets no deck."""
+        if headword not in self._pleco_cards:
+            return None
         card_obj = self._pleco_cards[headword]
         deck = self._categorizer.sort_into_deck(headword)
         if not deck:
-            return False
+            self._metrics.count("uncategorized")
+            return None
+        self._metrics.count(f"categorized/{deck.name}")
         logging.info(f"{headword}, {str(deck)}")
+        return card_obj, deck
+
+    def synthesize(self, card_obj: card_lib.Card
+                   ) -> Optional[futures.Future]:
+        """Renders the card's audio, or submits it to the pool if there is one."""
+        if self._tts_pool is not None:
+            return self._tts_pool.submit(card_obj, self._audio_dir)
         card_obj.WriteSoundfile(self._audio_dir)
+        return None
+
+    def emit(self, card_obj: card_lib.Card, deck: categorizer_lib.Deck,
+             notes: List["genanki.Note"],
+             future: Optional[futures.Future]) -> bool:
+        """Adds the card's notes to its deck. Returns whether any were added."""
         deck = self._decks[deck]
-        deck.add_note(
-            genanki.Note(
-                model=_VOCAB_MODEL,
-                fields=[
-                    card_obj._headword,
-                    card_obj._pinyin_html,
-                    card_obj._defn_html,
-                    card_obj._sound,
-                ]))
-        if len(headword) > 1:
-            deck.add_note(genanki.Note(
-                model=_LISTENING_V2_MODEL, fields=[
-                    card_obj._sound,
-                    card_obj._defn_html,
-                    card_obj._pinyin_html,
-                    card_obj._headword,
-                ]))
-
-        return True
+        added = False
+        for note in notes:
+            if self._delta_manifest is not None:
+                if not self._delta_manifest.changed(
+                        note.guid, deck.deck_id, note.fields):
+                    self._metrics.count("notes_unchanged")
+                    continue
+                self._delta_manifest.record(
+                    note.guid, deck.deck_id, note.fields)
+            if self._package_writer is not None:
+                self._package_writer.add_note(deck, note)
+            else:
+                deck.add_note(note)
+            self._metrics.count("notes_written")
+            added = True
+
+        if added and self._package_writer is not None and self._package_media:
+            self._add_media(
+                os.path.join(self._audio_dir, card_obj._filename), future)
+
+        return added
+
+    def _add_media(self, path: Text, future):
+        # Either the audio already existed, or it is rendering in the pool and
+        # is added when it finishes.
+        if future is None:
+            if os.path.exists(path):
+                self._package_writer.add_media(path)
+            return
+
+        def _on_rendered(f):
+            if f.exception() is None:
+                self._package_writer.add_media(path)
+        future.add_done_callback(_on_rendered)
+
+    def pipeline_stages(self, categorize_workers: int = 1,
+                        render_workers: int = 1) -> List[pipeline_lib.Stage]:
+        """
+        The steps of process(), as pipeline stages taking a headword and
+        returning whether anything was added. Audio is submitted, and notes
+        emitted, in input order, so that the output matches process()'s.
+        """
+        def categorize(headword):
+            return self.categorize(headword)
+
+        def render_html(categorized):
+            card_obj, deck = categorized
+            return card_obj, deck, self._make_notes(card_obj)
+
+        def synthesize(rendered):
+            return rendered + (self.synthesize(rendered[0]),)
+
+        def package(synthesized):
+            return self.emit(*synthesized)
+
+        timed = self._metrics.timed
+        return [
+            pipeline_lib.Stage("categorize", timed("categorize", categorize),
+                               workers=categorize_workers),
+            pipeline_lib.Stage("render_html", timed("render_html", render_html),
+                               workers=render_workers),
+            # The pool, if any, renders concurrently; homophones share a file,
+            # so which headword voices it depends on submission order.
+            pipeline_lib.Stage("synthesize", timed("synthesize", synthesize),
+                               ordered=True),
+            pipeline_lib.Stage("package", timed("package", package),
+                               ordered=True),
+        ]
+
+    def decks(self) -> Dict[categorizer_lib.Deck, "genanki.Deck"]:
+        return dict(self._decks)
+
+    def notes_by_deck(self) -> Dict[Text, List["genanki.Note"]]:
+        return {deck_obj.name: deck_obj.notes
+                for deck_obj in self._decks.values() if deck_obj.notes}
 
     def make_package(self):
         for deck_enum, deck_obj in self._decks.items():
             logging.info(f"{deck_enum}:  {len(deck_obj.notes)}")
+        import genanki
         return genanki.Package(self._decks.values())
@@ -1,5 +1,10 @@
+from src import anki_testing
 from src import anki_utils as anki_utils_lib
+from src import card as card_lib
+from src import categorizer as categorizer_lib
+from src import pipeline as pipeline_lib
 
+import os
 import tempfile
 from unittest.mock import MagicMock, call
 from absl.testing import absltest
@@ -79,7 +84,7 @@ class AnkiUtilsTest(absltest.TestCase):
                              "感冒", "pinyin", "defn", "sound"])
             self.assertEqual(len(vocab_v2_deck.notes[0].cards), 4)
             vocab_model = vocab_v2_deck.notes[0].model
-            self.assertEqual(vocab_model.model_id, 10001)
+            self.assertEqual(vocab_model.model_id, 1819894676)
             self.assertEqual(vocab_model.name, 'model_zw_vocab_v2')
             self.assertEqual(vocab_model.fields, [{'name': 'characters'}, {
                              'name': 'pinyin'}, {'name': 'meaning'}, {'name': 'audio'}])
@@ -92,11 +97,148 @@ class AnkiUtilsTest(absltest.TestCase):
                              "sound", "defn", "pinyin", "感冒"])
             self.assertEqual(len(listening_v2_deck.notes[0].cards), 1)
             listening_model = listening_v2_deck.notes[0].model
-            self.assertEqual(listening_model.model_id, 10002)
+            self.assertEqual(listening_model.model_id, 1868500883)
             self.assertEqual(listening_model.name, 'model_zw_listening_v2')
             self.assertEqual(listening_model.fields, [{'name': 'audio'}, {
                              'name': 'meaning'}, {'name': 'pinyin'}, {'name': 'characters'}])
 
 
+class DeltaTest(absltest.TestCase):
+
+    def _builder(self, cards, manifest):
+        categorizer = MagicMock()
+        categorizer.sort_into_deck.return_value = categorizer_lib.Deck.HSK_1_V1
+        return anki_utils_lib.AnkiBuilder(
+            "/nonexistent", categorizer, cards,
+            tts_pool=MagicMock(), delta_manifest=manifest)
+
+    def test_stable_ids(self):
+        self.assertNotEqual(anki_utils_lib.VocabModel().model_id,
+                            anki_utils_lib.ListeningV2Model().model_id)
+        self.assertLen(set(anki_utils_lib.DeckId(e)
+                           for e in categorizer_lib.Deck),
+                       len(categorizer_lib.Deck))
+        self.assertEqual(
+            anki_utils_lib.NoteGuid("感冒", anki_utils_lib.VocabModel()),
+            anki_utils_lib.NoteGuid("感冒", anki_utils_lib.VocabModel()))
+        self.assertNotEqual(
+            anki_utils_lib.NoteGuid("感冒", anki_utils_lib.VocabModel()),
+            anki_utils_lib.NoteGuid("感冒", anki_utils_lib.ListeningV2Model()))
+
+    def test_delta(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "manifest.json")
+            cards = {"感冒": card_lib.Card("感冒", "gan3mao4", "cold"),
+                     "黑": card_lib.Card("黑", "hei1", "black")}
+
+            ab = self._builder(cards, anki_utils_lib.DeltaManifest(path))
+            self.assertTrue(ab.process("感冒"))
+            self.assertTrue(ab.process("黑"))
+            self.assertEqual(sum(len(n) for n in ab.notes_by_deck().values()), 3)
+            ab._delta_manifest.save()
+
+            cards["感冒"] = card_lib.Card("感冒", "gan3mao4", "a cold")
+            ab = self._builder(cards, anki_utils_lib.DeltaManifest(path))
+            self.assertTrue(ab.process("感冒"))
+            self.assertFalse(ab.process("黑"))
+            notes = [n for ns in ab.notes_by_deck().values() for n in ns]
+            self.assertLen(notes, 2)
+            self.assertEqual(
+                notes[0].guid,
+                anki_utils_lib.NoteGuid("感冒", anki_utils_lib.VocabModel()))
+
+
+class PipelineTest(absltest.TestCase):
+
+    def test_matches_process(self):
+        headwords = ["感冒", "黑", "白", "进行", "他", "她"]
+        cards = {hw: card_lib.Card(hw, "ta1", f"defn of {hw}")
+                 for hw in headwords}
+
+        def builder():
+            categorizer = MagicMock()
+            # 白 gets no deck, so is skipped.
+            categorizer.sort_into_deck.side_effect = lambda hw: {
+                "白": None, "黑": categorizer_lib.Deck.HSK_2_V1,
+            }.get(hw, categorizer_lib.Deck.HSK_1_V1)
+            tts_pool = MagicMock()
+            tts_pool.submit.side_effect = lambda c, _: c._headword
+            return anki_utils_lib.AnkiBuilder(
+                "/nonexistent", categorizer, cards, tts_pool=tts_pool)
+
+        serial = builder()
+        expected = [(hw, serial.process(hw)) for hw in headwords]
+        piped = builder()
+        actual = list(pipeline_lib.Pipeline(
+            piped.pipeline_stages(categorize_workers=3, render_workers=2),
+            queue_size=2).run(headwords))
+
+        self.assertEqual([(hw, bool(r)) for hw, r in actual], expected)
+        self.assertEqual(
+            {d: [(n.guid, n.fields) for n in ns]
+             for d, ns in piped.notes_by_deck().items()},
+            {d: [(n.guid, n.fields) for n in ns]
+             for d, ns in serial.notes_by_deck().items()})
+        # Homophones are submitted in input order.
+        self.assertEqual(piped._tts_pool.submit.call_args_list,
+                         serial._tts_pool.submit.call_args_list)
+
+
+class AnkiReaderTest(absltest.TestCase):
+
+    def test_bulk_matches_queries(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "collection.anki2")
+            anki_testing.MakeCollection(path)
+            for bulk in [False, True]:
+                # Only one reader may have the collection open at a time.
+                reader = anki_utils_lib.AnkiReader(path, bulk=bulk)
+                self.assertTrue(reader.vocab_v1_contains("感冒"))
+                self.assertFalse(reader.vocab_v1_contains("黑"))
+                self.assertTrue(reader.listening_v1_contains("黑"))
+                self.assertFalse(reader.listening_v1_contains("感冒"))
+                self.assertEqual(reader.get_type("感冒"),
+                                 anki_utils_lib.CardType.New)
+                self.assertEqual(reader.get_type("进行"),
+                                 anki_utils_lib.CardType.New)
+                self.assertEqual(reader.get_type("黑"),
+                                 anki_utils_lib.CardType.Mature)
+                self.assertEqual(reader.get_type("白"),
+                                 anki_utils_lib.CardType.Absent)
+                reader._collection.close()
+
+    def test_refresh(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "collection.anki2")
+            anki_testing.MakeCollection(path)
+            reader = anki_utils_lib.AnkiReader(path, bulk=True)
+            # Indexed by the first query, not before.
+            self.assertIsNone(reader._index)
+            self.assertFalse(reader.vocab_v1_contains("白"))
+            col = reader._collection
+            note = col.new_note(col.models.by_name("zw"))
+            note["characters"] = "白"
+            col.add_note(note, col.decks.id("zw::vocab_v1"))
+            self.assertFalse(reader.vocab_v1_contains("白"))
+            reader.refresh()
+            self.assertTrue(reader.vocab_v1_contains("白"))
+            col.close()
+
+    def test_snapshot(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "collection.anki2")
+            anki_testing.MakeCollection(path)
+            reader = anki_utils_lib.AnkiReader(path)
+            snapshot = reader.snapshot()
+            self.assertEqual(len(snapshot), 3)
+            self.assertEqual(snapshot.decks("感冒"), {"zw::vocab_v1"})
+            self.assertEqual(snapshot.note("zw", "感冒"),
+                             ({"pinyin": "pinyin"}, {"zw::vocab_v1"}))
+            self.assertEqual(snapshot.get_type("黑"),
+                             anki_utils_lib.CardType.Mature)
+            self.assertNotIn("白", snapshot)
+            reader.close()
+
+
 if __name__ == "__main__":
     absltest.main()
@@ -0,0 +1,112 @@
+from absl import logging
+from anki.collection import AddNoteRequest, Collection
+from typing import Dict, Iterable, List, Mapping, Text
+import collections
+import genanki
+
+_KEY_FIELD = "characters"
+_BATCH_SIZE = 500
+
+
+class CollectionUpserter():
+    """
+    Writes notes straight into an Anki collection instead of into an .apkg.
+    New notes are added; notes whose fields or tags changed are updated in
+    place, keeping their scheduling; anything else is left untouched. Notes
+    are matched by note type and their `characters` field.
+    """
+
+    def __init__(self, collection: Collection, batch_size: int = _BATCH_SIZE):
+        self._collection = collection
+        self._batch_size = batch_size
+
+    def _ensure_notetype(self, model: genanki.Model):
+        mm = self._collection.models
+        notetype = mm.by_name(model.name)
+        if notetype is not None:
+            return notetype
+        notetype = mm.new(model.name)
+        for field in model.fields:
+            mm.add_field(notetype, mm.new_field(field["name"]))
+        for t in model.templates:
+            template = mm.new_template(t["name"])
+            template["qfmt"] = t["qfmt"]
+            template["afmt"] = t["afmt"]
+            mm.add_template(notetype, template)
+        notetype["css"] = model.css
+        mm.add(notetype)
+        logging.info(f"Created note type {model.name}.")
+        return mm.by_name(model.name)
+
+    def _existing_note_ids(self, notetype) -> Dict[Text, int]:
+        names = [f["name"] for f in notetype["flds"]]
+        key_ord = names.index(_KEY_FIELD)
+        return {
+            flds.split("\x1f")[key_ord]: nid
+            for nid, flds in self._collection.db.execute(
+                "select id, flds from notes where mid = ?", notetype["id"])
+        }
+
+    def upsert(self,
+               notes_by_deck: Mapping[Text, Iterable[genanki.Note]]
+               ) -> Dict[Text, int]:
+        """Returns counts of notes "added", "updated" and "unchanged"."""
+        counts = collections.Counter(added=0, updated=0, unchanged=0)
+        notetypes = {}
+        existing = {}
+        to_add: List[AddNoteRequest] = []
+        to_update = []
+        for deck_name, notes in notes_by_deck.items():
+            deck_id = self._collection.decks.id(deck_name)
+            for g_note in notes:
+                if g_note.model.name not in notetypes:
+                    notetype = self._ensure_notetype(g_note.model)
+                    notetypes[g_note.model.name] = notetype
+                    existing[g_note.model.name] = self._existing_note_ids(
+                        notetype)
+                notetype = notetypes[g_note.model.name]
+                # By name, in case the note type was edited in Anki.
+                fields = {f["name"]: v
+                          for f, v in zip(g_note.model.fields, g_note.fields)}
+                headword = fields[_KEY_FIELD]
+
+                nid = existing[g_note.model.name].get(headword)
+                if nid is None:
+                    note = self._collection.new_note(notetype)
+                    for name, value in fields.items():
+                        note[name] = value
+                    note.tags = list(g_note.tags)
+                    to_add.append(AddNoteRequest(note=note, deck_id=deck_id))
+                    # Don't add a headword twice if two decks claim it.
+                    existing[g_note.model.name][headword] = -1
+                    counts["added"] += 1
+                elif nid == -1:
+                    counts["unchanged"] += 1
+                else:
+                    note = self._collection.get_note(nid)
+                    changed = False
+                    for name, value in fields.items():
+                        if name in note and note[name] != value:
+                            note[name] = value
+                            changed = True
+                    if sorted(note.tags) != sorted(g_note.tags):
+                        note.tags = list(g_note.tags)
+                        changed = True
+                    if changed:
+                        to_update.append(note)
+                        counts["updated"] += 1
+                    else:
+                        counts["unchanged"] += 1
+
+                if len(to_add) >= self._batch_size:
+                    self._collection.add_notes(to_add)
+                    to_add = []
+                if len(to_update) >= self._batch_size:
+                    self._collection.update_notes(to_update)
+                    to_update = []
+        if to_add:
+            self._collection.add_notes(to_add)
+        if to_update:
+            self._collection.update_notes(to_update)
+        logging.info(f"Upserted: {dict(counts)}")
+        return dict(counts)
@@ -0,0 +1,51 @@
+from src import anki_utils as anki_utils_lib
+from src import anki_writer as anki_writer_lib
+
+import genanki
+import os
+import tempfile
+from anki.collection import Collection
+from absl.testing import absltest
+
+
+def _vocab(headword, defn, tags=()):
+    return genanki.Note(model=anki_utils_lib.VocabModel(),
+                        fields=[headword, "pinyin", defn, "[sound:x.flac]"],
+                        tags=list(tags))
+
+
+class CollectionUpserterTest(absltest.TestCase):
+
+    def test_upsert(self):
+        with tempfile.TemporaryDirectory() as d:
+            col = Collection(os.path.join(d, "collection.anki2"))
+            upserter = anki_writer_lib.CollectionUpserter(col, batch_size=2)
+
+            self.assertEqual(
+                upserter.upsert({
+                    "zw::a": [_vocab("感冒", "cold"), _vocab("黑", "black")],
+                    "zw::b": [_vocab("进行", "go on"), _vocab("黑", "black")],
+                }),
+                {"added": 3, "updated": 0, "unchanged": 1})
+            self.assertLen(col.find_notes("deck:zw::a"), 2)
+            # Four templates per vocab note.
+            self.assertLen(col.find_cards("deck:zw::a"), 8)
+            nid = col.find_notes("characters:感冒")[0]
+
+            self.assertEqual(
+                upserter.upsert({
+                    "zw::a": [_vocab("感冒", "a cold"),
+                              _vocab("黑", "black", tags=["hsk1"])],
+                    "zw::b": [_vocab("进行", "go on"), _vocab("再次", "again")],
+                }),
+                {"added": 1, "updated": 2, "unchanged": 1})
+            self.assertEqual(col.find_notes("characters:感冒"), [nid])
+            self.assertEqual(col.get_note(nid)["meaning"], "a cold")
+            self.assertEqual(
+                col.get_note(col.find_notes("characters:黑")[0]).tags, ["hsk1"])
+            self.assertEqual(col.note_count(), 4)
+            col.close()
+
+
+if __name__ == "__main__":
+    absltest.main()
@@ -0,0 +1,158 @@
+from absl import logging
+from typing import Dict, Optional, Text
+import hashlib
+import itertools
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import zipfile
+
+_BATCH_SIZE = 1000
+_CHUNK_SIZE = 1 << 20
+
+# Formats which are already compressed, so deflating them again costs time
+# for little or no gain. These are stored as-is.
+_STORED_EXTENSIONS = frozenset([
+    ".flac", ".m4a", ".mp3", ".ogg", ".opus", ".otf", ".woff2", ".jpg",
+    ".png",
+])
+
+
+class StreamingPackageWriter():
+    """
+    Writes an .apkg incrementally. Unlike genanki.Package, which needs every
+    note in memory up front, notes are inserted into the package's SQLite
+    database as they are added, and committed in batches. Media is written
+    into the zip as soon as it is ready, from any thread. The result has the
+    same layout as genanki.Package.write_to_file, since the same genanki code
+    writes the schema, notes, cards, decks and models.
+    """
+
+    def __init__(self,
+                 path: Text,
+                 timestamp: Optional[float] = None,
+                 batch_size: int = _BATCH_SIZE):
+        from genanki.apkg_col import APKG_COL
+        from genanki.apkg_schema import APKG_SCHEMA
+
+        self._timestamp = time.time() if timestamp is None else timestamp
+        self._id_gen = itertools.count(int(self._timestamp * 1000))
+        self._batch_size = batch_size
+        self._uncommitted = 0
+        self.num_notes = 0
+
+        fd, self._db_path = tempfile.mkstemp(suffix=".anki2")
+        os.close(fd)
+        # Notes may be added from a thread other than this one, e.g. the
+        # pipeline's packaging stage; only one thread at a time ever does.
+        self._conn = sqlite3.connect(self._db_path, check_same_thread=False)
+        self._cursor = self._conn.cursor()
+        self._cursor.executescript(APKG_SCHEMA)
+        self._cursor.executescript(APKG_COL)
+
+        # Decks are only written, with the models their notes use, at close().
+        self._decks: Dict[int, "genanki.Deck"] = {}
+
+        self._zip_lock = threading.Lock()
+        self._path = path
+        self._zip = zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED)
+        # Zip member name => media filename.
+        self._media: Dict[Text, Text] = {}
+        # Media filename => sha256 of what was written under that name.
+        self._media_hashes: Dict[Text, Text] = {}
+        self._member_ids = itertools.count()
+        self.media_bytes_stored = 0
+        self.media_bytes_deflated = 0
+
+    def __enter__(self) -> "StreamingPackageWriter":
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    def add_note(self, deck: "genanki.Deck", note: "genanki.Note"):
+        if deck.deck_id not in self._decks:
+            import genanki
+            self._decks[deck.deck_id] = genanki.Deck(
+                deck.deck_id, deck.name, deck.description)
+        self._decks[deck.deck_id].add_model(note.model)
+        note.write_to_db(self._cursor, self._timestamp, deck.deck_id,
+                         self._id_gen)
+        self.num_notes += 1
+        self._uncommitted += 1
+        if self._uncommitted >= self._batch_size:
+            self._conn.commit()
+            self._uncommitted = 0
+
+    def add_media(self, path: Text) -> bool:
+        """
+        Adds a media file to the package, unless a file of that name was
+        already added. Safe to call from any thread. Returns True if written.
+        """
+        name = os.path.basename(path)
+        with self._zip_lock:
+            if name in self._media_hashes:
+                return False
+            # Recorded only once written, so that a file which can't be read
+            # isn't listed in the package's media. A member left half
+            # written is never listed, and its number never reused.
+            member = str(next(self._member_ids))
+            self._media_hashes[name] = self._write_member(member, path)
+            self._media[member] = name
+        return True
+
+    def _write_member(self, member: Text, path: Text) -> Text:
+        # Streams |path| into the zip in chunks rather than reading it into
+        # memory. zipfile must checksum every byte, so sendfile() can't help.
+        # Raises OSError, having recorded nothing, if |path| can't be read.
+        info = zipfile.ZipInfo.from_file(path, member)
+        stored = os.path.splitext(path)[1].lower() in _STORED_EXTENSIONS
+        info.compress_type = (zipfile.ZIP_STORED if stored
+                              else zipfile.ZIP_DEFLATED)
+        h = hashlib.sha256()
+        with open(path, "rb") as src, self._zip.open(
+                info, "w", force_zip64=info.file_size > zipfile.ZIP64_LIMIT
+        ) as dst:
+            for chunk in iter(lambda: src.read(_CHUNK_SIZE), b""):
+                h.update(chunk)
+                dst.write(chunk)
+        if stored:
+            self.media_bytes_stored += info.file_size
+        else:
+            self.media_bytes_deflated += info.file_size
+        return h.hexdigest()
+
+    def media_hashes(self) -> Dict[Text, Text]:
+        """Returns the sha256 of each media file written, by filename."""
+        with self._zip_lock:
+            return dict(self._media_hashes)
+
+    def close(self):
+        for deck in self._decks.values():
+            deck.write_to_db(self._cursor, self._timestamp, self._id_gen)
+        self._conn.commit()
+        self._conn.close()
+        with self._zip_lock:
+            self._zip.write(self._db_path, "collection.anki2")
+            self._zip.writestr("media", json.dumps(self._media))
+            self._zip.close()
+        os.remove(self._db_path)
+        logging.info(f"Wrote {self.num_notes} notes in {len(self._decks)} "
+                     f"decks and {len(self._media)} media files "
+                     f"({self.media_bytes_stored} bytes stored, "
+                     f"{self.media_bytes_deflated} bytes deflated).")
+
+    def discard(self):
+        """Abandons the package, removing the partly written file."""
+        self._conn.close()
+        with self._zip_lock:
+            self._zip.close()
+        for path in [self._path, self._db_path]:
+            if os.path.exists(path):
+                os.remove(path)
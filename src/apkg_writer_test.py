@@ -0,0 +1,164 @@
+from src import anki_utils as anki_utils_lib
+from src import apkg_writer as apkg_writer_lib
+
+import genanki
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import zipfile
+from anki.collection import Collection, ImportAnkiPackageRequest
+from absl.testing import absltest
+
+_TIMESTAMP = 1600000000.0
+
+
+def _notes(headword):
+    return [
+        genanki.Note(model=anki_utils_lib.VocabModel(),
+                     fields=[headword, "pinyin", "defn", "[sound:x.flac]"],
+                     guid=anki_utils_lib.NoteGuid(
+                         headword, anki_utils_lib.VocabModel())),
+        genanki.Note(model=anki_utils_lib.ListeningV2Model(),
+                     fields=["[sound:x.flac]", "defn", "pinyin", headword],
+                     guid=anki_utils_lib.NoteGuid(
+                         headword, anki_utils_lib.ListeningV2Model())),
+    ]
+
+
+def _read_package(path, d):
+    with zipfile.ZipFile(path) as z:
+        db_path = os.path.join(d, os.path.basename(path) + ".anki2")
+        with open(db_path, "wb") as f:
+            f.write(z.read("collection.anki2"))
+        media = json.loads(z.read("media"))
+        media_contents = {name: z.read(idx) for idx, name in media.items()}
+    conn = sqlite3.connect(db_path)
+    notes = sorted(conn.execute(
+        "select guid, mid, mod, tags, flds, sfld from notes").fetchall())
+    cards = sorted(conn.execute(
+        "select n.guid, c.ord, c.did, c.type, c.queue, c.due "
+        "from cards c join notes n on c.nid = n.id").fetchall())
+    decks, models = conn.execute("select decks, models from col").fetchone()
+    conn.close()
+    return notes, cards, json.loads(decks), json.loads(models), media_contents
+
+
+class StreamingPackageWriterTest(absltest.TestCase):
+
+    def test_matches_genanki(self):
+        with tempfile.TemporaryDirectory() as d:
+            audio = os.path.join(d, "gan3mao4.flac")
+            with open(audio, "wb") as f:
+                f.write(b"audio")
+
+            decks = [genanki.Deck(1900000001, "a"), genanki.Deck(1900000002, "b")]
+            for deck, headword in [(decks[0], "感冒"), (decks[0], "进行"),
+                                   (decks[1], "再次")]:
+                for note in _notes(headword):
+                    deck.add_note(note)
+            expected_path = os.path.join(d, "expected.apkg")
+            genanki.Package(decks, media_files=[audio]).write_to_file(
+                expected_path, timestamp=_TIMESTAMP)
+
+            actual_path = os.path.join(d, "actual.apkg")
+            with apkg_writer_lib.StreamingPackageWriter(
+                    actual_path, timestamp=_TIMESTAMP, batch_size=2) as writer:
+                for deck in decks:
+                    for note in deck.notes:
+                        writer.add_note(deck, note)
+                writer.add_media(audio)
+                self.assertEqual(writer.num_notes, 6)
+
+            self.assertEqual(_read_package(actual_path, d),
+                             _read_package(expected_path, d))
+
+            col = Collection(os.path.join(d, "collection.anki2"))
+            col.import_anki_package(
+                ImportAnkiPackageRequest(package_path=actual_path))
+            self.assertEqual(col.note_count(), 6)
+            self.assertEqual(col.card_count(), 3 * 4 + 3)
+            col.close()
+
+    def test_media(self):
+        with tempfile.TemporaryDirectory() as d:
+            paths = {}
+            for name, contents in [("a.flac", b"flac" * 1000),
+                                   ("b.txt", b"text" * 1000)]:
+                paths[name] = os.path.join(d, name)
+                with open(paths[name], "wb") as f:
+                    f.write(contents)
+            os.mkdir(os.path.join(d, "other"))
+            duplicate = os.path.join(d, "other", "a.flac")
+            with open(duplicate, "wb") as f:
+                f.write(b"flac" * 1000)
+
+            package = os.path.join(d, "out.apkg")
+            with apkg_writer_lib.StreamingPackageWriter(package) as writer:
+                self.assertTrue(writer.add_media(paths["a.flac"]))
+                self.assertTrue(writer.add_media(paths["b.txt"]))
+                self.assertFalse(writer.add_media(duplicate))
+                self.assertEqual(
+                    writer.media_hashes()["a.flac"],
+                    hashlib.sha256(b"flac" * 1000).hexdigest())
+
+            with zipfile.ZipFile(package) as z:
+                self.assertEqual(json.loads(z.read("media")),
+                                 {"0": "a.flac", "1": "b.txt"})
+                self.assertEqual(z.getinfo("0").compress_type,
+                                 zipfile.ZIP_STORED)
+                self.assertEqual(z.getinfo("1").compress_type,
+                                 zipfile.ZIP_DEFLATED)
+                self.assertEqual(z.read("0"), b"flac" * 1000)
+                self.assertEqual(z.read("1"), b"text" * 1000)
+
+    def test_missing_media_is_not_listed(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "a.flac")
+            with open(path, "wb") as f:
+                f.write(b"flac")
+            package = os.path.join(d, "out.apkg")
+            with apkg_writer_lib.StreamingPackageWriter(package) as writer:
+                with self.assertRaises(OSError):
+                    writer.add_media(os.path.join(d, "missing.flac"))
+                self.assertTrue(writer.add_media(path))
+                self.assertNotIn("missing.flac", writer.media_hashes())
+
+            with zipfile.ZipFile(package) as z:
+                media = json.loads(z.read("media"))
+                self.assertEqual(list(media.values()), ["a.flac"])
+                for member in media:
+                    self.assertEqual(z.read(member), b"flac")
+
+    def test_notes_from_another_thread(self):
+        with tempfile.TemporaryDirectory() as d:
+            package = os.path.join(d, "out.apkg")
+            deck = genanki.Deck(1900000001, "a")
+            with apkg_writer_lib.StreamingPackageWriter(package) as writer:
+                thread = threading.Thread(target=lambda: [
+                    writer.add_note(deck, note) for note in _notes("感冒")])
+                thread.start()
+                thread.join()
+            self.assertEqual(writer.num_notes, 2)
+            self.assertLen(_read_package(package, d)[0], 2)
+
+    def test_discarded_on_error(self):
+        with tempfile.TemporaryDirectory() as d:
+            package = os.path.join(d, "out.apkg")
+            with self.assertRaises(ValueError):
+                with apkg_writer_lib.StreamingPackageWriter(package) as writer:
+                    writer.add_note(genanki.Deck(1900000001, "a"),
+                                    _notes("感冒")[0])
+                    raise ValueError()
+            self.assertFalse(os.path.exists(package))
+            self.assertFalse(os.path.exists(writer._db_path))
+
+    def test_font_files(self):
+        self.assertLen(anki_utils_lib.FONT_FILES, 13)
+        self.assertIn("_NotoSansSC-Black.otf", anki_utils_lib.FONT_FILES)
+
+
+if __name__ == "__main__":
+    absltest.main()
@@ -0,0 +1,141 @@
+from absl import logging
+from typing import Optional, Text
+import fcntl
+import hashlib
+import os
+import shutil
+import threading
+import time
+
+# From linux/fs.h; clones a file's extents on filesystems which support it.
+_FICLONE = 0x40049409
+# Beside each clip, an empty file whose mtime records when it was last used.
+# The clip's own mtime won't do: it is shared by every hardlink to it,
+# e.g. in collection.media.
+_USED_SUFFIX = ".used"
+
+
+def _reflink_or_copy(src: Text, dst: Text):
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+            return
+        except OSError:
+            pass
+        shutil.copyfileobj(fsrc, fdst, 1 << 20)
+
+
+def _link_or_copy(src: Text, dst: Text):
+    """Places |src| at |dst| atomically, without rewriting the data if possible."""
+    tmp = f"{dst}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        try:
+            os.link(src, tmp)
+        except OSError:
+            # Cross-device, or a filesystem without hardlinks.
+            _reflink_or_copy(src, tmp)
+        os.replace(tmp, dst)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+class AudioCache():
+    """
+    A content-addressed store of rendered audio, shared between runs and
+    between collections. Clips are keyed by a hash of what was rendered and
+    how, and are hardlinked (or reflinked, or copied) into each
+    collection.media directory.
+    """
+
+    def __init__(self,
+                 root: Text,
+                 max_bytes: Optional[int] = None,
+                 max_age_secs: Optional[float] = None):
+        self._root = root
+        self._max_bytes = max_bytes
+        self._max_age_secs = max_age_secs
+        os.makedirs(self._root, exist_ok=True)
+
+    @staticmethod
+    def Key(backend_name: Text, voice: Text, text: Text, extension: Text,
+            variant: Text = "") -> Text:
+        """
+        |variant| names any processing the cached clip has had since it was
+        rendered, e.g. loudness normalization.
+        """
+        h = hashlib.sha256()
+        parts = [backend_name, voice, text, extension]
+        if variant:
+            parts.append(variant)
+        for part in parts:
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def _path(self, key: Text) -> Text:
+        return os.path.join(self._root, key[:2], key)
+
+    @staticmethod
+    def _mark_used(path: Text):
+        with open(f"{path}{_USED_SUFFIX}", "a"):
+            pass
+        os.utime(f"{path}{_USED_SUFFIX}")
+
+    def fetch(self, key: Text, dest: Text) -> bool:
+        """Materializes the clip at |dest|, returns False on a cache miss."""
+        path = self._path(key)
+        try:
+            _link_or_copy(path, dest)
+        except FileNotFoundError:
+            return False
+        # Eviction is least-recently-used.
+        self._mark_used(path)
+        return True
+
+    def store(self, key: Text, src: Text):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _link_or_copy(src, path)
+        self._mark_used(path)
+
+    def _last_used(self, path: Text, mtime: float) -> float:
+        # Clips cached before recency was tracked apart have only their own.
+        try:
+            return os.stat(f"{path}{_USED_SUFFIX}").st_mtime
+        except FileNotFoundError:
+            return mtime
+
+    def evict(self) -> int:
+        """Removes clips older than max_age_secs, then the least recently used
+        clips until the cache fits in max_bytes. Returns the number removed."""
+        entries = []
+        for shard in os.scandir(self._root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if (entry.is_file() and not entry.name.endswith(".tmp") and
+                        not entry.name.endswith(_USED_SUFFIX)):
+                    st = entry.stat()
+                    entries.append((self._last_used(entry.path, st.st_mtime),
+                                    st.st_size, entry.path))
+        entries.sort()
+
+        now = time.time()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for mtime, size, path in entries:
+            too_old = (self._max_age_secs is not None and
+                       now - mtime > self._max_age_secs)
+            too_big = self._max_bytes is not None and total > self._max_bytes
+            if not too_old and not too_big:
+                break
+            os.remove(path)
+            try:
+                os.remove(f"{path}{_USED_SUFFIX}")
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        logging.info(f"Evicted {removed} clips from {self._root}.")
+        return removed
@@ -0,0 +1,117 @@
+from src import audio_cache as audio_cache_lib
+from src import audio_post as audio_post_lib
+from src import card as card_lib
+from src import tts as tts_lib
+
+import os
+import tempfile
+import time
+from absl.testing import absltest
+
+
+def _fake_transcode(src, dest, target_lufs):
+    # Stands in for ffmpeg, in a worker process.
+    with open(src, "rb") as fsrc, open(dest, "wb") as fdest:
+        fdest.write(fsrc.read() + b"@normalized")
+
+
+class AudioCacheTest(absltest.TestCase):
+
+    def test_key(self):
+        k = audio_cache_lib.AudioCache.Key("say", "Ting-Ting", "感冒", ".flac")
+        self.assertEqual(
+            k, audio_cache_lib.AudioCache.Key("say", "Ting-Ting", "感冒", ".flac"))
+        self.assertNotEqual(
+            k, audio_cache_lib.AudioCache.Key("say", "Ting-Ting", "赶毛", ".flac"))
+        self.assertNotEqual(
+            k, audio_cache_lib.AudioCache.Key("espeak-ng", "cmn", "感冒", ".flac"))
+
+    def test_fetch_and_store(self):
+        with tempfile.TemporaryDirectory() as root, tempfile.TemporaryDirectory() as media:
+            cache = audio_cache_lib.AudioCache(root)
+            src = os.path.join(media, "a.flac")
+            dest = os.path.join(media, "b.flac")
+            with open(src, "wb") as f:
+                f.write(b"audio")
+
+            self.assertFalse(cache.fetch("abcd", dest))
+            self.assertFalse(os.path.exists(dest))
+
+            cache.store("abcd", src)
+            self.assertTrue(cache.fetch("abcd", dest))
+            with open(dest, "rb") as f:
+                self.assertEqual(f.read(), b"audio")
+            # Same filesystem, so this is a hardlink.
+            self.assertEqual(os.stat(src).st_ino, os.stat(dest).st_ino)
+
+            # Using the clip doesn't touch the collection's copy.
+            os.utime(dest, (1, 1))
+            self.assertTrue(cache.fetch("abcd", os.path.join(media, "c.flac")))
+            self.assertEqual(os.stat(dest).st_mtime, 1)
+
+    def test_evict(self):
+        with tempfile.TemporaryDirectory() as root, tempfile.TemporaryDirectory() as media:
+            src = os.path.join(media, "a.flac")
+            with open(src, "wb") as f:
+                f.write(b"x" * 100)
+            cache = audio_cache_lib.AudioCache(root, max_bytes=250)
+            now = time.time()
+            for i, key in enumerate(["aa00", "bb00", "cc00", "dd00"]):
+                cache.store(key, src)
+                os.utime(os.path.join(root, key[:2], key + ".used"),
+                         (now - 100 + i, now - 100 + i))
+            # Used most recently, though stored first.
+            self.assertTrue(cache.fetch("aa00", os.path.join(media, "x")))
+            self.assertEqual(cache.evict(), 2)
+            self.assertFalse(cache.fetch("bb00", os.path.join(media, "x")))
+            self.assertFalse(cache.fetch("cc00", os.path.join(media, "x")))
+            self.assertTrue(cache.fetch("aa00", os.path.join(media, "x")))
+            self.assertTrue(cache.fetch("dd00", os.path.join(media, "x")))
+
+            cache = audio_cache_lib.AudioCache(root, max_age_secs=0)
+            self.assertEqual(cache.evict(), 2)
+
+    def test_render_pool_shares_audio_across_collections(self):
+        backend = tts_lib.StubBackend()
+        with tempfile.TemporaryDirectory() as root:
+            cache = audio_cache_lib.AudioCache(root)
+            for _ in range(3):
+                with tempfile.TemporaryDirectory() as media:
+                    with tts_lib.RenderPool(backend, max_workers=2,
+                                            cache=cache) as pool:
+                        pool.submit(card_lib.Card("感冒", "gan3mao4", ""), media)
+                        pool.submit(card_lib.Card("黑", "hei1", ""), media)
+                    self.assertCountEqual(os.listdir(media),
+                                          ["gan3mao4.flac", "hei1.flac"])
+            self.assertCountEqual(backend.rendered, ["感冒", "黑"])
+            self.assertEqual(pool.cache_hits, 2)
+
+    def test_caches_processed_clips(self):
+        backend = tts_lib.StubBackend()
+        card = card_lib.Card("黑", "hei1", "")
+        with tempfile.TemporaryDirectory() as root:
+            cache = audio_cache_lib.AudioCache(root)
+            manifest = os.path.join(root, "post.json")
+            for run in range(2):
+                with tempfile.TemporaryDirectory() as media:
+                    with tts_lib.RenderPool(backend, max_workers=1,
+                                            cache=cache,
+                                            cache_variant="loudnorm",
+                                            store_renders=False) as pool:
+                        pool.submit(card, media)
+                    processor = audio_post_lib.AudioPostProcessor(
+                        manifest, transcode=_fake_transcode)
+                    processor.process(pool.rendered(include_cache_hits=False))
+                    for path, key in pool.unstored().items():
+                        self.assertTrue(processor.is_processed(path))
+                        cache.store(key, path)
+                    with open(os.path.join(media, "hei1.flac"), "rb") as f:
+                        self.assertEqual(f.read(), "黑@normalized".encode())
+            # Rendered and processed once; the second run was a cache hit.
+            self.assertEqual(backend.rendered, ["黑"])
+            self.assertEqual(pool.cache_hits, 1)
+            self.assertEqual(pool.unstored(), {})
+
+
+if __name__ == "__main__":
+    absltest.main()
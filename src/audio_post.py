@@ -0,0 +1,128 @@
+from absl import logging
+from concurrent import futures
+from typing import Callable, Dict, Iterable, Optional, Text
+import hashlib
+import json
+import os
+import subprocess
+
+# Codec arguments by output extension. Clips are speech, so mono at 24kHz
+# loses nothing audible and roughly halves the size of a typical render.
+_CODECS = {
+    ".flac": ["-c:a", "flac", "-compression_level", "8"],
+    ".ogg": ["-c:a", "libopus", "-b:a", "32k"],
+    ".opus": ["-c:a", "libopus", "-b:a", "32k"],
+}
+
+_DEFAULT_TARGET_LUFS = -16.0
+
+Transcoder = Callable[[Text, Text, float], None]
+
+
+def HashFile(path: Text) -> Text:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def Transcode(src: Text, dest: Text, target_lufs: float):
+    """Normalizes |src| to |target_lufs| and encodes it by |dest|'s extension."""
+    ext = os.path.splitext(dest)[1]
+    if ext not in _CODECS:
+        raise ValueError(
+            f"Don't know how to encode '{ext}', expected one of {sorted(_CODECS)}.")
+    subprocess.run(
+        ["ffmpeg", "-nostdin", "-y", "-loglevel", "error", "-i", src,
+         "-af", f"loudnorm=I={target_lufs}:TP=-1.5:LRA=11",
+         "-ac", "1", "-ar", "24000", *_CODECS[ext], dest],
+        capture_output=True, check=True)
+
+
+def _process_one(transcode: Transcoder, src: Text, dest: Text,
+                 target_lufs: float) -> Text:
+    # Runs in a worker process. Encode beside the destination and rename, so
+    # that |src| may be |dest|.
+    directory, filename = os.path.split(dest)
+    tmp = os.path.join(directory, f".post-{os.getpid()}-{filename}")
+    try:
+        transcode(src, tmp, target_lufs)
+        os.replace(tmp, dest)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    if src != dest:
+        os.remove(src)
+    return HashFile(dest)
+
+
+class AudioPostProcessor():
+    """
+    Loudness-normalizes and re-encodes audio clips across a process pool.
+    Every output's content hash is recorded in a JSON manifest, so clips
+    which were already processed, by this run or an earlier one, are skipped.
+    """
+
+    def __init__(self,
+                 manifest_path: Optional[Text] = None,
+                 target_lufs: float = _DEFAULT_TARGET_LUFS,
+                 max_workers: Optional[int] = None,
+                 transcode: Transcoder = Transcode):
+        self._manifest_path = manifest_path
+        self._target_lufs = target_lufs
+        self._max_workers = max_workers
+        self._transcode = transcode
+        self._processed = set()
+        if manifest_path and os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                saved = json.load(f)
+            if saved.get("target_lufs") == target_lufs:
+                self._processed = set(saved["processed"])
+
+    def _save(self):
+        if not self._manifest_path:
+            return
+        tmp = f"{self._manifest_path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({
+                "target_lufs": self._target_lufs,
+                "processed": sorted(self._processed),
+            }, f)
+        os.replace(tmp, self._manifest_path)
+
+    def is_processed(self, path: Text) -> bool:
+        """Whether |path| holds a clip this processor's manifest produced."""
+        return HashFile(path) in self._processed
+
+    def process(self,
+                paths: Iterable[Text],
+                extension: Optional[Text] = None) -> Dict[Text, Text]:
+        """
+        Processes each of |paths|, in place, or into a sibling file with
+        |extension| (which replaces the original). Returns a map from each
+        input path to its output path.
+        """
+        outputs = {}
+        with futures.ProcessPoolExecutor(
+                max_workers=self._max_workers) as executor:
+            pending = {}
+            for src in paths:
+                dest = src if extension is None else (
+                    os.path.splitext(src)[0] + extension)
+                outputs[src] = dest
+                if src == dest and HashFile(src) in self._processed:
+                    continue
+                pending[executor.submit(
+                    _process_one, self._transcode, src, dest,
+                    self._target_lufs)] = src
+            for future in futures.as_completed(pending):
+                src = pending[future]
+                try:
+                    self._processed.add(future.result())
+                except (OSError, subprocess.CalledProcessError, ValueError) as e:
+                    logging.warning(f"Failed to post-process {src}: {e}")
+                    outputs[src] = src
+        logging.info(f"Post-processed {len(pending)} of {len(outputs)} clips.")
+        self._save()
+        return outputs
@@ -0,0 +1,72 @@
+from src import audio_post as audio_post_lib
+
+import os
+import tempfile
+from absl.testing import absltest
+
+
+def _fake_transcode(src, dest, target_lufs):
+    # Stands in for ffmpeg: the "normalized" clip records its target.
+    with open(src, "rb") as fsrc, open(dest, "wb") as fdest:
+        fdest.write(fsrc.read() + f"@{target_lufs}".encode())
+
+
+def _write(path, contents):
+    with open(path, "wb") as f:
+        f.write(contents)
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class AudioPostTest(absltest.TestCase):
+
+    def test_in_place_and_remembered(self):
+        with tempfile.TemporaryDirectory() as d:
+            manifest = os.path.join(d, "manifest.json")
+            a, b = os.path.join(d, "a.flac"), os.path.join(d, "b.flac")
+            _write(a, b"a")
+            _write(b, b"b")
+
+            processor = audio_post_lib.AudioPostProcessor(
+                manifest, max_workers=2, transcode=_fake_transcode)
+            self.assertEqual(processor.process([a, b]), {a: a, b: b})
+            self.assertEqual(_read(a), b"a@-16.0")
+
+            # Already processed, by content: a second pass changes nothing.
+            processor = audio_post_lib.AudioPostProcessor(
+                manifest, max_workers=2, transcode=_fake_transcode)
+            processor.process([a, b])
+            self.assertEqual(_read(a), b"a@-16.0")
+
+            # A different target reprocesses.
+            processor = audio_post_lib.AudioPostProcessor(
+                manifest, target_lufs=-20.0, transcode=_fake_transcode)
+            processor.process([a])
+            self.assertEqual(_read(a), b"a@-16.0@-20.0")
+
+    def test_new_extension(self):
+        with tempfile.TemporaryDirectory() as d:
+            a = os.path.join(d, "1.flac")
+            _write(a, b"a")
+            processor = audio_post_lib.AudioPostProcessor(
+                transcode=_fake_transcode)
+            self.assertEqual(processor.process([a], extension=".ogg"),
+                             {a: os.path.join(d, "1.ogg")})
+            self.assertEqual(os.listdir(d), ["1.ogg"])
+
+    def test_failure_keeps_original(self):
+        with tempfile.TemporaryDirectory() as d:
+            a = os.path.join(d, "1.flac")
+            _write(a, b"a")
+            processor = audio_post_lib.AudioPostProcessor()
+            with self.assertRaisesRegex(ValueError, ".*Don't know how to encode.*"):
+                audio_post_lib.Transcode(a, os.path.join(d, "1.mp4"), -16.0)
+            self.assertEqual(processor.process([a], extension=".mp4"), {a: a})
+            self.assertEqual(os.listdir(d), ["1.flac"])
+
+
+if __name__ == "__main__":
+    absltest.main()
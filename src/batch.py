@@ -0,0 +1,113 @@
+from absl import logging
+from concurrent import futures
+from concurrent.futures import process
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Text
+import collections
+import json
+import multiprocessing
+import time
+
+
+class Tenant(NamedTuple):
+    """One learner's build: their export, collection and where to write."""
+    name: Text
+    xml_input_path: Text
+    collection_path: Text
+    audio_out: Text
+    apkg_out: Optional[Text] = None
+    media_index_path: Optional[Text] = None
+    delta_manifest: Optional[Text] = None
+
+
+def LoadManifest(path: Text) -> List[Tenant]:
+    """
+    Reads a JSON list of tenants, each an object with Tenant's fields; name
+    defaults to the tenant's position in the list.
+    """
+    with open(path) as f:
+        entries = json.load(f)
+    if not isinstance(entries, list):
+        raise ValueError(f"{path}: expected a list of tenants.")
+    tenants = []
+    for i, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            raise ValueError(f"{path}: tenant {i} is not an object.")
+        entry = dict(entry)
+        entry.setdefault("name", str(i))
+        unknown = set(entry) - set(Tenant._fields)
+        if unknown:
+            raise ValueError(
+                f"{path}: tenant {entry['name']} has unknown fields "
+                f"{sorted(unknown)}.")
+        missing = [f for f in Tenant._fields
+                   if f not in Tenant._field_defaults and f not in entry]
+        if missing:
+            raise ValueError(
+                f"{path}: tenant {entry['name']} is missing {missing}.")
+        tenants.append(Tenant(**entry))
+    names = collections.Counter(t.name for t in tenants)
+    duplicates = sorted(n for n, count in names.items() if count > 1)
+    if duplicates:
+        raise ValueError(f"{path}: duplicate tenant names {duplicates}.")
+    return tenants
+
+
+def _run_one(run: Callable[[Tenant], Dict[Text, Any]],
+             tenant: Tenant) -> Dict[Text, Any]:
+    start = time.perf_counter()
+    try:
+        summary = dict(run(tenant) or {})
+        summary.update(ok=True, error=None)
+    except Exception as e:
+        logging.exception(f"Tenant {tenant.name} failed.")
+        summary = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+    summary.update(name=tenant.name,
+                   wall_secs=time.perf_counter() - start)
+    return summary
+
+
+def RunTenants(tenants: List[Tenant],
+               run: Callable[[Tenant], Dict[Text, Any]],
+               workers: int) -> List[Dict[Text, Any]]:
+    """
+    Calls run(tenant) for each of |tenants| on a pool of |workers| forked
+    processes, and returns a summary of each, in order: whatever run()
+    returned, plus name, ok, error and wall_secs.
+
+    The workers are forked, so they share everything the caller loaded
+    beforehand copy-on-write rather than each loading it. |run| must be a
+    module-level function, and should find what it shares in module
+    globals; passing it as an argument would copy it to every worker.
+
+    One tenant's failure doesn't affect the others': an exception is
+    recorded in its summary. If a worker dies outright, it takes the pool
+    with it, so each tenant left unfinished is retried on a pool of its
+    own, where dying again is its own doing.
+    """
+    context = multiprocessing.get_context("fork")
+    summaries: Dict[Text, Dict[Text, Any]] = {}
+
+    def run_pool(batch: List[Tenant], max_workers: int) -> List[Tenant]:
+        # Returns the tenants whose worker died.
+        died = []
+        with futures.ProcessPoolExecutor(max_workers=max_workers,
+                                         mp_context=context) as executor:
+            submitted = {executor.submit(_run_one, run, t): t for t in batch}
+            for future in futures.as_completed(submitted):
+                tenant = submitted[future]
+                try:
+                    summaries[tenant.name] = future.result()
+                except process.BrokenProcessPool:
+                    died.append(tenant)
+        return died
+
+    for tenant in run_pool(tenants, workers):
+        logging.warning(f"Retrying tenant {tenant.name} on its own, as a "
+                        "worker process died.")
+        if run_pool([tenant], 1):
+            logging.error(f"Tenant {tenant.name}'s worker died.")
+            summaries[tenant.name] = {
+                "name": tenant.name, "ok": False,
+                "error": "Worker process died.", "wall_secs": None,
+            }
+    return [summaries[t.name] for t in tenants]
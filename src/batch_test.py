@@ -0,0 +1,82 @@
+from src import batch as batch_lib
+
+import json
+import os
+import tempfile
+from absl.testing import absltest
+
+# Set before the workers fork, as RunTenants' callers do.
+_shared = {}
+
+
+def _run(tenant):
+    if tenant.name == "raises":
+        raise ValueError("bad export")
+    if tenant.name == "dies":
+        os._exit(1)
+    return {"shared": _shared["value"], "pid": os.getpid()}
+
+
+def _tenant(name):
+    return batch_lib.Tenant(name=name, xml_input_path=f"{name}.xml",
+                            collection_path=f"{name}.anki2",
+                            audio_out=f"{name}/audio")
+
+
+class LoadManifestTest(absltest.TestCase):
+
+    def _load(self, entries):
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as f:
+            json.dump(entries, f)
+            f.flush()
+            return batch_lib.LoadManifest(f.name)
+
+    def test_load(self):
+        tenants = self._load([
+            {"name": "a", "xml_input_path": "a.xml",
+             "collection_path": "a.anki2", "audio_out": "a/audio",
+             "apkg_out": "a/out"},
+            {"xml_input_path": "b.xml", "collection_path": "b.anki2",
+             "audio_out": "b/audio"},
+        ])
+        self.assertEqual(tenants, [
+            batch_lib.Tenant("a", "a.xml", "a.anki2", "a/audio", "a/out"),
+            batch_lib.Tenant("1", "b.xml", "b.anki2", "b/audio"),
+        ])
+
+    def test_invalid(self):
+        entry = {"xml_input_path": "a.xml", "collection_path": "a.anki2",
+                 "audio_out": "a/audio"}
+        for entries, message in [
+            ({"tenants": []}, "expected a list"),
+            ([dict(entry, colection_path="typo")], "unknown fields"),
+            ([{"xml_input_path": "a.xml"}], "missing"),
+            ([dict(entry, name="a"), dict(entry, name="a")], "duplicate"),
+        ]:
+            with self.assertRaisesRegex(ValueError, message):
+                self._load(entries)
+
+
+class RunTenantsTest(absltest.TestCase):
+
+    def test_isolates_failures(self):
+        _shared["value"] = "loaded once"
+        tenants = [_tenant(n) for n in ["a", "raises", "dies", "b", "c"]]
+
+        summaries = batch_lib.RunTenants(tenants, _run, workers=2)
+
+        self.assertEqual([s["name"] for s in summaries],
+                         ["a", "raises", "dies", "b", "c"])
+        self.assertEqual([s["ok"] for s in summaries],
+                         [True, False, False, True, True])
+        self.assertEqual(summaries[1]["error"], "ValueError: bad export")
+        self.assertEqual(summaries[2]["error"], "Worker process died.")
+        for s in [summaries[0], summaries[3], summaries[4]]:
+            self.assertEqual(s["shared"], "loaded once")
+            self.assertNotEqual(s["pid"], os.getpid())
+            self.assertIsNone(s["error"])
+            self.assertGreaterEqual(s["wall_secs"], 0)
+
+
+if __name__ == "__main__":
+    absltest.main()
@@ -0,0 +1,135 @@
+from typing import Any, Callable, Dict, List, Optional, Sequence, Text, Tuple
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+# Metrics are recorded as {benchmark name: {metric name: value}}. Metrics
+# whose names end in one of these are costs, so higher is worse, and are
+# checked by Compare(); anything else (counts, sizes) is informational.
+_COST_SUFFIXES = ("_secs", "_us", "_bytes")
+
+Results = Dict[Text, Dict[Text, float]]
+
+
+def Timed(fn: Callable[[], Any]) -> Tuple[Any, float]:
+    """Returns fn()'s result and how many seconds it took."""
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def BestOf(fn: Callable[[], Any], repeat: int) -> float:
+    """Returns the fastest of |repeat| runs of fn(), in seconds."""
+    return min(Timed(fn)[1] for _ in range(repeat))
+
+
+def Percentiles(samples_secs: Sequence[float],
+                percentiles: Sequence[int] = (50, 90, 99)) -> Dict[Text, float]:
+    """Returns e.g. {"p50_us": ..., "p99_us": ...} by nearest rank."""
+    ordered = sorted(samples_secs)
+    if not ordered:
+        return {}
+    out = {}
+    for p in percentiles:
+        rank = max(0, min(len(ordered) - 1,
+                          int(round(p / 100 * len(ordered))) - 1))
+        out[f"p{p}_us"] = ordered[rank] * 1e6
+    out["mean_us"] = sum(ordered) / len(ordered) * 1e6
+    return out
+
+
+def PeakRssBytes() -> int:
+    """The process's peak resident set size so far."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def CurrentRssBytes() -> int:
+    """The process's resident set size now, where /proc is available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return PeakRssBytes()
+
+
+def Environment() -> Dict[Text, Any]:
+    """What a result depends on besides the code, recorded beside it."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+            text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def Write(path: Text, results: Results, params: Dict[Text, Any]):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"environment": Environment(), "params": params,
+                   "results": results}, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def Load(path: Text) -> Dict[Text, Any]:
+    with open(path) as f:
+        return json.load(f)
+
+
+def Compare(baseline: Results, current: Results,
+            threshold: float) -> List[Text]:
+    """
+    Returns a description of each cost metric in both |baseline| and
+    |current| which grew by more than |threshold|, a fraction, e.g. 0.1.
+    """
+    regressions = []
+    for name, metrics in sorted(current.items()):
+        for metric, value in sorted(metrics.items()):
+            if not metric.endswith(_COST_SUFFIXES):
+                continue
+            before = baseline.get(name, {}).get(metric)
+            if not before or value <= before * (1 + threshold):
+                continue
+            regressions.append(
+                f"{name}.{metric}: {before:.4g} -> {value:.4g} "
+                f"(+{(value / before - 1) * 100:.0f}%)")
+    return regressions
+
+
+def Print(results: Results):
+    for name, metrics in sorted(results.items()):
+        print(name)
+        for metric, value in sorted(metrics.items()):
+            print(f"  {metric:>20}: {value:.6g}")
+
+
+def Report(results: Results, params: Dict[Text, Any],
+           baseline_out: Optional[Text], compare_to: Optional[Text],
+           threshold: float) -> bool:
+    """
+    Prints |results|, writes them to |baseline_out| if given, and compares
+    them with the baseline at |compare_to| if given. Returns False if that
+    found regressions.
+    """
+    Print(results)
+    if baseline_out:
+        Write(baseline_out, results, params)
+    if not compare_to:
+        return True
+    regressions = Compare(Load(compare_to)["results"], results, threshold)
+    for r in regressions:
+        print(f"REGRESSION {r}")
+    if not regressions:
+        print(f"No regressions beyond {threshold:.0%}.")
+    return not regressions
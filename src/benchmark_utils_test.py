@@ -0,0 +1,40 @@
+from src import benchmark_utils
+
+import os
+import tempfile
+from absl.testing import absltest
+
+
+class BenchmarkUtilsTest(absltest.TestCase):
+
+    def test_percentiles(self):
+        p = benchmark_utils.Percentiles([i / 1e6 for i in range(1, 101)])
+        self.assertAlmostEqual(p["p50_us"], 50)
+        self.assertAlmostEqual(p["p90_us"], 90)
+        self.assertAlmostEqual(p["p99_us"], 99)
+        self.assertAlmostEqual(p["mean_us"], 50.5)
+        self.assertEqual(benchmark_utils.Percentiles([]), {})
+
+    def test_compare(self):
+        baseline = {"a": {"secs": 1.0, "cards": 10},
+                    "b": {"p50_us": 100.0}}
+        current = {"a": {"secs": 1.05, "cards": 20},
+                   "b": {"p50_us": 150.0},
+                   "c": {"secs": 9.0}}
+        regressions = benchmark_utils.Compare(baseline, current, 0.1)
+        # Counts aren't costs, and new benchmarks have nothing to compare to.
+        self.assertLen(regressions, 1)
+        self.assertStartsWith(regressions[0], "b.p50_us")
+
+    def test_write_and_load(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "baseline.json")
+            benchmark_utils.Write(path, {"a": {"secs": 1.0}}, {"seed": 0})
+            loaded = benchmark_utils.Load(path)
+            self.assertEqual(loaded["results"], {"a": {"secs": 1.0}})
+            self.assertEqual(loaded["params"], {"seed": 0})
+            self.assertIn("python", loaded["environment"])
+
+
+if __name__ == "__main__":
+    absltest.main()
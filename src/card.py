@@ -1,8 +1,11 @@
+from src import definitions
+from src import media_index as media_index_lib
+from src import tts
 from src import xml_extractors
 
 from absl import logging
 from enum import IntEnum
-from typing import Text, List, Tuple, Optional
+from typing import Text, List, Tuple, Optional, Iterator, Mapping
 import os
 import re
 import subprocess
@@ -50,32 +53,9 @@ def _make_filename(pinyin: Text) -> Text:
     return re.sub(r'\W+', '', str(pinyin)).lower() + ".flac"
 
 
-def _match_numbers(defn) -> Text:
-    els = []
-    matching = 1
-    while True:
-        i = defn.find(f"{matching} ")
-        if i == -1:
-            break
-        a = i + len(str(matching)) + 1
-        j = defn.find(f"{matching+1} ")
-        if j == -1:
-            els.append(defn[a:])
-            break
-        els.append(defn[a:j])
-        matching += 1
-    html = "<ol>"
-    for e in els:
-        html += "<li>" + e + "</li>"
-    html += "</ol>"
-    return html
-
-
 def _make_defn_html(defn) -> Text:
     # match things like "1 foo 2 bar 3 baz"
-    if "1 " in defn and "2 " in defn:
-        return _match_numbers(defn)
-    return defn
+    return definitions.format_html(defn)
 
 
 def _is_vowel(n):
@@ -134,15 +114,48 @@ def _pinyin_text_to_html(s: Text) -> Text:
 
 
 class Card():
+    # Cards are created for every entry in an export but most are skipped by
+    # the Categorizer or never emitted, so the derived fields are computed on
+    # first access and cached in their slots.
+    __slots__ = (
+        "_headword",
+        "_pinyin_str",
+        "_defn",
+        "_filename_cache",
+        "_pinyin_html_cache",
+        "_defn_html_cache",
+    )
+
     def __init__(self, headword, pinyin_str, defn):
         self._headword = headword
         self._pinyin_str = pinyin_str
         self._defn = defn
-        # derived
-        self._filename = _make_filename(self._pinyin_str)
-        self._sound = f"[sound:{self._filename}]"
-        self._pinyin_html = _pinyin_text_to_html(self._pinyin_str)
-        self._defn_html = _make_defn_html(self._defn)
+        # derived, lazily
+        self._filename_cache = None
+        self._pinyin_html_cache = None
+        self._defn_html_cache = None
+
+    @property
+    def _filename(self) -> Text:
+        if self._filename_cache is None:
+            self._filename_cache = _make_filename(self._pinyin_str)
+        return self._filename_cache
+
+    @property
+    def _sound(self) -> Text:
+        return f"[sound:{self._filename}]"
+
+    @property
+    def _pinyin_html(self) -> Text:
+        if self._pinyin_html_cache is None:
+            self._pinyin_html_cache = _pinyin_text_to_html(self._pinyin_str)
+        return self._pinyin_html_cache
+
+    @property
+    def _defn_html(self) -> Text:
+        if self._defn_html_cache is None:
+            self._defn_html_cache = _make_defn_html(self._defn)
+        return self._defn_html_cache
 
     @staticmethod
     def Build(entry) -> "Card":
@@ -153,24 +166,27 @@ class Card():
         return Card(headword, pinyin_str, defn)
 
     def WriteSoundfile(self,
-                       directory_of_anki_collection_dot_media: Text):
+                       directory_of_anki_collection_dot_media: Text,
+                       backend: Optional[tts.Backend] = None,
+                       media_index: Optional[media_index_lib.MediaIndex] = None):
         fullpath = os.path.join(
             directory_of_anki_collection_dot_media, self._filename)
 
         # Render the soundfile only if it does not already exist.
-        if os.path.exists(fullpath):
+        if media_index is not None:
+            if media_index.exists(self._filename):
+                return
+        elif os.path.exists(fullpath):
             return
 
-        output = subprocess.run(
-            [
-                "/usr/bin/say",
-                "-v",
-                "Ting-Ting",
-                self._headword,
-                "-o",
-                fullpath,
-            ], capture_output=True)
-        logging.info("%s", output)
+        try:
+            tts.RenderTo(backend or tts.SayBackend(),
+                         self._headword, self._pinyin_str, fullpath)
+        except (OSError, subprocess.CalledProcessError) as e:
+            logging.warning(f"Failed to render {fullpath}: {e}")
+            return
+        if media_index is not None:
+            media_index.add(self._filename)
 
     def MakeRow(self):
         return {
@@ -179,3 +195,65 @@ class Card():
             "meaning": self._defn_html,
             "sound": self._sound,
         }
+
+
+class CardTable(Mapping[Text, Card]):
+    """
+    A columnar store of cards keyed by headword, for large exports. Only the
+    three source columns are kept until a card is first looked up; the Card
+    materialized then is kept, so that the fields it derives lazily are
+    derived once however often it is looked up.
+    """
+
+    def __init__(self):
+        self._headwords: List[Text] = []
+        self._pinyin_strs: List[Text] = []
+        self._defns: List[Text] = []
+        self._cards: List[Optional[Card]] = []
+        self._index = {}
+
+    @staticmethod
+    def FromCards(cards) -> "CardTable":
+        table = CardTable()
+        for card_obj in cards:
+            table.add(card_obj)
+        return table
+
+    def add(self, card_obj: Card):
+        # Later cards replace earlier cards with the same headword, like a dict.
+        row = self._index.get(card_obj._headword)
+        if row is None:
+            self._index[card_obj._headword] = len(self._headwords)
+            self._headwords.append(card_obj._headword)
+            self._pinyin_strs.append(card_obj._pinyin_str)
+            self._defns.append(card_obj._defn)
+            self._cards.append(None)
+        else:
+            self._pinyin_strs[row] = card_obj._pinyin_str
+            self._defns[row] = card_obj._defn
+            self._cards[row] = None
+
+    def _card(self, row: int) -> Card:
+        # Two threads may both materialize a row; either Card will do.
+        card_obj = self._cards[row]
+        if card_obj is None:
+            card_obj = Card(self._headwords[row], self._pinyin_strs[row],
+                            self._defns[row])
+            self._cards[row] = card_obj
+        return card_obj
+
+    def __getitem__(self, headword: Text) -> Card:
+        return self._card(self._index[headword])
+
+    def __contains__(self, headword) -> bool:
+        return headword in self._index
+
+    def __iter__(self) -> Iterator[Text]:
+        return iter(self._headwords)
+
+    def __len__(self) -> int:
+        return len(self._headwords)
+
+    def cards(self) -> Iterator[Card]:
+        for row in range(len(self._headwords)):
+            yield self._card(row)
@@ -23,13 +23,6 @@ class CardCreationTest(unittest.TestCase):
         self.assertRegexpMatches(c._defn, ".*noun common cold.*")
 
 
-class MatchNumbersTest(unittest.TestCase):
-    def test(self):
-        input = "1 foo 2 bar 3 baz"
-        self.assertEqual(card._match_numbers(input),
-                         "<ol><li>foo </li><li>bar </li><li>baz</li></ol>")
-
-
 class MakeDefnHtml(unittest.TestCase):
     def test_make_defn_html(self):
         for input, expected_output in [
@@ -98,5 +91,48 @@ class ToHtmlTest(unittest.TestCase):
             self.assertEqual(card._pinyin_text_to_html(input), output)
 
 
+class LazyCardTest(unittest.TestCase):
+    def test_derived_fields(self):
+        c = card.Card("感冒", "gan3mao4", "1 foo 2 bar")
+        self.assertIsNone(c._pinyin_html_cache)
+        self.assertEqual(c._filename, "gan3mao4.flac")
+        self.assertEqual(c._sound, "[sound:gan3mao4.flac]")
+        self.assertEqual(c._defn_html, "<ol><li>foo </li><li>bar</li></ol>")
+        self.assertEqual(c._pinyin_html, card._pinyin_text_to_html("gan3mao4"))
+        self.assertIsNotNone(c._pinyin_html_cache)
+
+    def test_slots(self):
+        c = card.Card("感冒", "gan3mao4", "foo")
+        with self.assertRaises(AttributeError):
+            c.foo = 1
+
+
+class CardTableTest(unittest.TestCase):
+    def test_table(self):
+        table = card.CardTable.FromCards([
+            card.Card("感冒", "gan3mao4", "foo"),
+            card.Card("黑", "hei1", "black"),
+            card.Card("感冒", "gan3mao4", "bar"),
+        ])
+        self.assertEqual(len(table), 2)
+        self.assertEqual(list(table.keys()), ["感冒", "黑"])
+        self.assertIn("黑", table)
+        self.assertNotIn("白", table)
+        self.assertEqual(table["感冒"]._defn, "bar")
+        self.assertEqual(table["黑"]._sound, "[sound:hei1.flac]")
+        self.assertEqual([c._headword for c in table.cards()], ["感冒", "黑"])
+        with self.assertRaises(KeyError):
+            table["白"]
+
+    def test_table_keeps_looked_up_cards(self):
+        table = card.CardTable.FromCards([card.Card("黑", "hei1", "black")])
+        card_obj = table["黑"]
+        self.assertIs(table["黑"], card_obj)
+        self.assertIs(next(table.cards()), card_obj)
+        # Replaced, so derived afresh.
+        table.add(card.Card("黑", "hei1", "dark"))
+        self.assertEqual(table["黑"]._defn_html, "dark")
+
+
 if __name__ == '__main__':
     unittest.main()
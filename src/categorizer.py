@@ -1,7 +1,9 @@
-import networkx as nx
-import more_itertools
 from absl import logging
 from enum import IntEnum, auto
+from typing import Dict, Iterable, Optional, Text
+import hashlib
+import json
+import os
 
 from src import decomposer as decomposer_lib
 from src import hsk_utils as hsk_utils_lib
@@ -43,6 +45,10 @@ class Categorizer():
         self._hsk_reader = hsk_reader
 
     def sort_into_deck(self, headword) -> Deck:
+        # Imported here rather than at the top, to keep startup fast.
+        import more_itertools
+        import networkx as nx
+
         if len(headword) > 5:
             logging.info(f"Skipping {headword}, too long.")
             return Deck.OTHER_V1
@@ -112,3 +118,75 @@ class Categorizer():
             Deck.HSK_5_MINUS_V1: Deck.HSK_5_PLUS_V1,
             Deck.HSK_6_MINUS_V1: Deck.HSK_6_PLUS_V1,
         }.get(min_deck, Deck.OTHER_V1)
+
+
+class CachingCategorizer(Categorizer):
+    """
+    A Categorizer which remembers every headword it sorted, including the
+    parts of compounds it sorts along the way. The decomposer and HSK lists
+    don't change while it lives, so neither do its answers; a long-lived one
+    answers repeat headwords, e.g. across watched exports, at once.
+
+    If |cache_path| is given, what it remembers is saved there by save() and
+    reused by later runs, for as long as they pass the same |fingerprint|,
+    which should change whenever the reference data or the rules do.
+    """
+
+    def __init__(self,
+                 decomposer: decomposer_lib.Decomposer,
+                 hsk_reader: hsk_utils_lib.HskReader,
+                 cache_path: Optional[Text] = None,
+                 fingerprint: Text = ""):
+        super().__init__(decomposer, hsk_reader)
+        self._cache_path = cache_path
+        self._fingerprint = fingerprint
+        # Single dict operations are atomic, so concurrent callers at worst
+        # sort the same headword twice.
+        self._decks: Dict[Text, Deck] = self._load()
+
+    def _load(self) -> Dict[Text, Deck]:
+        if not self._cache_path or not os.path.exists(self._cache_path):
+            return {}
+        try:
+            with open(self._cache_path) as f:
+                saved = json.load(f)
+            if saved["fingerprint"] != self._fingerprint:
+                logging.info(f"Ignoring {self._cache_path}: it was made from "
+                             "other reference data.")
+                return {}
+            decks = {hw: Deck[name] for hw, name in saved["decks"].items()}
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"Ignoring categorizer cache {self._cache_path}: "
+                            f"{e}")
+            return {}
+        logging.info(f"Loaded {len(decks)} categorized headwords from "
+                     f"{self._cache_path}.")
+        return decks
+
+    def save(self):
+        if not self._cache_path:
+            return
+        saved = {
+            "fingerprint": self._fingerprint,
+            "decks": {hw: deck.name for hw, deck in list(self._decks.items())},
+        }
+        tmp = f"{self._cache_path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(saved, f, ensure_ascii=False)
+        os.replace(tmp, self._cache_path)
+
+    def sort_into_deck(self, headword) -> Deck:
+        deck = self._decks.get(headword)
+        if deck is None:
+            deck = super().sort_into_deck(headword)
+            self._decks[headword] = deck
+        return deck
+
+
+def Fingerprint(paths: Iterable[Text]) -> Text:
+    """A digest of the files at |paths|, e.g. for CachingCategorizer."""
+    h = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            h.update(hashlib.sha256(f.read()).digest())
+    return h.hexdigest()
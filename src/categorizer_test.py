@@ -4,6 +4,8 @@ from src import categorizer as categorizer_lib
 from src.categorizer import Deck
 
 from unittest.mock import MagicMock, call
+import os
+import tempfile
 from absl.testing import absltest
 
 
@@ -174,6 +176,57 @@ class CategorizerTest(absltest.TestCase):
         self.assertEqual(c.sort_into_deck("c"), Deck.HSK_4_V1)
         self.assertEqual(c.sort_into_deck("l"), Deck.HSK_1_MINUS_V1)
 
+    def test_caching(self):
+        hsk_reader = MagicMock()
+        hsk_reader.GetHskLevel.side_effect = lambda hw: {
+            "a": 3, "b": 4}.get(hw, None)
+        hsk_reader.GetHskAndBelow.side_effect = lambda lvl: set()
+        decomposer = MagicMock()
+        decomposer._graph = nx.DiGraph()
+
+        c = categorizer_lib.CachingCategorizer(decomposer, hsk_reader)
+
+        self.assertEqual(c.sort_into_deck("ab"), Deck.HSK_4_PLUS_V1)
+        calls = hsk_reader.GetHskLevel.call_count
+        # Both the compound and its parts were remembered.
+        self.assertEqual(c.sort_into_deck("ab"), Deck.HSK_4_PLUS_V1)
+        self.assertEqual(c.sort_into_deck("a"), Deck.HSK_3_V1)
+        self.assertEqual(hsk_reader.GetHskLevel.call_count, calls)
+
+    def test_caching_persists(self):
+        hsk_reader = MagicMock()
+        hsk_reader.GetHskLevel.side_effect = lambda hw: {"a": 3}.get(hw)
+        decomposer = MagicMock()
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "categorized.json")
+            c = categorizer_lib.CachingCategorizer(
+                decomposer, hsk_reader, cache_path=path, fingerprint="v1")
+            self.assertEqual(c.sort_into_deck("a"), Deck.HSK_3_V1)
+            c.save()
+
+            hsk_reader.GetHskLevel.reset_mock()
+            c = categorizer_lib.CachingCategorizer(
+                decomposer, hsk_reader, cache_path=path, fingerprint="v1")
+            self.assertEqual(c.sort_into_deck("a"), Deck.HSK_3_V1)
+            hsk_reader.GetHskLevel.assert_not_called()
+
+            # Other reference data; sorted afresh.
+            c = categorizer_lib.CachingCategorizer(
+                decomposer, hsk_reader, cache_path=path, fingerprint="v2")
+            self.assertEqual(c.sort_into_deck("a"), Deck.HSK_3_V1)
+            hsk_reader.GetHskLevel.assert_called_with("a")
+
+    def test_fingerprint(self):
+        with tempfile.TemporaryDirectory() as d:
+            a, b = os.path.join(d, "a"), os.path.join(d, "b")
+            for path in [a, b]:
+                with open(path, "w") as f:
+                    f.write(path)
+            self.assertEqual(categorizer_lib.Fingerprint([a, b]),
+                             categorizer_lib.Fingerprint([a, b]))
+            self.assertNotEqual(categorizer_lib.Fingerprint([a, b]),
+                                categorizer_lib.Fingerprint([b, a]))
+
 
 if __name__ == "__main__":
     absltest.main()
@@ -0,0 +1,134 @@
+from absl import logging
+from typing import Dict, Iterable, Iterator, List, Optional, Text, Tuple
+import os
+import re
+import sqlite3
+
+# Traditional Simplified [pin1 yin1] /sense/sense/
+_LINE_RE = re.compile(r"^(\S+) (\S+) \[([^\]]*)\] /(.*)/\s*$")
+# Bump when the index's layout changes.
+_SCHEMA = 1
+# Headwords per query; SQLite's default limit on parameters is 999.
+_BATCH = 500
+
+
+def _parse(path: Text) -> Iterator[Tuple[Text, Text, Text]]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("#"):
+                continue
+            m = _LINE_RE.match(line)
+            if m is None:
+                continue
+            _, simplified, pinyin, senses = m.groups()
+            yield simplified, pinyin, senses
+
+
+def _sanitize_pinyin(pinyin: Text) -> Text:
+    # CC-CEDICT writes ü as u:, which Card's sanitizer would drop.
+    return re.sub(r"\W+", "", pinyin.replace("u:", "ü")).lower()
+
+
+def _format_defn(senses: Text) -> Text:
+    # In the numbered shape of Pleco's definitions, which definitions
+    # formats as a list, and without semicolons, like get_defn's.
+    senses = [s.replace(";", ".") for s in senses.split("/") if s]
+    if len(senses) == 1:
+        return senses[0]
+    return " ".join(f"{i} {s}" for i, s in enumerate(senses, start=1))
+
+
+class Cedict():
+    """
+    Pinyin and definitions for headwords, from a CC-CEDICT file.
+
+    The file is indexed once into a SQLite table at |index_path|, by
+    default beside it, and indexed again only when the file changes. Each
+    lookup() answers a whole batch of headwords from the index, one query
+    per few hundred, on a connection of its own, so a Cedict may be shared
+    with forked processes.
+    """
+
+    def __init__(self, path: Text, index_path: Optional[Text] = None):
+        self._path = path
+        self._index_path = index_path or f"{path}.sqlite"
+        stat = os.stat(path)
+        self._source = f"{stat.st_size}:{stat.st_mtime_ns}"
+        if not self._is_current():
+            self._build()
+
+    def _is_current(self) -> bool:
+        if not os.path.exists(self._index_path):
+            return False
+        try:
+            conn = self._connect()
+            try:
+                meta = dict(conn.execute("select key, value from meta"))
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logging.warning(f"Ignoring CC-CEDICT index {self._index_path}: "
+                            f"{e}")
+            return False
+        return meta == {"schema": str(_SCHEMA), "source": self._source}
+
+    def _build(self):
+        tmp = f"{self._index_path}.tmp"
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        conn = sqlite3.connect(tmp)
+        try:
+            conn.execute("create table entries (simplified text not null, "
+                         "pinyin text not null, defn text not null)")
+            conn.executemany("insert into entries values (?, ?, ?)",
+                             _parse(self._path))
+            conn.execute("create index by_simplified on entries (simplified)")
+            conn.execute("create table meta (key text primary key, value text)")
+            conn.executemany("insert into meta values (?, ?)", [
+                ("schema", str(_SCHEMA)), ("source", self._source)])
+            conn.commit()
+            (n,) = conn.execute("select count(*) from entries").fetchone()
+        finally:
+            conn.close()
+        os.replace(tmp, self._index_path)
+        logging.info(f"Indexed {n} CC-CEDICT entries into "
+                     f"{self._index_path}.")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(
+            f"file:{self._index_path}?mode=ro", uri=True)
+
+    def lookup(self, wanted: Iterable[Tuple[Text, Optional[Text]]]
+               ) -> Dict[Text, Tuple[Text, Text]]:
+        """
+        Looks up each (headword, pinyin or None), and returns headword =>
+        (pinyin, definition) of one of its readings, for those found. The
+        reading with the given pinyin is preferred, then the first which
+        isn't a proper noun's. Pinyin is returned like "gan3mao4".
+        """
+        wanted = dict(wanted)
+        entries: Dict[Text, List[Tuple[Text, Text]]] = {}
+        headwords = list(wanted)
+        conn = self._connect()
+        try:
+            for i in range(0, len(headwords), _BATCH):
+                batch = headwords[i:i + _BATCH]
+                for simplified, pinyin, senses in conn.execute(
+                        "select simplified, pinyin, defn from entries "
+                        f"where simplified in ({','.join('?' * len(batch))}) "
+                        "order by rowid", batch):
+                    entries.setdefault(simplified, []).append(
+                        (pinyin, senses))
+        finally:
+            conn.close()
+
+        found = {}
+        for headword, readings in entries.items():
+            pinyin = wanted[headword]
+            matching = [r for r in readings
+                        if pinyin is not None and
+                        _sanitize_pinyin(r[0]) == _sanitize_pinyin(pinyin)]
+            common = [r for r in readings if not r[0][:1].isupper()]
+            reading, senses = (matching or common or readings)[0]
+            found[headword] = (_sanitize_pinyin(reading), _format_defn(senses))
+        return found
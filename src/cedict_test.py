@@ -0,0 +1,67 @@
+from src import cedict as cedict_lib
+
+from absl.testing import absltest
+import os
+import tempfile
+
+_CEDICT = """# CC-CEDICT
+# A comment.
+感冒 感冒 [gan3 mao4] /to catch cold/(common) cold/
+長 长 [chang2] /length/long/
+長 长 [zhang3] /chief; head/to grow/
+綠 绿 [lu:4] /green/
+李 李 [Li3] /surname Li/
+李 李 [li3] /plum/
+not an entry
+"""
+
+
+class CedictTest(absltest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "cedict_ts.u8")
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(_CEDICT)
+
+    def test_lookup(self):
+        cedict = cedict_lib.Cedict(self.path)
+        self.assertTrue(os.path.exists(f"{self.path}.sqlite"))
+
+        self.assertEqual(cedict.lookup([
+            ("感冒", None), ("长", "zhang3"), ("绿", None), ("李", None),
+            ("无", None),
+        ]), {
+            "感冒": ("gan3mao4", "1 to catch cold 2 (common) cold"),
+            "长": ("zhang3", "1 chief. head 2 to grow"),
+            "绿": ("lü4", "green"),
+            # Not the surname.
+            "李": ("li3", "plum"),
+        })
+        # Unmatched pinyin falls back to the first reading.
+        self.assertEqual(cedict.lookup([("长", "zhang4")]),
+                         {"长": ("chang2", "1 length 2 long")})
+
+    def test_indexes_once(self):
+        index_path = os.path.join(self.dir, "index.sqlite")
+        cedict_lib.Cedict(self.path, index_path)
+        mtime = os.stat(index_path).st_mtime_ns
+
+        cedict_lib.Cedict(self.path, index_path)
+        self.assertEqual(os.stat(index_path).st_mtime_ns, mtime)
+
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("無 无 [wu2] /not to have/\n")
+        cedict = cedict_lib.Cedict(self.path, index_path)
+        self.assertEqual(cedict.lookup([("无", None)]),
+                         {"无": ("wu2", "not to have")})
+
+    def test_large_batch(self):
+        cedict = cedict_lib.Cedict(self.path)
+        wanted = [(f"字{i}", None) for i in range(1200)] + [("感冒", None)]
+        self.assertEqual(list(cedict.lookup(wanted)), ["感冒"])
+
+
+if __name__ == "__main__":
+    absltest.main()
@@ -1,24 +1,154 @@
 from src import card
+from src import cedict as cedict_lib
+from src import metrics as metrics_lib
+from src import xml_extractors
 
 from absl import logging
-from typing import Mapping, Text
+from typing import Dict, Iterable, Iterator, Mapping, Optional, Text, Tuple
 import xml.etree.ElementTree as ET
 
 
-def ExtractCards(path_to_xml_input_file) -> Mapping[Text, card.Card]:
+def _partial(entry) -> Optional[Tuple[Text, Optional[Text], Optional[Text]]]:
+    # The headword, pinyin and definition of an entry which Card.Build
+    # rejected, each None if absent; or None if even the headword is.
+    try:
+        headword = xml_extractors.get_headword(entry)
+    except ValueError:
+        return None
+    fields = []
+    for get in [xml_extractors.get_pron_numbers, xml_extractors.get_defn]:
+        try:
+            fields.append(get(entry))
+        except ValueError:
+            fields.append(None)
+    return (headword, *fields)
+
+
+def _rejection(entry, e: BaseException) -> Text:
+    # Why Card.Build rejected an entry, for the cards_rejected counters. The
+    # extractors all raise ValueError, so the entry itself is looked at.
+    if entry is None:
+        return "missing_entry"
+    try:
+        xml_extractors.get_headword(entry)
+    except ValueError:
+        return "missing_headword"
+    pron = entry.find('pron')
+    if pron is None or not pron.text:
+        return "missing_pron"
+    if pron.get('type') != "hypy":
+        return "non_pinyin_pron"
+    if pron.get('tones') != "numbers":
+        return "non_numeric_tones"
+    try:
+        xml_extractors.get_defn(entry)
+    except ValueError:
+        return "missing_defn"
+    return type(e).__name__
+
+
+def IterCards(path_to_xml_input_file,
+              metrics: Optional[metrics_lib.Metrics] = None,
+              backfill: Optional[cedict_lib.Cedict] = None
+              ) -> Iterator[card.Card]:
+    """
+    Yields each card in the export as it is parsed, without holding the whole
+    document in memory. Cards which can't be built are counted and skipped.
+
+    If |backfill| is given, cards missing only their pinyin or definition
+    are instead completed from it, and yielded after the rest, from one
+    batched lookup.
+    """
+    metrics = metrics or metrics_lib.Metrics(enabled=False)
+    # Headword => (pinyin, definition, why Card.Build rejected it).
+    missing: Dict[Text, Tuple[Optional[Text], Optional[Text], Text]] = {}
+    # Only kept to backfill, so that complete cards win.
+    built = set()
 
-    cards_list = ET.parse(path_to_xml_input_file).getroot().find('cards')
-    if cards_list is None:
+    # The cards are the children of the root's first `cards` element.
+    depth = 0
+    cards_list = None
+    found = False
+    for event, elem in ET.iterparse(path_to_xml_input_file,
+                                    events=("start", "end")):
+        if event == "start":
+            depth += 1
+            if depth == 2 and elem.tag == "cards" and not found:
+                cards_list, found = elem, True
+            continue
+        depth -= 1
+        if elem is cards_list:
+            cards_list = None
+        elif cards_list is not None and depth == 2:
+            try:
+                card_obj = card.Card.Build(elem.find('entry'))
+            except BaseException as e:
+                entry = elem.find('entry')
+                partial = _partial(entry) if backfill else None
+                if partial is None or partial[0] in built:
+                    metrics.count(f"cards_rejected/{_rejection(entry, e)}")
+                else:
+                    headword, pinyin, defn = partial
+                    missing[headword] = (pinyin, defn, _rejection(entry, e))
+            else:
+                metrics.count("cards_parsed")
+                if backfill:
+                    built.add(card_obj._headword)
+                    missing.pop(card_obj._headword, None)
+                yield card_obj
+            # Done with it; don't let the tree grow.
+            cards_list.remove(elem)
+    if not found:
         raise ValueError("Could not find inner element `cards`.")
-    logging.info("Analyzing %d cards.", len(cards_list))
+    if missing:
+        yield from _backfill(missing, backfill, metrics)
 
-    cards = {}
 
-    for xml_card in cards_list:
-        try:
-            card_obj = card.Card.Build(xml_card.find('entry'))
-        except BaseException:
+def _backfill(missing: Dict[Text, Tuple[Optional[Text], Optional[Text], Text]],
+              backfill: cedict_lib.Cedict,
+              metrics: metrics_lib.Metrics) -> Iterator[card.Card]:
+    found = backfill.lookup(
+        (headword, pinyin) for headword, (pinyin, _, _) in missing.items())
+    logging.info(f"Backfilling {len(found)} of {len(missing)} incomplete "
+                 "cards.")
+    for headword, (pinyin, defn, error) in missing.items():
+        if headword not in found:
+            metrics.count(f"cards_rejected/{error}")
+            continue
+        found_pinyin, found_defn = found[headword]
+        metrics.count("cards_backfilled")
+        metrics.count("cards_parsed")
+        # Only what the export lacked.
+        yield card.Card(headword,
+                        card._sanitize_pinyin(pinyin or found_pinyin),
+                        defn if defn is not None else found_defn)
+
+
+def UniqueCards(cards: Iterable[card.Card],
+                metrics: Optional[metrics_lib.Metrics] = None,
+                counter: Text = "cards_duplicate") -> Iterator[card.Card]:
+    """
+    Yields the first card of each headword as it comes, counting the later
+    ones under |counter| and dropping them. Both the notes and the CSV rows
+    go through this, so they agree on which card of a headword wins.
+    """
+    metrics = metrics or metrics_lib.Metrics(enabled=False)
+    seen = set()
+    for card_obj in cards:
+        if card_obj._headword in seen:
+            metrics.count(counter)
             continue
-        cards[card_obj._headword] = card_obj
+        seen.add(card_obj._headword)
+        yield card_obj
+
 
+def ExtractCards(path_to_xml_input_file,
+                 metrics: Optional[metrics_lib.Metrics] = None,
+                 backfill: Optional[cedict_lib.Cedict] = None
+                 ) -> card.CardTable:
+    cards = card.CardTable()
+    for card_obj in UniqueCards(
+            IterCards(path_to_xml_input_file, metrics, backfill), metrics):
+        cards.add(card_obj)
+    logging.info("Extracted %d cards.", len(cards))
     return cards
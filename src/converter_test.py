@@ -1,5 +1,9 @@
 import converter
+from src import card
+from src import cedict as cedict_lib
+from src import metrics as metrics_lib
 
+import os
 import unittest
 import tempfile
 
@@ -14,6 +18,99 @@ class ConverterTest(unittest.TestCase):
         self.assertSetEqual(set(cards.keys()),
                             set(["再次", "进行", "黑", "感冒"]))
 
+    def test_iter_cards(self):
+        headwords = [c._headword for c in converter.IterCards(
+            "testdata/input.xml")]
+        self.assertCountEqual(headwords, ["再次", "进行", "黑", "感冒"])
+
+    def test_backfill(self):
+        d = tempfile.mkdtemp()
+        cedict_path = os.path.join(d, "cedict_ts.u8")
+        with open(cedict_path, "w", encoding="utf-8") as f:
+            f.write("白 白 [bai2] /white/\n"
+                    "紅 红 [hong2] /red/\n"
+                    "黑 黑 [hei1] /black/\n")
+        entries = [
+            # No pron.
+            '<headword charset="sc">白</headword><defn>pale</defn>',
+            # No defn.
+            '<headword charset="sc">红</headword>'
+            '<pron type="hypy" tones="numbers">hong2</pron>',
+            # Complete, and first, so it wins over the one below.
+            '<headword charset="sc">黑</headword>'
+            '<pron type="hypy" tones="numbers">hei1</pron><defn>dark</defn>',
+            '<headword charset="sc">黑</headword>',
+            # Not in the dictionary.
+            '<headword charset="sc">绿</headword>',
+        ]
+        xml_path = os.path.join(d, "export.xml")
+        with open(xml_path, "w", encoding="utf-8") as f:
+            f.write("<plecoflash><cards>" + "".join(
+                f"<card><entry>{e}</entry></card>" for e in entries) +
+                "</cards></plecoflash>")
+        metrics = metrics_lib.Metrics(enabled=True, trace_memory=False)
+
+        cards = converter.ExtractCards(
+            xml_path, metrics, backfill=cedict_lib.Cedict(cedict_path))
+
+        self.assertEqual(
+            {hw: (c._pinyin_str, c._defn) for hw, c in cards.items()},
+            {"白": ("bai2", "pale"), "红": ("hong2", "red"),
+             "黑": ("hei1", "dark")})
+        self.assertEqual(metrics.report()["counters"], {
+            "cards_backfilled": 2, "cards_parsed": 3,
+            "cards_rejected/missing_pron": 2})
+        # Without it, as before.
+        self.assertEqual(list(converter.ExtractCards(xml_path)), ["黑"])
+
+    def test_rejection_reasons(self):
+        entries = [
+            '<headword charset="tc">黑</headword>',
+            '<headword charset="sc">白</headword><defn>white</defn>',
+            '<headword charset="sc">红</headword>'
+            '<pron type="hypy" tones="marks">hóng</pron><defn>red</defn>',
+            '<headword charset="sc">绿</headword>'
+            '<pron type="hypy" tones="numbers">lü4</pron>',
+            '<headword charset="sc">黄</headword>'
+            '<pron type="hypy" tones="numbers">huang2</pron>'
+            '<defn>yellow</defn>',
+        ]
+        with tempfile.NamedTemporaryFile("w", suffix=".xml",
+                                         encoding="utf-8") as f:
+            f.write("<plecoflash><cards>" + "".join(
+                f"<card><entry>{e}</entry></card>" for e in entries) +
+                "</cards></plecoflash>")
+            f.flush()
+            metrics = metrics_lib.Metrics(enabled=True, trace_memory=False)
+
+            self.assertEqual(list(converter.ExtractCards(f.name, metrics)),
+                             ["黄"])
+
+        self.assertEqual(metrics.report()["counters"], {
+            "cards_parsed": 1,
+            "cards_rejected/missing_headword": 1,
+            "cards_rejected/missing_pron": 1,
+            "cards_rejected/non_numeric_tones": 1,
+            "cards_rejected/missing_defn": 1})
+
+    def test_first_card_of_a_headword_wins(self):
+        metrics = metrics_lib.Metrics(enabled=True, trace_memory=False)
+        cards = [card.Card("黑", "hei1", "black"),
+                 card.Card("白", "bai2", "white"),
+                 card.Card("黑", "hei1", "dark")]
+
+        unique = list(converter.UniqueCards(cards, metrics, "dupes"))
+
+        self.assertEqual([c._defn for c in unique], ["black", "white"])
+        self.assertEqual(metrics.report()["counters"], {"dupes": 1})
+
+    def test_no_cards_element(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".xml") as f:
+            f.write("<plecoflash><categories/></plecoflash>")
+            f.flush()
+            with self.assertRaises(ValueError):
+                converter.ExtractCards(f.name)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,111 @@
+from absl import logging
+from concurrent import futures
+from typing import Deque, Iterable, List, Optional, Text, Tuple
+import collections
+import csv
+import gzip
+import io
+import os
+
+from src import card as card_lib
+from src import converter as converter_lib
+from src import metrics as metrics_lib
+
+DELIMITERS = {"semicolon": ";", "tab": "\t"}
+# Cards per chunk handed to a worker.
+_CHUNK_SIZE = 2000
+_BUFFER_BYTES = 1 << 20
+
+
+def _format_chunk(rows: List[Tuple[Text, Text, Text]], delimiter: Text,
+                  compress: bool) -> bytes:
+    # Runs in a worker process. Gets the cards' source columns rather than
+    # Cards, which are cheaper to send.
+    out = io.StringIO()
+    writer = csv.writer(out, delimiter=delimiter, lineterminator="\n")
+    for headword, pinyin_str, defn in rows:
+        row = card_lib.Card(headword, pinyin_str, defn).MakeRow()
+        writer.writerow([row["pinyin"], row["characters"], row["meaning"]])
+    data = out.getvalue().encode("utf-8")
+    # Concatenated gzip members are themselves a gzip file, so chunks can be
+    # compressed apart.
+    return gzip.compress(data, mtime=0) if compress else data
+
+
+class CsvWriter():
+    """
+    Writes cards as rows of pinyin HTML, headword and definition HTML, for
+    Anki's text importer or anything else, without building notes.
+
+    Cards are formatted, and with a .gz |path| compressed, in chunks on a
+    pool of |max_workers| processes, while the caller goes on parsing; the
+    chunks are written in order, in large writes. With max_workers=1 they
+    are formatted in-process.
+
+    A headword is written once, with its first card, as converter.UniqueCards
+    picks it for notes too.
+    """
+
+    def __init__(self,
+                 path: Text,
+                 delimiter: Text = ";",
+                 max_workers: Optional[int] = None,
+                 chunk_size: int = _CHUNK_SIZE,
+                 metrics: Optional[metrics_lib.Metrics] = None):
+        self._path = path
+        self._delimiter = delimiter
+        self._max_workers = max_workers or os.cpu_count() or 1
+        self._chunk_size = chunk_size
+        self._metrics = metrics or metrics_lib.Metrics(enabled=False)
+
+    def _chunks(self, cards: Iterable[card_lib.Card]
+                ) -> Iterable[List[Tuple[Text, Text, Text]]]:
+        chunk = []
+        for card_obj in converter_lib.UniqueCards(
+                cards, self._metrics, "rows_duplicate"):
+            chunk.append((card_obj._headword, card_obj._pinyin_str,
+                          card_obj._defn))
+            if len(chunk) == self._chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def write(self, cards: Iterable[card_lib.Card]) -> int:
+        """Writes |cards|, replacing |path|, and returns the rows written."""
+        compress = self._path.endswith(".gz")
+        tmp = f"{self._path}.tmp"
+        rows = 0
+        with open(tmp, "wb", buffering=_BUFFER_BYTES) as f:
+            if self._max_workers == 1:
+                for chunk in self._chunks(cards):
+                    f.write(_format_chunk(chunk, self._delimiter, compress))
+                    rows += len(chunk)
+            else:
+                rows = self._write_parallel(cards, f, compress)
+        os.replace(tmp, self._path)
+        self._metrics.count("rows_written", rows)
+        logging.info(f"Wrote {rows} rows to {self._path}.")
+        return rows
+
+    def _write_parallel(self, cards: Iterable[card_lib.Card], f,
+                        compress: bool) -> int:
+        rows = 0
+        # Enough chunks in flight to keep every worker busy, and few enough
+        # that memory stays bounded however large the export.
+        in_flight: Deque[Tuple[futures.Future, int]] = collections.deque()
+        with futures.ProcessPoolExecutor(
+                max_workers=self._max_workers) as executor:
+            for chunk in self._chunks(cards):
+                if len(in_flight) >= 2 * self._max_workers:
+                    future, n = in_flight.popleft()
+                    f.write(future.result())
+                    rows += n
+                in_flight.append((executor.submit(
+                    _format_chunk, chunk, self._delimiter, compress),
+                    len(chunk)))
+            while in_flight:
+                future, n = in_flight.popleft()
+                f.write(future.result())
+                rows += n
+        return rows
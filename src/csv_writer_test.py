@@ -0,0 +1,61 @@
+from src import card as card_lib
+from src import csv_writer as csv_writer_lib
+from src import metrics as metrics_lib
+
+from absl.testing import absltest
+import csv
+import gzip
+import io
+import os
+import tempfile
+
+
+def _cards(n):
+    return [card_lib.Card(f"字{i}", "hei1", f"black; {i}") for i in range(n)]
+
+
+class CsvWriterTest(absltest.TestCase):
+
+    def test_rows(self):
+        path = os.path.join(tempfile.mkdtemp(), "out.csv")
+        metrics = metrics_lib.Metrics(enabled=True, trace_memory=False)
+        cards = _cards(2) + [card_lib.Card("字0", "bai2", "white")]
+        writer = csv_writer_lib.CsvWriter(path, max_workers=1,
+                                          metrics=metrics)
+
+        self.assertEqual(writer.write(cards), 2)
+
+        with open(path, encoding="utf-8") as f:
+            rows = list(csv.reader(f, delimiter=";"))
+        # The definition's semicolon is quoted. The first card of a
+        # headword is written, as converter.UniqueCards keeps it.
+        c = cards[0]
+        self.assertEqual(rows[0], [c._pinyin_html, "字0", c._defn_html])
+        self.assertEqual([r[1] for r in rows], ["字0", "字1"])
+        self.assertEqual(metrics.report()["counters"],
+                         {"rows_duplicate": 1, "rows_written": 2})
+        self.assertFalse(os.path.exists(f"{path}.tmp"))
+
+    def test_parallel_gzip_tsv_keeps_order(self):
+        d = tempfile.mkdtemp()
+        cards = _cards(25)
+        serial = os.path.join(d, "serial.tsv")
+        csv_writer_lib.CsvWriter(serial, delimiter="\t",
+                                 max_workers=1).write(cards)
+        parallel = os.path.join(d, "parallel.tsv.gz")
+        writer = csv_writer_lib.CsvWriter(parallel, delimiter="\t",
+                                          max_workers=2, chunk_size=3)
+
+        self.assertEqual(writer.write(iter(cards)), 25)
+
+        with open(serial, "rb") as f:
+            expected = f.read()
+        with gzip.open(parallel, "rb") as f:
+            self.assertEqual(f.read(), expected)
+        rows = list(csv.reader(io.StringIO(expected.decode("utf-8")),
+                               delimiter="\t"))
+        self.assertEqual([r[1] for r in rows], [f"字{i}" for i in range(25)])
+
+
+if __name__ == "__main__":
+    absltest.main()
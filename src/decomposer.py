@@ -1,10 +1,13 @@
 from absl import logging
 from third_party import ids
-from typing import Text, Optional, Callable, Any, Dict, TypeVar, Tuple, cast, List, Callable, Iterable
+from typing import TYPE_CHECKING, Text, Optional, Callable, Any, Dict, TypeVar, Tuple, cast, List, Callable, Iterable
 import dataclasses
-import networkx as nx
 import re
 
+if TYPE_CHECKING:
+    # Only for annotations; the graph is built with it on first use.
+    import networkx
+
 # new types
 LookupCb = Callable[[Text], Optional[Text]]
 
@@ -214,7 +217,7 @@ def _get_decomposition(
     return d["ids"]
 
 
-def _build_paths(g: nx.DiGraph, node: Any, data_lookup: Callable[[
+def _build_paths(g: "networkx.DiGraph", node: Any, data_lookup: Callable[[
                  Dict[K, V]], V], accumulator: Callable[[V, V], V]):
     result = {}
     for succ in g.successors(node):
@@ -244,15 +247,17 @@ def _parse(text_in: Text) -> Optional[IdeographicSequence]:
 
 
 class Decomposer():
-    def __init__(self):
+    def __init__(self, ids_path: Optional[Text] = None):
+        """Loads |ids_path|, an IDS.txt or a subset of one, or the bundled one."""
 
         # Graph where the nodes are unicode characters and the edges are "contains"
         # such that successors(尔) = [...你...]., and predecessors(你) = [亻,尔].
         # So, insert with self._graph.add_edge( "亻", "你" )
         #                 self._graph.add_edge( "尔", "你" )
+        import networkx as nx
         self._graph = nx.DiGraph()
 
-        with open(ids.PATH_TO_IDS_TXT, encoding="UTF-8") as fp:
+        with open(ids_path or ids.PATH_TO_IDS_TXT, encoding="UTF-8") as fp:
             for line in fp:
                 # Ignore comments
                 if line.startswith("#"):
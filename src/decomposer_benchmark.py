@@ -0,0 +1,163 @@
+#! /usr/bin/python3
+
+from absl import app
+from absl import flags
+from concurrent import futures
+from typing import Dict, List, Optional, Text
+import collections
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+from src import benchmark_utils
+from src import decomposer as decomposer_lib
+from third_party import ids
+
+
+FLAGS = flags.FLAGS
+flags.DEFINE_list("fractions", ["0.125", "0.25", "0.5", "1"],
+                  "Fractions of IDS.txt to load, from its start.")
+flags.DEFINE_integer("seed", 0, "Seed for choosing the queried characters.")
+flags.DEFINE_integer("sample", 2000,
+                     "Number of characters to time decompose/contains/_expand "
+                     "on, per fraction.")
+flags.DEFINE_integer("repeat", 5, "Runs of each get_component call.")
+flags.DEFINE_string("baseline_out", None, "Write results here, as JSON.")
+flags.DEFINE_string("compare_to", None,
+                    "A --baseline_out from an earlier run to compare with.")
+flags.DEFINE_float("threshold", 0.1,
+                   "With --compare_to, fail if any time or memory grows by "
+                   "more than this fraction.")
+
+# Components which appear in thousands of characters.
+_HIGH_FAN_OUT = ["口", "木", "人", "氵"]
+
+
+def _write_subset(fraction: float, path: Text) -> int:
+    # The first |fraction| of the entries, so that a component's characters
+    # are a stable subset as the fraction grows. Returns the entry count.
+    with open(ids.PATH_TO_IDS_TXT, encoding="UTF-8") as f:
+        lines = [line for line in f if not line.startswith("#")]
+    subset = lines[:int(len(lines) * fraction)]
+    with open(path, "w", encoding="UTF-8") as f:
+        f.writelines(subset)
+    return len(subset)
+
+
+def _depth(decomposer: decomposer_lib.Decomposer, c: Text,
+           memo: Dict[Text, int]) -> int:
+    # How many levels _expand recurses through for |c|.
+    if c not in memo:
+        memo[c] = 0
+        if decomposer.contains(c):
+            sq = decomposer.decompose(c)
+            memo[c] = 1 + max(
+                [_depth(decomposer, p, memo) for p in sq.decomposition
+                 if p != c and p not in decomposer_lib._VERBS] or [0])
+    return memo[c]
+
+
+def _lookup(decomposer: decomposer_lib.Decomposer):
+    def lookup(c: Text) -> Optional[Text]:
+        if not decomposer.contains(c):
+            return None
+        return decomposer.decompose(c).decomposition
+    return lookup
+
+
+def _timed_each(fn, items) -> List[float]:
+    samples = []
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def _bench_subset(fraction: float, ids_path: Text, seed: int, sample: int,
+                  repeat: int) -> benchmark_utils.Results:
+    # Runs in a fresh child process, so that its RSS is this subset's alone.
+    # networkx is imported first so that it isn't counted.
+    import networkx  # noqa: F401
+    rss_before = benchmark_utils.CurrentRssBytes()
+    start = time.perf_counter()
+    decomposer = decomposer_lib.Decomposer(ids_path=ids_path)
+    construct_secs = time.perf_counter() - start
+    rss_after = benchmark_utils.CurrentRssBytes()
+
+    name = f"fraction={fraction:g}"
+    characters = sorted(decomposer.characters())
+    rng = random.Random(seed)
+    queries = rng.sample(characters, min(sample, len(characters)))
+    # Half of contains() queries miss: components, and unknown characters.
+    misses = [chr(0x4E00 + rng.randrange(0x5200)) for _ in queries]
+    results = {
+        f"Decomposer()/{name}": {
+            "secs": construct_secs,
+            "rss_bytes": rss_after - rss_before,
+            "characters": len(characters),
+            "nodes": decomposer._graph.number_of_nodes(),
+            "edges": decomposer._graph.number_of_edges(),
+        },
+        f"decompose/{name}": benchmark_utils.Percentiles(
+            _timed_each(decomposer.decompose, queries)),
+        f"contains/{name}": benchmark_utils.Percentiles(
+            _timed_each(decomposer.contains, queries + misses)),
+    }
+    for component in _HIGH_FAN_OUT:
+        if component not in decomposer._graph:
+            # Not in so small a subset.
+            continue
+        found = decomposer.get_component(component)
+        results[f"get_component({component})/{name}"] = dict(
+            benchmark_utils.Percentiles(_timed_each(
+                decomposer.get_component, [component] * repeat)),
+            fan_out=len(found))
+
+    lookup = _lookup(decomposer)
+    by_depth = collections.defaultdict(list)
+    memo: Dict[Text, int] = {}
+    for c in queries:
+        sq = decomposer.decompose(c)
+        start = time.perf_counter()
+        sq._expand(sq.decomposition, lookup)
+        by_depth[min(_depth(decomposer, c, memo), 4)].append(
+            time.perf_counter() - start)
+    for depth, samples in sorted(by_depth.items()):
+        label = f"{depth}+" if depth == 4 else str(depth)
+        results[f"_expand(depth={label})/{name}"] = dict(
+            benchmark_utils.Percentiles(samples), sample=len(samples))
+    return results
+
+
+def main(argv):
+    del argv
+
+    # A fresh interpreter per subset, so that memory freed by one
+    # construction isn't reused by the next and hidden from its RSS.
+    context = multiprocessing.get_context("spawn")
+    results: benchmark_utils.Results = {}
+    with tempfile.TemporaryDirectory() as d:
+        for fraction in map(float, FLAGS.fractions):
+            path = os.path.join(d, f"IDS-{fraction:g}.txt")
+            entries = _write_subset(fraction, path)
+            with futures.ProcessPoolExecutor(
+                    max_workers=1, mp_context=context) as executor:
+                subset = executor.submit(
+                    _bench_subset, fraction, path, FLAGS.seed, FLAGS.sample,
+                    FLAGS.repeat).result()
+            subset[f"Decomposer()/fraction={fraction:g}"]["entries"] = entries
+            results.update(subset)
+
+    params = {"fractions": FLAGS.fractions, "seed": FLAGS.seed,
+              "sample": FLAGS.sample, "repeat": FLAGS.repeat}
+    if not benchmark_utils.Report(results, params, FLAGS.baseline_out,
+                                  FLAGS.compare_to, FLAGS.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    app.run(main)
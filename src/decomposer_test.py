@@ -1,6 +1,8 @@
 from src import decomposer
 
 from typing import cast
+import os
+import tempfile
 from absl.testing import absltest
 import networkx as nx
 
@@ -79,6 +81,17 @@ class DecomposerTest(absltest.TestCase):
         with self.assertRaises(ValueError) as _:
             print(DECOMPOSER_.decompose("a"))
 
+    def test_ids_path(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "IDS.txt")
+            with open(path, "w", encoding="UTF-8") as f:
+                f.write("# A subset.\n"
+                        "U+4F60\t你\t^⿰亻尔$(GHJKTV)\n")
+            subset = decomposer.Decomposer(ids_path=path)
+            self.assertTrue(subset.contains("你"))
+            self.assertFalse(subset.contains("好"))
+            self.assertEqual(subset.get_component("亻"), ["你"])
+
 
 if __name__ == "__main__":
     absltest.main()
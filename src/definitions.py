@@ -0,0 +1,113 @@
+import functools
+import re
+from typing import List, Text
+
+# Pleco definitions are flattened onto one line by xml_extractors.get_defn, so
+# a definition like
+#   "noun common cold verb 1 catch cold 2 dialect be interested in"
+# has to be split back into its parts. Part-of-speech labels and register /
+# dialect tags are only recognized as whole words, and only where one can
+# begin: at the start, right after a sense marker or another label, or after
+# a segment break, i.e. a line break, which get_defn flattens to two spaces.
+POS_LABELS = [
+    "auxiliary verb",
+    "measure word",
+    "bound form",
+    "adjective",
+    "adverb",
+    "conjunction",
+    "interjection",
+    "noun",
+    "numeral",
+    "onomatopoeia",
+    "particle",
+    "preposition",
+    "pronoun",
+    "verb",
+]
+
+DIALECT_TAGS = [
+    "archaic",
+    "colloquial",
+    "derogatory",
+    "dialect",
+    "figurative",
+    "humble",
+    "literary",
+    "polite",
+]
+
+
+def _alternation(words: List[Text]) -> Text:
+    # Longest first, so that "auxiliary verb" wins over "verb".
+    return "|".join(re.escape(w) for w in sorted(words, key=len, reverse=True))
+
+
+# One pass over the definition finds every candidate sense marker ("1 ",
+# "2 ", ...), part-of-speech label and dialect tag. A sense marker followed
+# by another digit, as in "1 2 3", is part of the gloss rather than a marker.
+_TOKEN_RE = re.compile(
+    r"(?:(?<=\s)|^)(?:"
+    r"(?P<sense>\d+) (?!\d)"
+    rf"|(?P<pos>{_alternation(POS_LABELS)})(?=\s|$)"
+    rf"|(?P<tag>{_alternation(DIALECT_TAGS)})(?=\s|$)"
+    r")")
+
+_CACHE_SIZE = 1 << 16
+
+
+def _label_may_start(defn: Text, start: int, last: int) -> bool:
+    # |last| is where the previous marker or label ended, or 0.
+    if not defn[last:start].strip():
+        return True
+    return defn[start - 1] == "\n" or defn[start - 2:start].isspace()
+
+
+@functools.lru_cache(maxsize=_CACHE_SIZE)
+def format_html(defn: Text) -> Text:
+    """
+    Turns a definition like "1 foo 2 bar" into "<ol><li>foo </li><li>bar</li></ol>",
+    keeping any text before the first sense and italicizing labels and tags.
+    Definitions with fewer than two numbered senses are not turned into a list.
+    """
+    # segments[0] is the text before the first sense; every following segment
+    # is one sense, whose first element is the literal marker text.
+    segments: List[List[Text]] = [[]]
+    next_sense = 1
+    last = 0
+    for m in _TOKEN_RE.finditer(defn):
+        sense = m.group("sense")
+        if sense is None:
+            if not _label_may_start(defn, m.start(), last):
+                continue
+        elif int(sense) == next_sense - 1 and next_sense > 2:
+            # The marker repeated before the next one, as in
+            # "1 foo 2 a set of 2 bar": the earlier one was a count in the
+            # previous sense's gloss.
+            previous = segments.pop()
+            segments[-1].extend(previous)
+            segments[-1].append(defn[last:m.start()])
+            last = m.end()
+            segments.append([m.group(0)])
+            continue
+        elif int(sense) != next_sense:
+            continue
+        segments[-1].append(defn[last:m.start()])
+        last = m.end()
+        if sense is not None:
+            segments.append([m.group(0)])
+            next_sense += 1
+        else:
+            segments[-1].append(f"<i>{m.group('pos') or m.group('tag')}</i>")
+    segments[-1].append(defn[last:])
+
+    if len(segments) < 3:
+        return "".join(part for segment in segments for part in segment)
+
+    parts = [""] * (len(segments) + 2)
+    parts[0] = "".join(segments[0])
+    parts[1] = "<ol>"
+    for i, segment in enumerate(segments[1:], start=2):
+        parts[i] = "<li>" + "".join(segment[1:]) + "</li>"
+    parts[-1] = "</ol>"
+    return "".join(parts)
@@ -0,0 +1,52 @@
+#! /usr/bin/python3
+
+from absl import app
+from absl import flags
+import timeit
+
+from src import converter as converter_lib
+from src import definitions as definitions_lib
+
+
+FLAGS = flags.FLAGS
+flags.DEFINE_string("xml_input_path", "testdata/input.xml",
+                    "Path to a Pleco export whose definitions to format.")
+flags.DEFINE_integer("repeat", 5, "Number of timing runs; the best is kept.")
+flags.DEFINE_integer("number", 1000, "Number of passes per timing run.")
+
+
+def _best_usec_per_call(fn, defns):
+    def run():
+        for d in defns:
+            fn(d)
+    best = min(timeit.repeat(run, repeat=FLAGS.repeat, number=FLAGS.number))
+    return best / (FLAGS.number * len(defns)) * 1e6
+
+
+def main(argv):
+    del argv
+
+    cards = converter_lib.ExtractCards(FLAGS.xml_input_path)
+    defns = [c._defn for c in cards.cards()]
+    if not defns:
+        raise app.UsageError(f"No definitions in {FLAGS.xml_input_path}.")
+
+    uncached = definitions_lib.format_html.__wrapped__
+    print(f"export: {len(defns)} definitions, "
+          f"{sum(len(d) for d in defns) / len(defns):.0f} chars on average")
+    print(f"  uncached: {_best_usec_per_call(uncached, defns):8.2f} us/defn")
+    print(f"  memoized: "
+          f"{_best_usec_per_call(definitions_lib.format_html, defns):8.2f} us/defn")
+
+    # Long synthetic definitions, to check that time grows linearly with the
+    # number of senses.
+    for num_senses in [10, 100, 1000]:
+        defn = "verb " + " ".join(
+            f"{i} dialect sense number {i}" for i in range(1, num_senses + 1))
+        usec = _best_usec_per_call(uncached, [defn])
+        print(f"  {num_senses:5d} senses: {usec:10.2f} us/defn, "
+              f"{usec / num_senses:6.3f} us/sense")
+
+
+if __name__ == '__main__':
+    app.run(main)
@@ -0,0 +1,74 @@
+from src import definitions as definitions_lib
+
+from absl.testing import absltest
+
+
+class FormatHtmlTest(absltest.TestCase):
+
+    def test_numbered_senses(self):
+        self.assertEqual(definitions_lib.format_html("1 foo 2 bar 3 baz"),
+                         "<ol><li>foo </li><li>bar </li><li>baz</li></ol>")
+
+    def test_plain(self):
+        self.assertEqual(definitions_lib.format_html("foo bar baz"),
+                         "foo bar baz")
+
+    def test_single_sense_is_not_a_list(self):
+        self.assertEqual(definitions_lib.format_html("1 foo"), "1 foo")
+
+    def test_labels_and_tags(self):
+        # As get_defn flattens "noun common cold \nverb 1 ...".
+        self.assertEqual(
+            definitions_lib.format_html(
+                "noun common cold  verb 1 catch cold 2 dialect be "
+                "interested in"),
+            "<i>noun</i> common cold  <i>verb</i> "
+            "<ol><li>catch cold </li><li><i>dialect</i> be interested in</li></ol>")
+        self.assertEqual(
+            definitions_lib.format_html("1 colloquial figurative foo 2 bar"),
+            "<ol><li><i>colloquial</i> <i>figurative</i> foo </li>"
+            "<li>bar</li></ol>")
+
+    def test_label_words_in_glosses(self):
+        self.assertEqual(definitions_lib.format_html("be very polite to guests"),
+                         "be very polite to guests")
+        self.assertEqual(
+            definitions_lib.format_html("1 to verb a noun 2 literary style"),
+            "<ol><li>to verb a noun </li><li><i>literary</i> style</li></ol>")
+        self.assertEqual(
+            definitions_lib.format_html("noun common cold verb tense"),
+            "<i>noun</i> common cold verb tense")
+
+    def test_labels_are_whole_words(self):
+        self.assertEqual(definitions_lib.format_html("pronounce adverbial nouns"),
+                         "pronounce adverbial nouns")
+        self.assertEqual(definitions_lib.format_html("measure word for books"),
+                         "<i>measure word</i> for books")
+
+    def test_numbers_inside_gloss(self):
+        self.assertEqual(
+            definitions_lib.format_html("1 count 1 2 3 2 twelve 12 eggs"),
+            "<ol><li>count 1 2 3 </li><li>twelve 12 eggs</li></ol>")
+
+    def test_repeated_number_in_gloss(self):
+        self.assertEqual(
+            definitions_lib.format_html("1 foo 2 a set of 2 bar"),
+            "<ol><li>foo 2 a set of </li><li>bar</li></ol>")
+        self.assertEqual(
+            definitions_lib.format_html("1 foo 1 more 2 bar"),
+            "<ol><li>foo 1 more </li><li>bar</li></ol>")
+
+    def test_out_of_order_numbers(self):
+        self.assertEqual(
+            definitions_lib.format_html("1 foo 3 things 2 bar"),
+            "<ol><li>foo 3 things </li><li>bar</li></ol>")
+
+    def test_memoized(self):
+        definitions_lib.format_html.cache_clear()
+        definitions_lib.format_html("1 foo 2 bar")
+        definitions_lib.format_html("1 foo 2 bar")
+        self.assertEqual(definitions_lib.format_html.cache_info().hits, 1)
+
+
+if __name__ == "__main__":
+    absltest.main()
@@ -0,0 +1,88 @@
+from typing import Any, Dict, List, Mapping, Optional, Text, Tuple
+import dataclasses
+import unicodedata
+
+from src import anki_utils as anki_utils_lib
+from src import card as card_lib
+from src import categorizer as categorizer_lib
+from src import headword_index as headword_index_lib
+from src import metrics as metrics_lib
+
+
+@dataclasses.dataclass
+class Report:
+    """How a build of an export would change a collection."""
+    cards: int = 0
+    # Headwords the build would add a note for.
+    new: List[Text] = dataclasses.field(default_factory=list)
+    # Headword => the fields whose text the build would change.
+    changed: Dict[Text, List[Text]] = dataclasses.field(default_factory=dict)
+    # Headword => (the decks it is in, the deck the build would put it in).
+    moved: Dict[Text, Tuple[List[Text], Text]] = dataclasses.field(
+        default_factory=dict)
+    # Headwords already in the collection as mature cards, whether or not
+    # the build would touch them.
+    mature: List[Text] = dataclasses.field(default_factory=list)
+    unchanged: int = 0
+
+    def summary(self) -> Text:
+        return (f"{self.cards} cards: {len(self.new)} new, "
+                f"{len(self.changed)} changed, {len(self.moved)} moved, "
+                f"{self.unchanged} unchanged; {len(self.mature)} mature")
+
+    def to_json(self) -> Dict[Text, Any]:
+        return {
+            "counts": {
+                "cards": self.cards, "new": len(self.new),
+                "changed": len(self.changed), "moved": len(self.moved),
+                "mature": len(self.mature), "unchanged": self.unchanged,
+            },
+            "new": self.new,
+            "changed": self.changed,
+            "moved": {hw: {"from": decks, "to": deck}
+                      for hw, (decks, deck) in self.moved.items()},
+            "mature": self.mature,
+        }
+
+
+def Diff(cards: Mapping[Text, card_lib.Card],
+         categorizer: categorizer_lib.Categorizer,
+         snapshot: headword_index_lib.HeadwordIndex,
+         metrics: Optional[metrics_lib.Metrics] = None) -> Report:
+    """
+    Compares what a build of |cards| would write with |snapshot|, a bulk
+    read of the collection, without rendering audio or packaging anything.
+
+    A headword is new if the collection has no note of VocabModel's type
+    for it, so the build would add one, even if other notes have it.
+    Otherwise its note's fields, of those it has, and decks are compared
+    with what the build would write. Mature is reported of every note with
+    the headword.
+    """
+    metrics = metrics or metrics_lib.Metrics(enabled=False)
+    note_type = anki_utils_lib.VocabModel().name
+    report = Report()
+    for headword, card_obj in cards.items():
+        report.cards += 1
+        if snapshot.get_type(headword) == headword_index_lib.CardType.Mature:
+            report.mature.append(headword)
+        note = snapshot.note(note_type, headword)
+        if note is None:
+            report.new.append(headword)
+            continue
+        theirs, decks = note
+        with metrics.timer("categorize"):
+            deck = str(categorizer.sort_into_deck(headword))
+        ours = {"pinyin": card_obj._pinyin_html,
+                "meaning": card_obj._defn_html}
+        # Anki stores fields NFC-normalized; the cards' tone marks combine.
+        changed = [name for name in headword_index_lib.SNAPSHOT_FIELDS
+                   if name in theirs and theirs[name] !=
+                   unicodedata.normalize("NFC", ours[name])]
+        if changed:
+            report.changed[headword] = changed
+        if deck not in decks:
+            report.moved[headword] = (sorted(decks), deck)
+        if not changed and deck in decks:
+            report.unchanged += 1
+    return report
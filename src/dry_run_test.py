@@ -0,0 +1,53 @@
+from src import anki_utils as anki_utils_lib
+from src import card as card_lib
+from src import categorizer as categorizer_lib
+from src import dry_run as dry_run_lib
+
+from unittest.mock import MagicMock
+from absl.testing import absltest
+import unicodedata
+
+
+_VOCAB = anki_utils_lib.VocabModel().name
+
+
+class DryRunTest(absltest.TestCase):
+
+    def test_diff(self):
+        cards = {hw: card_lib.Card(hw, "hei1", "black")
+                 for hw in ["新", "改", "移", "同", "熟"]}
+        # As Anki stores them.
+        same = {"pinyin": unicodedata.normalize(
+                    "NFC", cards["同"]._pinyin_html),
+                "meaning": cards["同"]._defn_html}
+        snapshot = anki_utils_lib.HeadwordIndex()
+        snapshot.add("改", "zw::vocab_v1", 0, _VOCAB,
+                     dict(same, meaning="white"))
+        snapshot.add("移", "zw::listening_v1", 0, _VOCAB, same)
+        snapshot.add("同", "zw::vocab_v1", 0, _VOCAB, same)
+        # Only in another type's note, so the build would add ours.
+        snapshot.add("熟", "zw::vocab_v1", 2, "zw", same)
+        categorizer = MagicMock()
+        categorizer.sort_into_deck.return_value = (
+            categorizer_lib.Deck.HSK_1_V1)
+        deck = str(categorizer_lib.Deck.HSK_1_V1)
+        for hw in ["改", "同"]:
+            snapshot.add(hw, deck, 0, _VOCAB)
+
+        report = dry_run_lib.Diff(cards, categorizer, snapshot)
+
+        self.assertEqual(report.cards, 5)
+        self.assertEqual(report.new, ["新", "熟"])
+        self.assertEqual(report.changed, {"改": ["meaning"]})
+        self.assertEqual(report.moved, {"移": (["zw::listening_v1"], deck)})
+        self.assertEqual(report.mature, ["熟"])
+        self.assertEqual(report.unchanged, 1)
+        self.assertEqual(
+            report.summary(),
+            "5 cards: 2 new, 1 changed, 1 moved, 1 unchanged; 1 mature")
+        self.assertEqual(report.to_json()["moved"],
+                         {"移": {"from": ["zw::listening_v1"], "to": deck}})
+
+
+if __name__ == "__main__":
+    absltest.main()
@@ -0,0 +1,22 @@
+#! /usr/bin/python3
+
+from absl import app
+from absl import flags
+
+from src import synthetic_export
+
+FLAGS = flags.FLAGS
+flags.DEFINE_integer("num_cards", 1000, "Number of cards to generate.")
+flags.DEFINE_integer("seed", 0, "Seed; the same seed gives the same export.")
+flags.DEFINE_string("output", None, "Path to write the export to.")
+
+
+def main(argv):
+    del argv
+    if not FLAGS.output:
+        raise app.UsageError("Must provide --output.")
+    synthetic_export.Write(FLAGS.output, FLAGS.num_cards, FLAGS.seed)
+
+
+if __name__ == '__main__':
+    app.run(main)
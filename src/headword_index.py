@@ -0,0 +1,102 @@
+from enum import Enum, auto
+from typing import Dict, Mapping, Optional, Set, Text, Tuple
+
+
+class CardType(Enum):
+    New = auto()
+    Learning = auto()
+    Mature = auto()
+    Absent = auto()
+    Other = auto()
+
+    @staticmethod
+    def parse(s):
+        return {
+            0: CardType.New,
+            1: CardType.Learning,
+            2: CardType.Mature,
+        }.get(s, CardType.Other)
+
+
+class HeadwordIndex():
+    """
+    In-memory answers to AnkiReader's queries, built from one pass over every
+    (headword, deck name, card type) in a collection. Given each card's note
+    type, it also records the decks and SNAPSHOT_FIELDS of each note, which
+    AnkiWriter identifies by its note type's name and headword.
+    """
+
+    def __init__(self):
+        self._decks_by_headword: Dict[Text, Set[Text]] = {}
+        self._min_type_by_headword: Dict[Text, int] = {}
+        self._notes: Dict[Tuple[Text, Text],
+                          Tuple[Dict[Text, Text], Set[Text]]] = {}
+
+    def add(self, headword: Text, deck_name: Text, card_type: int,
+            note_type: Optional[Text] = None,
+            fields: Optional[Mapping[Text, Text]] = None):
+        self._decks_by_headword.setdefault(headword, set()).add(deck_name)
+        prev = self._min_type_by_headword.get(headword)
+        if prev is None or card_type < prev:
+            self._min_type_by_headword[headword] = card_type
+        if note_type is not None:
+            note = self._notes.setdefault(
+                (note_type, headword), (dict(fields or {}), set()))
+            note[1].add(deck_name)
+
+    def __len__(self) -> int:
+        return len(self._decks_by_headword)
+
+    def __contains__(self, headword: Text) -> bool:
+        return headword in self._decks_by_headword
+
+    def decks(self, headword: Text) -> Set[Text]:
+        return set(self._decks_by_headword.get(headword, ()))
+
+    def note(self, note_type: Text, headword: Text
+             ) -> Optional[Tuple[Dict[Text, Text], Set[Text]]]:
+        """
+        The SNAPSHOT_FIELDS, of those its type has, of the note of type
+        |note_type| for |headword|, and the decks of its cards; or None if
+        there is no such note.
+        """
+        note = self._notes.get((note_type, headword))
+        if note is None:
+            return None
+        fields, decks = note
+        return dict(fields), set(decks)
+
+    def in_deck(self, headword: Text, deck_name: Text) -> bool:
+        # Like `deck:foo`, this matches subdecks of foo, too.
+        return any(d == deck_name or d.startswith(deck_name + "::")
+                   for d in self._decks_by_headword.get(headword, ()))
+
+    def get_type(self, headword: Text) -> CardType:
+        if headword not in self._min_type_by_headword:
+            return CardType.Absent
+        return CardType.parse(self._min_type_by_headword[headword])
+
+
+_CHARACTERS_FIELD = "characters"
+# Fields besides the headword which HeadwordIndex records, as VocabModel
+# names them.
+SNAPSHOT_FIELDS = ("pinyin", "meaning")
+
+
+def AddToIndex(index: HeadwordIndex, note_type: Text,
+               field_ords: Mapping[Text, int], flds: Text, deck_name: Text,
+               card_type: int):
+    """
+    Adds one card to |index|, given the name of its note type and the
+    ordinal of each of its fields by name, and its note's \x1f-separated
+    |flds|. Cards of note types without a characters field are skipped.
+    """
+    field_ord = field_ords.get(_CHARACTERS_FIELD)
+    if field_ord is None:
+        return
+    fields = flds.split("\x1f")
+    if field_ord >= len(fields):
+        return
+    index.add(fields[field_ord], deck_name, card_type, note_type, {
+        name: fields[field_ords[name]] for name in SNAPSHOT_FIELDS
+        if field_ords.get(name, len(fields)) < len(fields)})
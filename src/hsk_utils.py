@@ -1,5 +1,8 @@
 import csv
 
+# The word lists for HSK levels 1 to 6.
+PATHS = [f"third_party/hsk_{n}.csv" for n in range(1, 7)]
+
 
 class HskReader():
     def __init__(self):
@@ -15,7 +18,7 @@ class HskReader():
     @staticmethod
     def _make_hsk_dict(n):
         s = set()
-        csvfile = open(f"third_party/hsk_{n}.csv")
+        csvfile = open(PATHS[n - 1])
         for row in csv.reader(csvfile, delimiter=','):
             hw = row[2]
             hw = hw.split("(")[0]
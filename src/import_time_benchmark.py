@@ -0,0 +1,57 @@
+#! /usr/bin/python3
+
+from absl import app
+from absl import flags
+from typing import Dict, Text, Tuple
+import os
+import re
+import subprocess
+import sys
+
+
+FLAGS = flags.FLAGS
+flags.DEFINE_string("module", "src.main", "Module whose import to time.")
+flags.DEFINE_integer("repeat", 5,
+                     "Number of fresh interpreters to time; the best is kept.")
+flags.DEFINE_integer("top", 15, "Number of the slowest imports to list.")
+flags.DEFINE_float("max_ms", None,
+                   "If set, fail when the import takes longer than this.")
+
+_LINE_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _profile(module: Text) -> Dict[Text, Tuple[int, int]]:
+    """Returns module => (self us, cumulative us) from `python -X importtime`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=_ROOT, capture_output=True, text=True, check=True)
+    profile = {}
+    for line in result.stderr.splitlines():
+        m = _LINE_RE.match(line)
+        if m:
+            profile[m.group(4)] = (int(m.group(1)), int(m.group(2)))
+    return profile
+
+
+def main(argv):
+    del argv
+
+    profiles = [_profile(FLAGS.module) for _ in range(FLAGS.repeat)]
+    best = min(profiles, key=lambda p: p[FLAGS.module][1])
+    total_ms = best[FLAGS.module][1] / 1000
+
+    print(f"import {FLAGS.module}: {total_ms:8.1f} ms "
+          f"(best of {FLAGS.repeat}), {len(best)} modules")
+    print(f"  {'cumulative ms':>13} {'self ms':>8}  module")
+    for name, (self_us, cumulative_us) in sorted(
+            best.items(), key=lambda kv: -kv[1][1])[:FLAGS.top]:
+        print(f"  {cumulative_us / 1000:13.1f} {self_us / 1000:8.1f}  {name}")
+
+    if FLAGS.max_ms is not None and total_ms > FLAGS.max_ms:
+        print(f"FAIL: {total_ms:.1f} ms > --max_ms={FLAGS.max_ms}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    app.run(main)
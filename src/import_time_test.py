@@ -0,0 +1,33 @@
+import os
+import subprocess
+import sys
+from absl.testing import absltest
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Dependencies which take tens to hundreds of milliseconds to import, and
+# which only some stages need.
+_HEAVY_MODULES = ["anki", "genanki", "more_itertools", "networkx", "numpy"]
+
+
+def _heavy_imports(module):
+    result = subprocess.run(
+        [sys.executable, "-c",
+         f"import sys, {module}; "
+         f"print(' '.join(m for m in {_HEAVY_MODULES!r} "
+         "if m in sys.modules))"],
+        cwd=_ROOT, capture_output=True, text=True, check=True)
+    return result.stdout.strip()
+
+
+class ImportTimeTest(absltest.TestCase):
+
+    def test_main_defers_heavy_imports(self):
+        self.assertEqual(_heavy_imports("src.main"), "")
+
+    def test_sqlite_reader_needs_no_anki(self):
+        self.assertEqual(_heavy_imports("src.anki_sqlite"), "")
+
+
+if __name__ == "__main__":
+    absltest.main()
@@ -3,14 +3,36 @@
 from absl import app
 from absl import flags
 from absl import logging
+from typing import Any, Dict, List, NamedTuple, Optional, Text
+import gc
+import json
 import os
+import signal
+import sys
+import threading
+import time
 
+from src import anki_sqlite as anki_sqlite_lib
 from src import anki_utils as anki_utils_lib
+from src import apkg_writer as apkg_writer_lib
+from src import audio_cache as audio_cache_lib
+from src import audio_post as audio_post_lib
+from src import batch as batch_lib
 from src import categorizer as categorizer_lib
+from src import cedict as cedict_lib
 from src import converter as converter_lib
+from src import csv_writer as csv_writer_lib
 from src import decomposer as decomposer_lib
+from src import dry_run as dry_run_lib
 from src import frequency as frequency_lib
 from src import hsk_utils as hsk_utils_lib
+from src import media_index as media_index_lib
+from src import metrics as metrics_lib
+from src import pipeline as pipeline_lib
+from src import sharding as sharding_lib
+from src import tts as tts_lib
+from src import watcher as watcher_lib
+from third_party import ids
 
 
 FLAGS = flags.FLAGS
@@ -19,47 +41,583 @@ flags.DEFINE_string("audio_out", None,
                     "Path to write audio files, or None to disable.")
 flags.DEFINE_string("collection_path", None,
                     "Path to Anki collection .ank2 file.")
+flags.DEFINE_bool("bulk_anki_reader", True,
+                  "Read the whole collection, on its first query, instead of "
+                  "querying it once per headword.")
+flags.DEFINE_enum("anki_reader", "collection", ["collection", "sqlite"],
+                  "With --dry_run, how to read the collection: through Anki, "
+                  "or directly from its SQLite file, read-only.")
 flags.DEFINE_string("frequencies_csv_path", None,
                     "Path to the frequencies csv, if available.")
 flags.DEFINE_string("apkg_out", None, "Path to write .apkg.")
+flags.DEFINE_string("cedict_path", None,
+                    "If set, complete cards exported without pinyin or a "
+                    "definition from this CC-CEDICT file, rather than drop "
+                    "them.")
+flags.DEFINE_string("cedict_index_path", None,
+                    "Where to index --cedict_path, or None for beside it. "
+                    "Indexed on first use and whenever the file changes.")
+flags.DEFINE_string("watch_dir", None,
+                    "Instead of --xml_input_path, keep running and build each "
+                    "flash-*.xml saved into this directory as it lands, with "
+                    "reference data loaded once. Each export's output goes "
+                    "into its own directory under --apkg_out.")
+flags.DEFINE_string("batch_manifest", None,
+                    "Instead of --xml_input_path, build for every tenant in "
+                    "this JSON list of {name, xml_input_path, "
+                    "collection_path, audio_out, apkg_out, media_index_path, "
+                    "delta_manifest}, loading reference data once for all of "
+                    "them.")
+flags.DEFINE_integer("batch_workers", 0,
+                     "With --batch_manifest, how many tenants to build at "
+                     "once, or 0 for one per core.")
+flags.DEFINE_string("batch_summary_out", None,
+                    "With --batch_manifest, write each tenant's outcome, "
+                    "timings and counters here as JSON.")
+flags.DEFINE_bool("dry_run", False,
+                  "Instead of building, report which headwords of "
+                  "--xml_input_path are new to --collection_path, which "
+                  "would change or move deck, and which are already mature. "
+                  "Renders no audio and writes no package.")
+flags.DEFINE_string("dry_run_out", None,
+                    "With --dry_run, write the full report here as JSON.")
+flags.DEFINE_string("categorizer_cache", None,
+                    "Where to remember which deck each headword goes to "
+                    "between runs, until the reference data changes. Not "
+                    "updated by --batch_manifest.")
+flags.DEFINE_float("watch_poll_secs", 1.0,
+                   "With --watch_dir, how often to check for exports where "
+                   "inotify is unavailable.")
+flags.DEFINE_enum("shard_by", None, ["deck", "hsk"],
+                  "Write one .apkg per deck or per HSK band, in parallel, "
+                  "plus a manifest of which shards changed, instead of one "
+                  ".apkg.")
+flags.DEFINE_bool("pipeline", True,
+                  "Run categorization, HTML rendering, audio and packaging as "
+                  "concurrent stages rather than one headword at a time. The "
+                  "output is the same either way.")
+flags.DEFINE_integer("categorize_workers", 4,
+                     "Threads categorizing headwords, with --pipeline.")
+flags.DEFINE_integer("render_workers", 2,
+                     "Threads rendering note HTML, with --pipeline.")
+flags.DEFINE_bool("streaming_apkg", False,
+                  "Write notes into the .apkg as they are made, rather than "
+                  "holding them all in memory until the end.")
+flags.DEFINE_bool("package_media", False,
+                  "Include each note's audio in the .apkg. Needs "
+                  "--streaming_apkg, without --shard_by.")
+flags.DEFINE_string("fonts_dir", None,
+                    "Directory holding the Noto fonts the card templates use, "
+                    "to include them in the .apkg. Needs --streaming_apkg, "
+                    "without --shard_by.")
+flags.DEFINE_string("delta_manifest", None,
+                    "If set, only emit notes which are new or changed since "
+                    "the last run which used this manifest.")
+flags.DEFINE_enum("output_mode", "apkg", ["apkg", "collection", "csv"],
+                  "Write an .apkg to --apkg_out, add and update notes "
+                  "directly in --collection_path, or write rows of pinyin, "
+                  "headword and definition to --csv_out.")
+flags.DEFINE_string("csv_out", None,
+                    "With --output_mode=csv, where to write the rows; "
+                    "gzipped if it ends in .gz.")
+flags.DEFINE_enum("csv_delimiter", "semicolon",
+                  list(csv_writer_lib.DELIMITERS),
+                  "With --output_mode=csv, what separates the columns.")
+flags.DEFINE_integer("csv_workers", 0,
+                     "With --output_mode=csv, processes formatting rows, or 0 "
+                     "for one per core.")
+flags.DEFINE_enum("tts_backend", "say", ["say", "espeak-ng", "stub"],
+                  "Text-to-speech backend used to render audio.")
+flags.DEFINE_integer("tts_workers", 0,
+                     "Number of concurrent audio renders, or 0 for one per core.")
+flags.DEFINE_string("media_index_path", None,
+                    "Where to keep a listing of --audio_out between runs, or "
+                    "None to list the directory afresh each run.")
+flags.DEFINE_string("syllable_bank_dir", None,
+                    "If set, assemble word audio from per-syllable clips "
+                    "cached in this directory instead of rendering each word.")
+flags.DEFINE_bool("normalize_audio", False,
+                  "Loudness-normalize and re-encode newly rendered audio.")
+flags.DEFINE_float("target_lufs", -16.0,
+                   "Integrated loudness target for --normalize_audio.")
+flags.DEFINE_string("audio_post_manifest", None,
+                    "Where --normalize_audio records which clips it already "
+                    "processed, or None to not remember between runs.")
+flags.DEFINE_string("audio_cache_dir", None,
+                    "Directory of rendered audio shared between runs, or None "
+                    "to disable.")
+flags.DEFINE_integer("audio_cache_max_mb", None,
+                     "Evict least recently used audio beyond this size.")
+flags.DEFINE_integer("audio_cache_max_age_days", None,
+                     "Evict audio unused for this many days.")
+
+flags.DEFINE_string("metrics_out", None,
+                    "If set, write per-stage timings, memory peaks and "
+                    "counters to this path as JSON.")
+flags.DEFINE_bool("metrics_trace_memory", True,
+                  "With --metrics_out, record each stage's peak traced "
+                  "memory. Tracing slows the build down.")
+flags.DEFINE_string("profile_stage", None,
+                    "With --metrics_out, run this stage or per-card step "
+                    "(e.g. decomposer, categorize) under cProfile.")
+flags.DEFINE_string("profile_out", None,
+                    "Where to write the --profile_stage stats.")
 
 _OUTPUT_APKG = 'output.apkg'
 
 
+class _References(NamedTuple):
+    """
+    What every build needs, whichever collection it is for. One build loads
+    it and throws it away; --watch_dir keeps it warm between builds, and
+    --batch_manifest shares it between tenants.
+    """
+    categorizer: categorizer_lib.Categorizer
+    frequencies: frequency_lib.Frequencies
+    audio_cache: Optional[audio_cache_lib.AudioCache]
+    tts_backend: tts_lib.Backend
+    backfill: Optional[cedict_lib.Cedict]
+
+
+class _Session(NamedTuple):
+    """What builds for one collection need besides their export."""
+    references: _References
+    audio_out: Text
+    collection_path: Text
+    media_index: media_index_lib.MediaIndex
+    delta_manifest: Optional[anki_utils_lib.DeltaManifest]
+    # Reads through Anki, which is slow to open, so is kept open. Only
+    # --output_mode=collection uses it, to write notes; None otherwise.
+    collection_reader: Optional[anki_utils_lib.AnkiReader]
+
+
+def _make_metrics() -> metrics_lib.Metrics:
+    return metrics_lib.Metrics(
+        enabled=FLAGS.metrics_out is not None,
+        trace_memory=FLAGS.metrics_trace_memory,
+        profile_stage=FLAGS.profile_stage,
+        profile_path=FLAGS.profile_out)
+
+
+def _load_backfill(metrics: metrics_lib.Metrics
+                   ) -> Optional[cedict_lib.Cedict]:
+    if not FLAGS.cedict_path:
+        return None
+    with metrics.stage("load_cedict"):
+        return cedict_lib.Cedict(FLAGS.cedict_path, FLAGS.cedict_index_path)
+
+
+def _load_categorizer(metrics: metrics_lib.Metrics,
+                      caching: bool = False) -> categorizer_lib.Categorizer:
+    hsk_reader = hsk_utils_lib.HskReader()
+    with metrics.stage("decomposer"):
+        decomposer = decomposer_lib.Decomposer()
+    if FLAGS.categorizer_cache:
+        # Whatever the reference data or the rules, the cache must follow.
+        fingerprint = categorizer_lib.Fingerprint(
+            [ids.PATH_TO_IDS_TXT] + hsk_utils_lib.PATHS +
+            [categorizer_lib.__file__])
+        return categorizer_lib.CachingCategorizer(
+            decomposer, hsk_reader, cache_path=FLAGS.categorizer_cache,
+            fingerprint=fingerprint)
+    if caching:
+        return categorizer_lib.CachingCategorizer(decomposer, hsk_reader)
+    return categorizer_lib.Categorizer(decomposer, hsk_reader)
+
+
+def _save_categorizer(categorizer: categorizer_lib.Categorizer):
+    if isinstance(categorizer, categorizer_lib.CachingCategorizer):
+        categorizer.save()
+
+
+def _load_references(metrics: metrics_lib.Metrics,
+                     caching: bool = False) -> _References:
+    with metrics.stage("load_references"):
+        categorizer = _load_categorizer(metrics, caching=caching)
+        frequencies = frequency_lib.Frequencies(FLAGS.frequencies_csv_path)
+    audio_cache = None
+    if FLAGS.audio_cache_dir:
+        audio_cache = audio_cache_lib.AudioCache(
+            FLAGS.audio_cache_dir,
+            max_bytes=FLAGS.audio_cache_max_mb and
+            FLAGS.audio_cache_max_mb << 20,
+            max_age_secs=FLAGS.audio_cache_max_age_days and
+            FLAGS.audio_cache_max_age_days * 86400)
+    tts_backend = tts_lib.MakeBackend(FLAGS.tts_backend)
+    if FLAGS.syllable_bank_dir:
+        # Optional, and the only user of numpy.
+        from src import syllable_audio as syllable_audio_lib
+        tts_backend = syllable_audio_lib.SyllableBackend(
+            syllable_audio_lib.SyllableBank(
+                FLAGS.syllable_bank_dir, tts_backend),
+            tts_backend)
+    return _References(categorizer, frequencies, audio_cache, tts_backend,
+                       _load_backfill(metrics))
+
+
+def _open_session(references: _References, audio_out: Text,
+                  collection_path: Text, metrics: metrics_lib.Metrics,
+                  media_index_path: Optional[Text] = None,
+                  delta_manifest_path: Optional[Text] = None) -> _Session:
+    media_index = media_index_lib.MediaIndex(
+        audio_out, persist_path=media_index_path)
+    delta_manifest = None
+    if delta_manifest_path:
+        delta_manifest = anki_utils_lib.DeltaManifest(delta_manifest_path)
+    collection_reader = None
+    if FLAGS.output_mode == "collection":
+        with metrics.stage("open_collection"):
+            collection_reader = anki_utils_lib.AnkiReader(
+                collection_path, bulk=FLAGS.bulk_anki_reader)
+    return _Session(references, audio_out, collection_path, media_index,
+                    delta_manifest, collection_reader)
+
+
+def _close_session(session: _Session):
+    if session.collection_reader is not None:
+        session.collection_reader.close()
+
+
+def _build(session: _Session, xml_input_path: Text, apkg_out: Text,
+           metrics: metrics_lib.Metrics):
+    """Builds the notes for one export and writes them out."""
+    with metrics.stage("extract"):
+        cards_dict = converter_lib.ExtractCards(
+            xml_input_path, metrics=metrics,
+            backfill=session.references.backfill)
+
+    references = session.references
+    # Normalized clips are cached once normalized, under their own keys, so
+    # that a cache hit needs no processing.
+    tts_pool = tts_lib.RenderPool(
+        references.tts_backend,
+        max_workers=FLAGS.tts_workers or None,
+        cache=references.audio_cache,
+        media_index=session.media_index,
+        metrics=metrics,
+        cache_variant=(f"loudnorm={FLAGS.target_lufs}"
+                       if FLAGS.normalize_audio else ""),
+        store_renders=not FLAGS.normalize_audio)
+    package_writer = None
+    if (FLAGS.output_mode == "apkg" and FLAGS.streaming_apkg and
+            not FLAGS.shard_by):
+        package_writer = apkg_writer_lib.StreamingPackageWriter(
+            os.path.join(apkg_out, _OUTPUT_APKG))
+        if FLAGS.fonts_dir:
+            for font in anki_utils_lib.FONT_FILES:
+                package_writer.add_media(os.path.join(FLAGS.fonts_dir, font))
+    anki_builder = anki_utils_lib.AnkiBuilder(
+        session.audio_out, references.categorizer, cards_dict,
+        tts_pool=tts_pool,
+        delta_manifest=session.delta_manifest, package_writer=package_writer,
+        package_media=FLAGS.package_media, metrics=metrics)
+
+    try:
+        with metrics.stage("build"), tts_pool:
+            added, skipped = set(), set()
+            with metrics.stage("process_cards"):
+                if FLAGS.pipeline:
+                    results = pipeline_lib.Pipeline(
+                        anki_builder.pipeline_stages(
+                            categorize_workers=FLAGS.categorize_workers,
+                            render_workers=FLAGS.render_workers)).run(
+                                cards_dict.keys())
+                else:
+                    results = ((hw, anki_builder.process(hw))
+                               for hw in cards_dict.keys())
+                for hw, was_added in results:
+                    if was_added:
+                        added.add(hw)
+                    else:
+                        skipped.add(hw)
+            logging.info(f"added {len(added)}, skipped {len(skipped)}")
+
+            # Packaging overlaps with audio still rendering in the background.
+            with metrics.stage("write_package"):
+                if FLAGS.output_mode == "collection":
+                    # Imported here, as it pulls in the whole Anki backend.
+                    from src import anki_writer as anki_writer_lib
+                    # Always opened through Anki with this output mode.
+                    anki_writer_lib.CollectionUpserter(
+                        session.collection_reader._collection).upsert(
+                            anki_builder.notes_by_deck())
+                elif FLAGS.shard_by:
+                    sharding_lib.ShardedPackager(
+                        apkg_out, shard_by=FLAGS.shard_by).write(
+                            anki_builder.decks())
+                elif package_writer is None:
+                    anki_builder.make_package().write_to_file(
+                        os.path.join(apkg_out, _OUTPUT_APKG))
+
+        # After the pool, which may still be adding media to the package.
+        if package_writer is not None:
+            with metrics.stage("close_package"):
+                package_writer.close()
+    except BaseException:
+        # Rather than leave a truncated .apkg, which looks like a finished one.
+        if package_writer is not None:
+            package_writer.discard()
+        raise
+    # Only once the notes were written out.
+    if session.delta_manifest is not None:
+        session.delta_manifest.save()
+
+    if FLAGS.normalize_audio:
+        with metrics.stage("audio_post"):
+            processor = audio_post_lib.AudioPostProcessor(
+                FLAGS.audio_post_manifest, target_lufs=FLAGS.target_lufs)
+            processor.process(tts_pool.rendered(include_cache_hits=False))
+            if references.audio_cache is not None:
+                for path, key in tts_pool.unstored().items():
+                    # Not a clip which failed to process.
+                    if processor.is_processed(path):
+                        references.audio_cache.store(key, path)
+
+    session.media_index.save()
+    metrics.count("cards_added", len(added))
+    metrics.count("cards_skipped", len(skipped))
+    metrics.count("audio_rendered", len(tts_pool.rendered()))
+    if references.audio_cache is not None:
+        logging.info(f"audio cache: {tts_pool.cache_hits} hits, "
+                     f"{tts_pool.cache_misses} misses")
+        metrics.count("audio_cache_hits", tts_pool.cache_hits)
+        metrics.count("audio_cache_misses", tts_pool.cache_misses)
+
+
+def _watch(session: _Session):
+    # Runs until interrupted or sent SIGTERM. A bad export is logged and
+    # skipped; the next one is still built.
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    with watcher_lib.ExportWatcher(
+            FLAGS.watch_dir, poll_secs=FLAGS.watch_poll_secs) as watcher:
+        try:
+            for path in watcher.watch(stop):
+                stem = os.path.splitext(os.path.basename(path))[0]
+                apkg_out = os.path.join(FLAGS.apkg_out or "", stem)
+                if FLAGS.output_mode == "apkg":
+                    os.makedirs(apkg_out, exist_ok=True)
+                logging.info(f"Building {path}.")
+                start = time.perf_counter()
+                metrics = _make_metrics()
+                try:
+                    if session.collection_reader is not None and (
+                            FLAGS.bulk_anki_reader):
+                        # Pick up reviews and notes since the last build.
+                        session.collection_reader.refresh()
+                    _build(session, path, apkg_out, metrics)
+                except Exception:
+                    logging.exception(f"Failed to build {path}.")
+                    continue
+                logging.info(f"Built {path} in "
+                             f"{time.perf_counter() - start:.2f}s.")
+                _save_categorizer(session.references.categorizer)
+                if FLAGS.metrics_out:
+                    metrics.write(FLAGS.metrics_out)
+        except KeyboardInterrupt:
+            pass
+    logging.info("Stopped watching.")
+
+
+# Loaded before the --batch_manifest workers fork, which share it.
+_batch_references: Optional[_References] = None
+
+
+def _run_tenant(tenant: batch_lib.Tenant) -> Dict[Text, Any]:
+    metrics = metrics_lib.Metrics(trace_memory=False)
+    if FLAGS.output_mode == "apkg":
+        os.makedirs(tenant.apkg_out, exist_ok=True)
+    session = _open_session(_batch_references, tenant.audio_out,
+                            tenant.collection_path, metrics,
+                            media_index_path=tenant.media_index_path,
+                            delta_manifest_path=tenant.delta_manifest)
+    try:
+        _build(session, tenant.xml_input_path, tenant.apkg_out, metrics)
+    finally:
+        _close_session(session)
+    report = metrics.report()
+    return {
+        "counters": report["counters"],
+        "stage_secs": {name: stage["wall_secs"]
+                       for name, stage in report["stages"].items()},
+    }
+
+
+def _run_batch(tenants: List[batch_lib.Tenant]) -> bool:
+    global _batch_references
+    start = time.perf_counter()
+    # Builds share their headwords' parts, so remember every sort. Each
+    # worker's memory of them is its own, from the fork on.
+    _batch_references = _load_references(
+        metrics_lib.Metrics(enabled=False), caching=True)
+    load_secs = time.perf_counter() - start
+    logging.info(f"Loaded reference data in {load_secs:.2f}s.")
+    # Keep the collector from touching, and so copying, every page the
+    # workers share.
+    gc.freeze()
+    summaries = batch_lib.RunTenants(
+        tenants, _run_tenant, workers=FLAGS.batch_workers or os.cpu_count())
+    if _batch_references.audio_cache is not None:
+        _batch_references.audio_cache.evict()
+
+    failed = [s for s in summaries if not s["ok"]]
+    for s in summaries:
+        if s["ok"]:
+            counters = s["counters"]
+            logging.info(f"{s['name']}: added {counters.get('cards_added', 0)}"
+                         f", skipped {counters.get('cards_skipped', 0)} in "
+                         f"{s['wall_secs']:.2f}s")
+        else:
+            logging.error(f"{s['name']}: FAILED: {s['error']}")
+    logging.info(f"{len(summaries) - len(failed)} of {len(summaries)} "
+                 f"tenants built in {time.perf_counter() - start:.2f}s.")
+    if FLAGS.batch_summary_out:
+        tmp = f"{FLAGS.batch_summary_out}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({
+                "load_references_secs": load_secs,
+                "wall_secs": time.perf_counter() - start,
+                "succeeded": len(summaries) - len(failed),
+                "failed": len(failed),
+                "tenants": summaries,
+            }, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, FLAGS.batch_summary_out)
+    return not failed
+
+
+def _dry_run():
+    metrics = _make_metrics()
+    with metrics.stage("load_references"):
+        categorizer = _load_categorizer(metrics, caching=True)
+    with metrics.stage("extract"):
+        cards_dict = converter_lib.ExtractCards(
+            FLAGS.xml_input_path, metrics=metrics,
+            backfill=_load_backfill(metrics))
+    with metrics.stage("open_collection"):
+        if FLAGS.anki_reader == "sqlite":
+            anki_reader = anki_sqlite_lib.SqliteAnkiReader(
+                FLAGS.collection_path)
+        else:
+            anki_reader = anki_utils_lib.AnkiReader(
+                FLAGS.collection_path, bulk=True)
+        try:
+            snapshot = anki_reader.snapshot()
+        finally:
+            anki_reader.close()
+    with metrics.stage("diff"):
+        report = dry_run_lib.Diff(cards_dict, categorizer, snapshot, metrics)
+    _save_categorizer(categorizer)
+
+    print(report.summary())
+    if FLAGS.dry_run_out:
+        tmp = f"{FLAGS.dry_run_out}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(report.to_json(), f, indent=1, ensure_ascii=False)
+        os.replace(tmp, FLAGS.dry_run_out)
+    if FLAGS.metrics_out:
+        metrics.write(FLAGS.metrics_out)
+
+
+def _write_csv():
+    # Needs neither the collection nor the reference data.
+    metrics = _make_metrics()
+    with metrics.stage("write_csv"):
+        csv_writer_lib.CsvWriter(
+            FLAGS.csv_out,
+            delimiter=csv_writer_lib.DELIMITERS[FLAGS.csv_delimiter],
+            max_workers=FLAGS.csv_workers or None,
+            metrics=metrics).write(
+                converter_lib.IterCards(FLAGS.xml_input_path, metrics,
+                                        backfill=_load_backfill(metrics)))
+    if FLAGS.metrics_out:
+        metrics.write(FLAGS.metrics_out)
+
+
 def main(argv):
     del argv
 
-    if not FLAGS.xml_input_path:
-        raise app.UsageError("Must provide --xml_input_path.")
-    if not FLAGS.audio_out:
-        raise app.UsageError("Must provide --audio_out.")
+    inputs = [f for f in ["xml_input_path", "watch_dir", "batch_manifest"]
+              if FLAGS[f].value]
+    if len(inputs) != 1:
+        raise app.UsageError("Must provide exactly one of --xml_input_path, "
+                             "--watch_dir and --batch_manifest.")
+    if FLAGS.profile_stage and not (FLAGS.metrics_out and FLAGS.profile_out):
+        raise app.UsageError(
+            "--profile_stage needs --metrics_out and --profile_out.")
+    if FLAGS.dry_run and not FLAGS.xml_input_path:
+        raise app.UsageError("--dry_run needs --xml_input_path, not "
+                             "--watch_dir or --batch_manifest.")
+    if ((FLAGS.package_media or FLAGS.fonts_dir) and
+            not (FLAGS.output_mode == "apkg" and FLAGS.streaming_apkg and
+                 not FLAGS.shard_by)):
+        raise app.UsageError("--package_media and --fonts_dir need "
+                             "--streaming_apkg, without --shard_by.")
+    if FLAGS.fonts_dir:
+        missing = [f for f in anki_utils_lib.FONT_FILES if not os.path.isfile(
+            os.path.join(FLAGS.fonts_dir, f))]
+        if missing:
+            raise app.UsageError(
+                f"--fonts_dir {FLAGS.fonts_dir} lacks {', '.join(missing)}.")
+    if FLAGS.output_mode == "csv" and not FLAGS.dry_run:
+        if not FLAGS.xml_input_path:
+            raise app.UsageError("--output_mode=csv needs --xml_input_path.")
+        if not FLAGS.csv_out:
+            raise app.UsageError("Must provide --csv_out.")
+        _write_csv()
+        return
+    if not FLAGS.frequencies_csv_path and not FLAGS.dry_run:
+        raise app.UsageError("Must provide --frequencies_csv_path.")
+
+    if FLAGS.batch_manifest:
+        if FLAGS.metrics_out:
+            raise app.UsageError("With --batch_manifest, each tenant's "
+                                 "metrics go to --batch_summary_out.")
+        try:
+            tenants = batch_lib.LoadManifest(FLAGS.batch_manifest)
+        except (OSError, ValueError) as e:
+            raise app.UsageError(f"Bad --batch_manifest: {e}")
+        if FLAGS.output_mode == "apkg" and not all(
+                t.apkg_out for t in tenants):
+            raise app.UsageError(
+                "Every tenant needs an apkg_out with --output_mode=apkg.")
+        if not _run_batch(tenants):
+            sys.exit(1)
+        return
+
     if not FLAGS.collection_path:
         raise app.UsageError("Must provide --collection_path.")
-    if not FLAGS.frequencies_csv_path:
-        raise app.UsageError("Must provide --frequencies_csv_path.")
-    if not FLAGS.apkg_out:
+    if FLAGS.dry_run:
+        _dry_run()
+        return
+    if not FLAGS.audio_out:
+        raise app.UsageError("Must provide --audio_out.")
+    if FLAGS.output_mode == "apkg" and not FLAGS.apkg_out:
         raise app.UsageError("Must provide --apkg_out.")
 
-    cards_dict = converter_lib.ExtractCards(FLAGS.xml_input_path)
-
-    hsk_reader = hsk_utils_lib.HskReader()
-    decomposer = decomposer_lib.Decomposer()
-    categorizer = categorizer_lib.Categorizer(decomposer, hsk_reader)
-    anki_builder = anki_utils_lib.AnkiBuilder(
-        FLAGS.audio_out, categorizer, cards_dict)
-    frequencies = frequency_lib.Frequencies(FLAGS.frequencies_csv_path)
-    anki_reader = anki_utils_lib.AnkiReader(FLAGS.collection_path)
-
-    added, skipped = set(), set()
-    for hw in cards_dict.keys():
-        if anki_builder.process(hw):
-            added.add(hw)
+    if FLAGS.watch_dir:
+        # Builds share their headwords' parts, so remember every sort.
+        references = _load_references(
+            metrics_lib.Metrics(enabled=False), caching=True)
+        metrics = metrics_lib.Metrics(enabled=False)
+    else:
+        metrics = _make_metrics()
+        references = _load_references(metrics)
+    session = _open_session(references, FLAGS.audio_out,
+                            FLAGS.collection_path, metrics,
+                            media_index_path=FLAGS.media_index_path,
+                            delta_manifest_path=FLAGS.delta_manifest)
+    try:
+        if FLAGS.watch_dir:
+            _watch(session)
         else:
-            skipped.add(hw)
-    logging.info(f"added {len(added)}, skipped {len(skipped)}")
-
-    anki_builder.make_package().write_to_file(
-        os.path.join(FLAGS.apkg_out, _OUTPUT_APKG))
+            _build(session, FLAGS.xml_input_path, FLAGS.apkg_out, metrics)
+    finally:
+        _close_session(session)
+    _save_categorizer(references.categorizer)
+    if references.audio_cache is not None:
+        references.audio_cache.evict()
+    if FLAGS.metrics_out and not FLAGS.watch_dir:
+        metrics.write(FLAGS.metrics_out)
 
 
 if __name__ == '__main__':
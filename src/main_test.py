@@ -0,0 +1,100 @@
+from src import anki_testing
+from src import anki_utils as anki_utils_lib
+from src import main as main_lib
+
+from absl import app
+from absl import flags
+from absl.testing import absltest
+from absl.testing import flagsaver
+from unittest import mock
+import os
+import zipfile
+
+FLAGS = flags.FLAGS
+_TESTDATA = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "testdata")
+
+
+class MainTest(absltest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Parsed by absltest.main(), but not when run under pytest.
+        if not FLAGS.is_parsed():
+            FLAGS.mark_as_parsed()
+
+    def test_dry_run_needs_one_export(self):
+        for other in [{"batch_manifest": "tenants.json"},
+                      {"watch_dir": "exports"}]:
+            with self.subTest(**other), flagsaver.flagsaver(
+                    dry_run=True, collection_path="col.anki2", **other), \
+                    mock.patch.object(main_lib, "_run_batch") as run_batch, \
+                    mock.patch.object(main_lib, "_watch") as watch:
+                with self.assertRaisesRegex(app.UsageError, "--dry_run"):
+                    main_lib.main([])
+                run_batch.assert_not_called()
+                watch.assert_not_called()
+
+    def test_missing_font(self):
+        fonts_dir = self.create_tempdir()
+        fonts_dir.create_file(anki_utils_lib.FONT_FILES[0])
+        with flagsaver.flagsaver(xml_input_path="in.xml",
+                                 fonts_dir=fonts_dir.full_path,
+                                 output_mode="apkg", streaming_apkg=True):
+            with self.assertRaisesRegex(app.UsageError,
+                                        anki_utils_lib.FONT_FILES[1]):
+                main_lib.main([])
+
+    def test_package_flags_need_streaming_apkg(self):
+        for flag in [{"package_media": True}, {"fonts_dir": "fonts"}]:
+            for mode in [{"streaming_apkg": False},
+                         {"streaming_apkg": True, "shard_by": "deck"},
+                         {"streaming_apkg": True, "output_mode": "csv"}]:
+                with self.subTest(**flag, **mode), flagsaver.flagsaver(
+                        **{"xml_input_path": "in.xml", "output_mode": "apkg",
+                           **mode, **flag}):
+                    with self.assertRaisesRegex(app.UsageError,
+                                                "--streaming_apkg"):
+                        main_lib.main([])
+
+    def test_streaming_apkg_from_pipeline(self):
+        d = self.create_tempdir()
+        collection_path = os.path.join(d, "col.anki2")
+        anki_testing.MakeCollection(collection_path)
+        apkg_out = d.mkdir("out").full_path
+        for pipeline in [True, False]:
+            with self.subTest(pipeline=pipeline), flagsaver.flagsaver(
+                    xml_input_path=os.path.join(_TESTDATA, "input.xml"),
+                    frequencies_csv_path=os.path.join(
+                        _TESTDATA, "frequencies.csv"),
+                    collection_path=collection_path,
+                    audio_out=d.mkdir(f"audio-{pipeline}").full_path,
+                    apkg_out=apkg_out, tts_backend="stub",
+                    streaming_apkg=True, pipeline=pipeline):
+                main_lib.main([])
+                with zipfile.ZipFile(
+                        os.path.join(apkg_out, "output.apkg")) as z:
+                    self.assertIn("collection.anki2", z.namelist())
+
+    def test_failed_build_leaves_no_package(self):
+        d = self.create_tempdir()
+        collection_path = os.path.join(d, "col.anki2")
+        anki_testing.MakeCollection(collection_path)
+        apkg_out = d.mkdir("out").full_path
+        with flagsaver.flagsaver(
+                xml_input_path=os.path.join(_TESTDATA, "input.xml"),
+                frequencies_csv_path=os.path.join(
+                    _TESTDATA, "frequencies.csv"),
+                collection_path=collection_path,
+                audio_out=d.mkdir("audio").full_path,
+                apkg_out=apkg_out, tts_backend="stub", streaming_apkg=True), \
+                mock.patch.object(anki_utils_lib.AnkiBuilder, "emit",
+                                  side_effect=OSError("disk full")):
+            with self.assertRaisesRegex(OSError, "disk full"):
+                main_lib.main([])
+        self.assertEmpty(os.listdir(apkg_out))
+
+
+if __name__ == "__main__":
+    absltest.main()
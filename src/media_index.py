@@ -0,0 +1,120 @@
+from absl import logging
+from typing import Dict, Optional, Text
+import json
+import os
+import threading
+
+
+class MediaIndex():
+    """
+    An in-memory listing of the files in one directory, e.g. collection.media,
+    which answers existence and size queries without a stat() per file. The
+    directory is read once with os.scandir and re-read only when its mtime
+    changes. Files written through this process should be recorded with add().
+
+    If |persist_path| is given, the listing is saved there by save() and
+    reused by the next run for as long as the directory's mtime is unchanged,
+    which skips even the one directory read.
+    """
+
+    def __init__(self, directory: Text, persist_path: Optional[Text] = None):
+        self._directory = directory
+        self._persist_path = persist_path
+        self._lock = threading.Lock()
+        # filename => size in bytes, or None if not yet known.
+        self._entries: Dict[Text, Optional[int]] = {}
+        self._dir_mtime_ns = None
+        if not self._load():
+            self.refresh()
+
+    @property
+    def directory(self) -> Text:
+        return self._directory
+
+    def _load(self) -> bool:
+        if not self._persist_path or not os.path.exists(self._persist_path):
+            return False
+        try:
+            with open(self._persist_path) as f:
+                saved = json.load(f)
+            if (saved["directory"] != os.path.abspath(self._directory) or
+                    saved["dir_mtime_ns"] != os.stat(self._directory).st_mtime_ns):
+                return False
+            self._entries = saved["entries"]
+            self._dir_mtime_ns = saved["dir_mtime_ns"]
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"Ignoring media index {self._persist_path}: {e}")
+            return False
+        logging.info(f"Loaded {len(self._entries)} entries for "
+                     f"{self._directory} from {self._persist_path}.")
+        return True
+
+    def refresh(self):
+        """Re-reads the directory if it changed, keeping known sizes."""
+        try:
+            mtime_ns = os.stat(self._directory).st_mtime_ns
+        except FileNotFoundError:
+            with self._lock:
+                self._entries, self._dir_mtime_ns = {}, None
+            return
+        if mtime_ns == self._dir_mtime_ns:
+            return
+        with os.scandir(self._directory) as it:
+            names = [e.name for e in it if e.is_file()]
+        with self._lock:
+            self._entries = {n: self._entries.get(n) for n in names}
+            self._dir_mtime_ns = mtime_ns
+
+    def save(self):
+        if not self._persist_path:
+            return
+        # Record the mtime we listed at, so that changes made by other
+        # processes since then invalidate the saved listing.
+        with self._lock:
+            saved = {
+                "directory": os.path.abspath(self._directory),
+                "dir_mtime_ns": self._dir_mtime_ns,
+                "entries": self._entries,
+            }
+        tmp = f"{self._persist_path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(saved, f)
+        os.replace(tmp, self._persist_path)
+
+    def exists(self, filename: Text) -> bool:
+        with self._lock:
+            return filename in self._entries
+
+    def __contains__(self, filename: Text) -> bool:
+        return self.exists(filename)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def size(self, filename: Text) -> Optional[int]:
+        """Returns the size of |filename|, or None if it does not exist."""
+        with self._lock:
+            if filename not in self._entries:
+                return None
+            size = self._entries[filename]
+        if size is None:
+            try:
+                size = os.stat(os.path.join(self._directory, filename)).st_size
+            except FileNotFoundError:
+                with self._lock:
+                    self._entries.pop(filename, None)
+                return None
+            with self._lock:
+                self._entries[filename] = size
+        return size
+
+    def add(self, filename: Text, size: Optional[int] = None):
+        """Records a file this process wrote into the directory."""
+        with self._lock:
+            self._entries[filename] = size
+            # Our own write changed the directory mtime; don't rescan for it.
+            try:
+                self._dir_mtime_ns = os.stat(self._directory).st_mtime_ns
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,69 @@
+from src import media_index as media_index_lib
+
+import os
+import tempfile
+from absl.testing import absltest
+
+
+def _touch(path, contents=b""):
+    with open(path, "wb") as f:
+        f.write(contents)
+
+
+class MediaIndexTest(absltest.TestCase):
+
+    def test_exists_and_size(self):
+        with tempfile.TemporaryDirectory() as d:
+            _touch(os.path.join(d, "a.flac"), b"12345")
+            os.mkdir(os.path.join(d, "subdir"))
+            index = media_index_lib.MediaIndex(d)
+            self.assertTrue(index.exists("a.flac"))
+            self.assertIn("a.flac", index)
+            self.assertNotIn("subdir", index)
+            self.assertNotIn("b.flac", index)
+            self.assertEqual(index.size("a.flac"), 5)
+            self.assertIsNone(index.size("b.flac"))
+
+    def test_add_and_refresh(self):
+        with tempfile.TemporaryDirectory() as d:
+            index = media_index_lib.MediaIndex(d)
+            _touch(os.path.join(d, "a.flac"))
+            index.add("a.flac")
+            self.assertIn("a.flac", index)
+
+            # Changed behind our back: picked up by refresh().
+            _touch(os.path.join(d, "b.flac"))
+            os.remove(os.path.join(d, "a.flac"))
+            os.utime(d, ns=(0, 0))
+            index.refresh()
+            self.assertNotIn("a.flac", index)
+            self.assertIn("b.flac", index)
+
+    def test_missing_directory(self):
+        with tempfile.TemporaryDirectory() as d:
+            index = media_index_lib.MediaIndex(os.path.join(d, "missing"))
+            self.assertEmpty(index)
+
+    def test_persisted(self):
+        with tempfile.TemporaryDirectory() as d, tempfile.TemporaryDirectory() as p:
+            persist_path = os.path.join(p, "index.json")
+            _touch(os.path.join(d, "a.flac"), b"123")
+            index = media_index_lib.MediaIndex(d, persist_path=persist_path)
+            self.assertEqual(index.size("a.flac"), 3)
+            index.save()
+
+            # The saved listing is trusted while the directory is unchanged...
+            os.rename(os.path.join(d, "a.flac"), os.path.join(p, "a.flac"))
+            st = os.stat(d)
+            os.utime(d, ns=(st.st_atime_ns, index._dir_mtime_ns))
+            index = media_index_lib.MediaIndex(d, persist_path=persist_path)
+            self.assertIn("a.flac", index)
+
+            # ...and ignored once it changes.
+            os.utime(d, ns=(st.st_atime_ns, index._dir_mtime_ns + 1))
+            index = media_index_lib.MediaIndex(d, persist_path=persist_path)
+            self.assertNotIn("a.flac", index)
+
+
+if __name__ == "__main__":
+    absltest.main()
@@ -0,0 +1,165 @@
+from absl import logging
+from typing import Any, Callable, Dict, Iterator, List, Optional, Text
+import collections
+import contextlib
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+
+
+class Metrics():
+    """
+    Per-stage timings and run-wide counters for one build.
+
+    stage() measures a step on the calling thread: wall time, CPU time and,
+    with |trace_memory|, the peak traced allocation while it ran. Stages may
+    nest; an outer stage's peak includes its inner stages'. timer() instead
+    accumulates wall and per-thread CPU time over many short calls, from any
+    thread, e.g. the per-headword work of a pipeline stage. count() adds to a
+    named counter.
+
+    If |profile_stage| names a stage or timer, it runs under cProfile and the
+    stats are written to |profile_path|. There is one profiler, which one
+    thread at a time may enable, since profilers can't overlap from Python
+    3.12; so a profiled timer's calls on other threads wait their turn.
+
+    A disabled Metrics records nothing and costs close to nothing, so callers
+    can use one unconditionally.
+    """
+
+    def __init__(self,
+                 enabled: bool = True,
+                 trace_memory: bool = True,
+                 profile_stage: Optional[Text] = None,
+                 profile_path: Optional[Text] = None):
+        self.enabled = enabled
+        self._trace_memory = enabled and trace_memory
+        self._profile_stage = profile_stage if enabled else None
+        self._profile_path = profile_path
+        self._lock = threading.Lock()
+        self._stages: Dict[Text, Dict[Text, float]] = {}
+        self._timers: Dict[Text, Dict[Text, float]] = collections.defaultdict(
+            lambda: {"calls": 0, "wall_secs": 0.0, "cpu_secs": 0.0})
+        self._counters: Dict[Text, int] = collections.Counter()
+        self._profiler: Optional[cProfile.Profile] = None
+        # Held while the profiler is enabled. Reentrant, for a profiled
+        # timer within a stage of the same name.
+        self._profile_lock = threading.RLock()
+        self._profiling = False
+        # Open stages on the main thread, innermost last, with the peak
+        # traced memory seen so far by each.
+        self._open: List[List] = []
+        if self._trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextlib.contextmanager
+    def _profiled(self, name: Text) -> Iterator[None]:
+        if name != self._profile_stage:
+            yield
+            return
+        with self._profile_lock:
+            if self._profiling:
+                # Already enabled, further out on this thread.
+                yield
+                return
+            if self._profiler is None:
+                self._profiler = cProfile.Profile()
+            self._profiling = True
+            self._profiler.enable()
+            try:
+                yield
+            finally:
+                self._profiler.disable()
+                self._profiling = False
+
+    @contextlib.contextmanager
+    def stage(self, name: Text) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        if self._trace_memory:
+            if self._open:
+                self._open[-1][1] = max(self._open[-1][1],
+                                        tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            self._open.append([name, 0])
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            with self._profiled(name):
+                yield
+        finally:
+            result = {
+                "wall_secs": time.perf_counter() - wall,
+                "cpu_secs": time.process_time() - cpu,
+            }
+            if self._trace_memory:
+                _, peak = self._open.pop()
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+                result["peak_traced_bytes"] = peak
+                if self._open:
+                    self._open[-1][1] = max(self._open[-1][1], peak)
+                tracemalloc.reset_peak()
+            with self._lock:
+                self._stages[name] = result
+
+    @contextlib.contextmanager
+    def timer(self, name: Text) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        with self._profiled(name):
+            # Timed once profiling, so that waiting for the profiler isn't.
+            wall, cpu = time.perf_counter(), time.thread_time()
+            try:
+                yield
+            finally:
+                wall = time.perf_counter() - wall
+                cpu = time.thread_time() - cpu
+                with self._lock:
+                    t = self._timers[name]
+                    t["calls"] += 1
+                    t["wall_secs"] += wall
+                    t["cpu_secs"] += cpu
+
+    def timed(self, name: Text, fn: Callable[..., Any]) -> Callable[..., Any]:
+        """Returns |fn|, timed under |name| on every call."""
+        if not self.enabled:
+            return fn
+
+        def wrapped(*args, **kwargs):
+            with self.timer(name):
+                return fn(*args, **kwargs)
+        return wrapped
+
+    def count(self, name: Text, n: int = 1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] += n
+
+    def report(self) -> Dict[Text, Any]:
+        with self._lock:
+            return {
+                "stages": dict(self._stages),
+                "timers": {k: dict(v) for k, v in self._timers.items()},
+                "counters": dict(sorted(self._counters.items())),
+            }
+
+    def write(self, path: Text):
+        """Writes report() to |path| as JSON, and the profile, if any."""
+        if not self.enabled:
+            return
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.report(), f, indent=2, ensure_ascii=False)
+        os.replace(tmp, path)
+        logging.info(f"Wrote metrics to {path}.")
+        with self._profile_lock:
+            if self._profiler is not None and self._profile_path:
+                pstats.Stats(self._profiler).dump_stats(self._profile_path)
+                logging.info(f"Wrote {self._profile_stage} profile to "
+                             f"{self._profile_path}.")
@@ -0,0 +1,77 @@
+from src import metrics as metrics_lib
+
+import json
+import os
+import pstats
+import tempfile
+import threading
+from absl.testing import absltest
+
+
+def _busy(n=20000):
+    return sum(i * i for i in range(n))
+
+
+class MetricsTest(absltest.TestCase):
+
+    def test_stages_and_counters(self):
+        m = metrics_lib.Metrics()
+        with m.stage("outer"):
+            with m.stage("inner"):
+                blob = bytearray(4 << 20)
+                del blob
+            _busy()
+        m.count("cards_parsed", 3)
+        m.count("cards_parsed")
+        report = m.report()
+        self.assertEqual(report["counters"], {"cards_parsed": 4})
+        outer, inner = report["stages"]["outer"], report["stages"]["inner"]
+        self.assertGreaterEqual(inner["peak_traced_bytes"], 4 << 20)
+        # The outer stage's peak includes the inner stage's.
+        self.assertGreaterEqual(outer["peak_traced_bytes"],
+                                inner["peak_traced_bytes"])
+        self.assertGreaterEqual(outer["wall_secs"], inner["wall_secs"])
+
+    def test_timers_across_threads(self):
+        m = metrics_lib.Metrics(trace_memory=False)
+        busy = m.timed("busy", _busy)
+        threads = [threading.Thread(target=busy) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        timer = m.report()["timers"]["busy"]
+        self.assertEqual(timer["calls"], 4)
+        self.assertGreater(timer["cpu_secs"], 0)
+
+    def test_disabled(self):
+        m = metrics_lib.Metrics(enabled=False)
+        with m.stage("x"), m.timer("y"):
+            m.count("z")
+        self.assertEqual(m.report(),
+                         {"stages": {}, "timers": {}, "counters": {}})
+
+    def test_write_with_profile(self):
+        with tempfile.TemporaryDirectory() as d:
+            m = metrics_lib.Metrics(
+                trace_memory=False, profile_stage="busy",
+                profile_path=os.path.join(d, "busy.prof"))
+            busy = m.timed("busy", _busy)
+            busy()
+            # At once, which one profiler per thread couldn't on Python 3.12.
+            threads = [threading.Thread(target=busy) for _ in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            with m.stage("busy"):
+                busy()
+            m.write(os.path.join(d, "metrics.json"))
+            with open(os.path.join(d, "metrics.json")) as f:
+                self.assertEqual(json.load(f)["timers"]["busy"]["calls"], 6)
+            stats = pstats.Stats(os.path.join(d, "busy.prof"))
+            self.assertTrue(any(fn[2] == "_busy" for fn in stats.stats))
+
+
+if __name__ == "__main__":
+    absltest.main()
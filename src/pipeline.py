@@ -0,0 +1,169 @@
+from absl import logging
+from typing import (Any, Callable, Dict, Iterable, Iterator, List, NamedTuple,
+                    Text, Tuple)
+import queue
+import threading
+
+_QUEUE_SIZE = 64
+_POLL_SECS = 0.1
+
+# Marks the end of a stage's input.
+_DONE = object()
+
+
+class Stage(NamedTuple):
+    """
+    One step of a Pipeline. |fn| maps an item to the next stage's input, or to
+    None to drop the item. |workers| threads run |fn| concurrently. An
+    |ordered| stage sees its items in input order, on a single thread, so it
+    may have side effects which depend on that order.
+    """
+    name: Text
+    fn: Callable[[Any], Any]
+    workers: int = 1
+    ordered: bool = False
+
+
+class _Failure(NamedTuple):
+    stage: Text
+    error: BaseException
+
+
+class Pipeline():
+    """
+    Runs items through a sequence of stages, each on its own threads, joined
+    by bounded queues so that a slow stage holds back those before it rather
+    than letting work pile up in memory. Every item carries its input sequence
+    number, so that ordered stages, and the results, follow the input order
+    no matter how many workers the other stages have.
+    """
+
+    def __init__(self, stages: List[Stage], queue_size: int = _QUEUE_SIZE):
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage.")
+        for stage in stages:
+            if stage.workers < 1:
+                raise ValueError(
+                    f"Stage {stage.name} needs at least 1 worker.")
+            if stage.ordered and stage.workers != 1:
+                raise ValueError(
+                    f"Ordered stage {stage.name} must have 1 worker.")
+        self._stages = stages
+        self._queue_size = queue_size
+
+    def run(self, items: Iterable[Any]) -> Iterator[Tuple[Any, Any]]:
+        """
+        Yields (item, result) for each of |items|, in order, where result is
+        what the last stage returned, or None if a stage dropped the item.
+        Re-raises the first exception any stage raised, in input order.
+        """
+        cancelled = threading.Event()
+        queues = [queue.Queue(self._queue_size)
+                  for _ in range(len(self._stages) + 1)]
+        inputs: Dict[int, Any] = {}
+        inputs_lock = threading.Lock()
+
+        def put(q: queue.Queue, entry) -> bool:
+            while not cancelled.is_set():
+                try:
+                    q.put(entry, timeout=_POLL_SECS)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def get(q: queue.Queue):
+            while not cancelled.is_set():
+                try:
+                    return q.get(timeout=_POLL_SECS)
+                except queue.Empty:
+                    pass
+            return _DONE
+
+        def feed():
+            try:
+                for seq, item in enumerate(items):
+                    with inputs_lock:
+                        inputs[seq] = item
+                    if not put(queues[0], (seq, item)):
+                        return
+            except BaseException as e:
+                put(queues[0], (-1, _Failure("input", e)))
+            for _ in range(self._stages[0].workers):
+                put(queues[0], _DONE)
+
+        threads = [threading.Thread(target=feed, name="pipeline-feed",
+                                    daemon=True)]
+        for i, stage in enumerate(self._stages):
+            next_workers = (self._stages[i + 1].workers
+                            if i + 1 < len(self._stages) else 1)
+            remaining = [stage.workers]
+            remaining_lock = threading.Lock()
+
+            def work(stage=stage, inq=queues[i], outq=queues[i + 1],
+                     next_workers=next_workers, remaining=remaining,
+                     remaining_lock=remaining_lock):
+                for seq, value in self._inputs(stage, inq, get):
+                    if value is not None and not isinstance(value, _Failure):
+                        try:
+                            value = stage.fn(value)
+                        except BaseException as e:
+                            value = _Failure(stage.name, e)
+                    if not put(outq, (seq, value)):
+                        return
+                with remaining_lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last:
+                    for _ in range(next_workers):
+                        put(outq, _DONE)
+
+            for n in range(stage.workers):
+                threads.append(threading.Thread(
+                    target=work, name=f"pipeline-{stage.name}-{n}",
+                    daemon=True))
+
+        for t in threads:
+            t.start()
+        try:
+            for seq, value in _Reordered(queues[-1], get):
+                if isinstance(value, _Failure):
+                    logging.error(f"Pipeline stage {value.stage} failed.")
+                    raise value.error
+                with inputs_lock:
+                    item = inputs.pop(seq)
+                yield item, value
+        finally:
+            cancelled.set()
+            for t in threads:
+                t.join()
+
+    @staticmethod
+    def _inputs(stage: Stage, inq: queue.Queue,
+                get) -> Iterator[Tuple[int, Any]]:
+        if stage.ordered:
+            return _Reordered(inq, get)
+        return _Unordered(inq, get)
+
+
+def _Unordered(inq: queue.Queue, get) -> Iterator[Tuple[int, Any]]:
+    while True:
+        entry = get(inq)
+        if entry is _DONE:
+            return
+        yield entry
+
+
+def _Reordered(inq: queue.Queue, get) -> Iterator[Tuple[int, Any]]:
+    # Holds back entries which arrive early until their predecessors have
+    # arrived. A failure in the input itself (seq -1) goes out immediately.
+    pending: Dict[int, Any] = {}
+    next_seq = 0
+    for seq, value in _Unordered(inq, get):
+        if seq < 0:
+            yield seq, value
+            continue
+        pending[seq] = value
+        while next_seq in pending:
+            yield next_seq, pending.pop(next_seq)
+            next_seq += 1
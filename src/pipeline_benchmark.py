@@ -0,0 +1,119 @@
+#! /usr/bin/python3
+
+from absl import app
+from absl import flags
+from typing import Text
+import os
+import random
+import sys
+import tempfile
+import zlib
+
+from src import anki_utils as anki_utils_lib
+from src import benchmark_utils
+from src import categorizer as categorizer_lib
+from src import converter as converter_lib
+from src import decomposer as decomposer_lib
+from src import hsk_utils as hsk_utils_lib
+from src import synthetic_export
+from src import toposorter as toposorter_lib
+from src import tts as tts_lib
+
+
+FLAGS = flags.FLAGS
+flags.DEFINE_list("sizes", ["1000", "10000"],
+                  "Numbers of cards in the synthetic exports to time, e.g. "
+                  "1000,10000,100000.")
+flags.DEFINE_integer("seed", 0, "Seed for the synthetic exports.")
+flags.DEFINE_integer("sample", 200,
+                     "Number of headwords to time Categorizer.sort_into_deck "
+                     "on, per size; each call takes milliseconds.")
+flags.DEFINE_integer("repeat", 3,
+                     "Runs of each whole-export step; the best is kept.")
+flags.DEFINE_string("baseline_out", None, "Write results here, as JSON.")
+flags.DEFINE_string("compare_to", None,
+                    "A --baseline_out from an earlier run to compare with.")
+flags.DEFINE_float("threshold", 0.1,
+                   "With --compare_to, fail if any time grows by more than "
+                   "this fraction.")
+
+
+class _FixedCategorizer():
+    # Spreads headwords over the HSK decks without the cost of categorizing
+    # them, so that AnkiBuilder's own cost is measured on its own.
+    _DECKS = [categorizer_lib.Deck(categorizer_lib.Deck.HSK_1_V1 + i)
+              for i in range(6)]
+
+    def sort_into_deck(self, headword: Text) -> categorizer_lib.Deck:
+        return self._DECKS[zlib.crc32(headword.encode("utf-8")) % 6]
+
+
+def _bench_size(num_cards: int, decomposer, categorizer,
+                results: benchmark_utils.Results):
+    with tempfile.TemporaryDirectory() as d:
+        xml_path = os.path.join(d, "export.xml")
+        synthetic_export.Write(xml_path, num_cards, FLAGS.seed)
+
+        cards = converter_lib.ExtractCards(xml_path)
+        results[f"ExtractCards/{num_cards}"] = {
+            "secs": benchmark_utils.BestOf(
+                lambda: converter_lib.ExtractCards(xml_path), FLAGS.repeat),
+            "cards": len(cards),
+        }
+
+        headwords = list(cards)
+        sample = random.Random(FLAGS.seed).sample(
+            headwords, min(FLAGS.sample, len(headwords)))
+        latencies = [benchmark_utils.Timed(
+            lambda: categorizer.sort_into_deck(hw))[1] for hw in sample]
+        results[f"Categorizer.sort_into_deck/{num_cards}"] = dict(
+            benchmark_utils.Percentiles(latencies), sample=len(sample))
+
+        card_list = list(cards.cards())
+
+        def toposort():
+            toposorter_lib.Toposorter(decomposer, card_list).get_sorted()
+        results[f"Toposorter.get_sorted/{num_cards}"] = {
+            "secs": benchmark_utils.BestOf(toposort, FLAGS.repeat),
+        }
+
+        audio_dir = os.path.join(d, "audio")
+        os.mkdir(audio_dir)
+        with tts_lib.RenderPool(tts_lib.StubBackend()) as pool:
+            builder = anki_utils_lib.AnkiBuilder(
+                audio_dir, _FixedCategorizer(), cards, tts_pool=pool)
+            _, secs = benchmark_utils.Timed(
+                lambda: [builder.process(hw) for hw in headwords])
+        results[f"AnkiBuilder.process/{num_cards}"] = {
+            "secs": secs,
+            "per_card_us": secs / len(headwords) * 1e6,
+        }
+
+        apkg = os.path.join(d, "output.apkg")
+        results[f"AnkiBuilder.make_package/{num_cards}"] = {
+            "secs": benchmark_utils.BestOf(
+                lambda: builder.make_package().write_to_file(apkg), 1),
+            "apkg_bytes": os.path.getsize(apkg),
+        }
+
+
+def main(argv):
+    del argv
+
+    results: benchmark_utils.Results = {}
+    decomposer, secs = benchmark_utils.Timed(decomposer_lib.Decomposer)
+    results["Decomposer"] = {"secs": secs}
+    categorizer = categorizer_lib.Categorizer(
+        decomposer, hsk_utils_lib.HskReader())
+    for size in FLAGS.sizes:
+        _bench_size(int(size), decomposer, categorizer, results)
+    results["memory"] = {"peak_rss_bytes": benchmark_utils.PeakRssBytes()}
+
+    params = {"sizes": FLAGS.sizes, "seed": FLAGS.seed, "sample": FLAGS.sample}
+    if not benchmark_utils.Report(results, params, FLAGS.baseline_out,
+                                  FLAGS.compare_to, FLAGS.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    app.run(main)
@@ -0,0 +1,92 @@
+from src import pipeline as pipeline_lib
+
+import random
+import threading
+import time
+from absl.testing import absltest
+
+
+def _jitter(fn):
+    # Finishes items out of order across workers.
+    def wrapped(x):
+        time.sleep(random.random() / 1000)
+        return fn(x)
+    return wrapped
+
+
+class PipelineTest(absltest.TestCase):
+
+    def test_results_in_input_order(self):
+        p = pipeline_lib.Pipeline([
+            pipeline_lib.Stage("double", _jitter(lambda x: x * 2), workers=4),
+            pipeline_lib.Stage("inc", _jitter(lambda x: x + 1), workers=3),
+        ], queue_size=2)
+        self.assertEqual(list(p.run(range(200))),
+                         [(i, i * 2 + 1) for i in range(200)])
+
+    def test_ordered_stage_sees_input_order(self):
+        seen = []
+        p = pipeline_lib.Pipeline([
+            pipeline_lib.Stage("noop", _jitter(lambda x: x), workers=4),
+            pipeline_lib.Stage("record", seen.append, ordered=True),
+        ])
+        list(p.run(range(100)))
+        self.assertEqual(seen, list(range(100)))
+
+    def test_drops_items(self):
+        calls = []
+        p = pipeline_lib.Pipeline([
+            pipeline_lib.Stage("odd", lambda x: x if x % 2 else None,
+                               workers=2),
+            pipeline_lib.Stage("record", lambda x: calls.append(x) or x,
+                               ordered=True),
+        ])
+        self.assertEqual(list(p.run(range(6))),
+                         [(0, None), (1, 1), (2, None), (3, 3), (4, None),
+                          (5, 5)])
+        self.assertEqual(calls, [1, 3, 5])
+
+    def test_raises_and_stops(self):
+        def fail_on_5(x):
+            if x == 5:
+                raise ValueError("5")
+            return x
+        p = pipeline_lib.Pipeline([
+            pipeline_lib.Stage("fail", fail_on_5, workers=2),
+            pipeline_lib.Stage("noop", lambda x: x),
+        ], queue_size=1)
+        results = []
+        with self.assertRaisesRegex(ValueError, "5"):
+            for r in p.run(range(1000)):
+                results.append(r)
+        self.assertEqual(results, [(i, i) for i in range(5)])
+        self.assertFalse([t for t in threading.enumerate()
+                          if t.name.startswith("pipeline-")])
+
+    def test_bounded(self):
+        produced = []
+
+        def items():
+            for i in range(1000):
+                produced.append(i)
+                yield i
+
+        p = pipeline_lib.Pipeline([pipeline_lib.Stage("noop", lambda x: x)],
+                                  queue_size=2)
+        it = p.run(items())
+        next(it)
+        time.sleep(0.05)
+        # The input is only read ahead as far as the queues hold.
+        self.assertLess(len(produced), 10)
+        it.close()
+
+    def test_validates(self):
+        with self.assertRaises(ValueError):
+            pipeline_lib.Pipeline([])
+        with self.assertRaises(ValueError):
+            pipeline_lib.Pipeline(
+                [pipeline_lib.Stage("x", lambda x: x, workers=2, ordered=True)])
+
+
+if __name__ == "__main__":
+    absltest.main()
@@ -0,0 +1,55 @@
+#! /usr/bin/python3
+
+from absl import app
+from absl import flags
+from absl import logging
+import asyncio
+import signal
+
+from src import categorizer as categorizer_lib
+from src import decomposer as decomposer_lib
+from src import frequency as frequency_lib
+from src import hsk_utils as hsk_utils_lib
+from src import query_service as query_service_lib
+
+FLAGS = flags.FLAGS
+flags.DEFINE_string("host", "127.0.0.1",
+                    "Address to listen on. The service has no "
+                    "authentication; keep it local.")
+flags.DEFINE_integer("port", 8765, "Port to listen on.")
+flags.DEFINE_string("frequencies_csv_path", None,
+                    "Path to the frequencies csv.")
+flags.DEFINE_integer("workers", 4, "Threads answering requests.")
+
+
+async def _serve(service: query_service_lib.QueryService):
+    server = await service.start(FLAGS.host, FLAGS.port)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    async with server:
+        await stop.wait()
+    logging.info("Stopped serving.")
+
+
+def main(argv):
+    del argv
+    if not FLAGS.frequencies_csv_path:
+        raise app.UsageError("Must provide --frequencies_csv_path.")
+
+    decomposer = decomposer_lib.Decomposer()
+    service = query_service_lib.QueryService(
+        decomposer,
+        categorizer_lib.CachingCategorizer(
+            decomposer, hsk_utils_lib.HskReader()),
+        frequency_lib.Frequencies(FLAGS.frequencies_csv_path),
+        max_workers=FLAGS.workers)
+    try:
+        asyncio.run(_serve(service))
+    finally:
+        service.close()
+
+
+if __name__ == '__main__':
+    app.run(main)
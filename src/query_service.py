@@ -0,0 +1,253 @@
+from absl import logging
+from concurrent import futures
+from typing import Any, Callable, Deque, Dict, List, Optional, Text, Tuple
+from urllib import parse
+import asyncio
+import collections
+import http
+import json
+import threading
+import time
+
+from src import benchmark_utils
+from src import categorizer as categorizer_lib
+from src import decomposer as decomposer_lib
+from src import frequency as frequency_lib
+from src import toposorter as toposorter_lib
+
+# Bounds on what one request may ask for.
+_MAX_BODY_BYTES = 1 << 20
+_MAX_ITEMS = 10000
+_MAX_HEADER_LINES = 100
+# Latencies kept per endpoint for the percentiles in /metrics.
+_LATENCY_WINDOW = 10000
+
+
+class _BadRequest(Exception):
+    pass
+
+
+class _EndpointStats():
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.items = 0
+        self.latencies: Deque[float] = collections.deque(
+            maxlen=_LATENCY_WINDOW)
+
+    def report(self) -> Dict[Text, float]:
+        return dict(benchmark_utils.Percentiles(self.latencies),
+                    requests=self.requests, errors=self.errors,
+                    items=self.items)
+
+
+class QueryService():
+    """
+    Answers batched questions about characters and words over HTTP, from
+    one Decomposer, Categorizer and Frequencies loaded up front, so that
+    other tools needn't each pay to load them.
+
+    Every endpoint but /metrics takes a POST of {"items": [...]}:
+
+      /decompose      character => its IDS decomposition, or null
+      /get_component  component => the characters containing it
+      /categorize     headword => the name of the deck it would go to
+      /frequency      headword => its frequency rank, lower is commoner;
+                      null for an empty one
+      /toposort       the headwords, components before compounds; with
+                      "by_frequency": true, commoner ones first among equals
+
+    and responds with {"results": ...}, or {"error": ...} and a 4xx or 5xx
+    status. GET /metrics reports each endpoint's requests, errors, items
+    and latency percentiles over its last requests.
+
+    Requests are parsed on the event loop and answered on a pool of
+    |max_workers| threads, so one slow batch doesn't stall the others'
+    I/O.
+    """
+
+    def __init__(self,
+                 decomposer: decomposer_lib.Decomposer,
+                 categorizer: categorizer_lib.Categorizer,
+                 frequencies: frequency_lib.Frequencies,
+                 max_workers: int = 4):
+        self._decomposer = decomposer
+        self._categorizer = categorizer
+        self._frequencies = frequencies
+        self._executor = futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="query")
+        self._endpoints: Dict[Text, Callable[[List[Text], Dict], Any]] = {
+            "decompose": self._decompose,
+            "get_component": self._get_component,
+            "categorize": self._categorize,
+            "frequency": self._frequency,
+            "toposort": self._toposort,
+        }
+        self._lock = threading.Lock()
+        self._stats: Dict[Text, _EndpointStats] = collections.defaultdict(
+            _EndpointStats)
+        self._started = time.monotonic()
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+    def _decompose(self, items: List[Text], _) -> Dict[Text, Optional[Text]]:
+        return {c: self._decomposition(c) for c in items}
+
+    def _decomposition(self, c: Text) -> Optional[Text]:
+        # One item which can't be decomposed mustn't fail the whole batch.
+        try:
+            return self._decomposer.decompose(c).decomposition
+        except ValueError:
+            return None
+
+    def _get_component(self, items: List[Text], _) -> Dict[Text, List[Text]]:
+        return {c: (sorted(self._decomposer.get_component(c))
+                    if c in self._decomposer._graph else [])
+                for c in items}
+
+    def _categorize(self, items: List[Text], _) -> Dict[Text, Text]:
+        return {hw: self._categorizer.sort_into_deck(hw).name for hw in items}
+
+    def _frequency(self, items: List[Text], _
+                   ) -> Dict[Text, Optional[float]]:
+        return {hw: self._frequencies.get_frequency(hw) if hw else None
+                for hw in items}
+
+    def _toposort(self, items: List[Text], request: Dict) -> List[Text]:
+        key = None
+        if request.get("by_frequency"):
+            key = self._frequencies.get_frequency
+        toposorter = toposorter_lib.Toposorter.from_headwords(
+            self._decomposer, items)
+        # Leave out the components it added along the way.
+        wanted = set(items)
+        return [hw for hw in toposorter.get_sorted(key) if hw in wanted]
+
+    def metrics(self) -> Dict[Text, Any]:
+        with self._lock:
+            endpoints = {name: stats.report()
+                         for name, stats in sorted(self._stats.items())}
+        return {"uptime_secs": time.monotonic() - self._started,
+                "endpoints": endpoints}
+
+    def _record(self, name: Text, secs: float, items: int, ok: bool):
+        with self._lock:
+            stats = self._stats[name]
+            stats.requests += 1
+            stats.items += items
+            stats.errors += not ok
+            stats.latencies.append(secs)
+
+    async def handle(self, method: Text, path: Text,
+                     body: bytes) -> Tuple[int, Any]:
+        """Returns the status and JSON payload for one request."""
+        name = path.strip("/")
+        if name == "metrics":
+            if method != "GET":
+                return http.HTTPStatus.METHOD_NOT_ALLOWED, {
+                    "error": "Use GET."}
+            return http.HTTPStatus.OK, self.metrics()
+        endpoint = self._endpoints.get(name)
+        if endpoint is None:
+            return http.HTTPStatus.NOT_FOUND, {"error": f"No {path}."}
+        if method != "POST":
+            return http.HTTPStatus.METHOD_NOT_ALLOWED, {"error": "Use POST."}
+
+        start = time.perf_counter()
+        items: List[Text] = []
+        status = http.HTTPStatus.OK
+        try:
+            try:
+                request = json.loads(body)
+            except ValueError as e:
+                raise _BadRequest(f"Invalid JSON: {e}")
+            if not isinstance(request, dict):
+                raise _BadRequest("Expected a JSON object.")
+            items = request.get("items")
+            if (not isinstance(items, list) or
+                    not all(isinstance(i, str) for i in items)):
+                raise _BadRequest('Expected "items", a list of strings.')
+            if len(items) > _MAX_ITEMS:
+                raise _BadRequest(f"At most {_MAX_ITEMS} items per request.")
+            results = await asyncio.get_running_loop().run_in_executor(
+                self._executor, endpoint, items, request)
+            return status, {"results": results}
+        except _BadRequest as e:
+            status = http.HTTPStatus.BAD_REQUEST
+            return status, {"error": str(e)}
+        except Exception as e:
+            logging.exception(f"Failed to answer {path}.")
+            status = http.HTTPStatus.INTERNAL_SERVER_ERROR
+            return status, {"error": f"{type(e).__name__}: {e}"}
+        finally:
+            self._record(name, time.perf_counter() - start,
+                         len(items) if isinstance(items, list) else 0,
+                         status == http.HTTPStatus.OK)
+
+    async def _serve_connection(self, reader: asyncio.StreamReader,
+                                writer: asyncio.StreamWriter):
+        # Just enough HTTP/1.1 for JSON clients: Content-Length bodies and
+        # keep-alive.
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = (
+                        request_line.decode("latin-1").split())
+                except ValueError:
+                    self._respond(writer, http.HTTPStatus.BAD_REQUEST,
+                                  {"error": "Malformed request line."}, False)
+                    break
+                headers = {}
+                for _ in range(_MAX_HEADER_LINES):
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    header, _, value = line.decode("latin-1").partition(":")
+                    headers[header.strip().lower()] = value.strip()
+                try:
+                    length = int(headers.get("content-length") or 0)
+                except ValueError:
+                    length = -1
+                if not 0 <= length <= _MAX_BODY_BYTES:
+                    self._respond(writer,
+                                  http.HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                                  {"error": "Bad Content-Length."}, False)
+                    break
+                body = await reader.readexactly(length)
+                status, payload = await self.handle(
+                    method, parse.urlsplit(target).path, body)
+                keep_alive = (version == "HTTP/1.1" and
+                              headers.get("connection", "").lower() != "close")
+                self._respond(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _respond(writer: asyncio.StreamWriter, status: int, payload: Any,
+                 keep_alive: bool):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        status = http.HTTPStatus(status)
+        writer.write(
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            f"\r\n".encode("latin-1") + body)
+
+    async def start(self, host: Text = "127.0.0.1",
+                    port: int = 0) -> asyncio.AbstractServer:
+        """Starts listening; port 0 picks a free one."""
+        server = await asyncio.start_server(
+            self._serve_connection, host, port)
+        for sock in server.sockets:
+            logging.info(f"Serving on {sock.getsockname()}.")
+        return server
@@ -0,0 +1,152 @@
+from src import categorizer as categorizer_lib
+from src import decomposer as decomposer_lib
+from src import frequency as frequency_lib
+from src import query_service as query_service_lib
+
+from unittest.mock import MagicMock
+from absl.testing import absltest
+import asyncio
+import json
+import os
+import tempfile
+
+_IDS = ("U+4F60\t你\t^⿰亻尔$(GHJKTV)\n"
+        "U+4EEC\t们\t^⿰亻门$(GHJKTV)\n"
+        "U+597D\t好\t^⿰女子$(GHJKTV)\n")
+
+
+async def _request(port, method, path, payload=None, raw=None):
+    # One request on a fresh connection; returns the status and JSON body.
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = raw if raw is not None else (
+        json.dumps(payload).encode("utf-8") if payload is not None else b"")
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+                 f"Content-Length: {len(body)}\r\nConnection: close\r\n"
+                 f"\r\n".encode("latin-1") + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(body)
+
+
+class QueryServiceTest(absltest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "IDS.txt")
+            with open(path, "w", encoding="UTF-8") as f:
+                f.write(_IDS)
+            cls.decomposer = decomposer_lib.Decomposer(ids_path=path)
+            path = os.path.join(d, "frequencies.csv")
+            with open(path, "w") as f:
+                f.write("1,的,200,0.5\n2,你,100,1.0\n3,们,50,2.0\n"
+                        "4,好,25,3.0\n5,是,10,4.0\n")
+            cls.frequencies = frequency_lib.Frequencies(path)
+
+    def setUp(self):
+        super().setUp()
+        hsk_reader = MagicMock()
+        hsk_reader.GetHskLevel.side_effect = lambda hw: {
+            "你们": 1, "好": 1}.get(hw)
+        hsk_reader.GetHskAndBelow.side_effect = lambda lvl: set()
+        self.service = query_service_lib.QueryService(
+            self.decomposer,
+            categorizer_lib.Categorizer(self.decomposer, hsk_reader),
+            self.frequencies, max_workers=2)
+        self.addCleanup(self.service.close)
+
+    def _run(self, scenario):
+        async def run():
+            server = await self.service.start("127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                return await scenario(port)
+        return asyncio.run(run())
+
+    def test_endpoints(self):
+        async def scenario(port):
+            return await asyncio.gather(
+                _request(port, "POST", "/decompose",
+                         {"items": ["你", "亻", "?"]}),
+                _request(port, "POST", "/get_component",
+                         {"items": ["亻", "女", "口"]}),
+                _request(port, "POST", "/categorize",
+                         {"items": ["你们", "好"]}),
+                _request(port, "POST", "/frequency",
+                         {"items": ["你", "你们", ""]}),
+                _request(port, "POST", "/toposort",
+                         {"items": ["你们", "们", "你"]}),
+                _request(port, "POST", "/toposort",
+                         {"items": ["好", "是", "的"],
+                          "by_frequency": True}))
+        decompose, component, categorize, frequency, toposort, by_freq = (
+            self._run(scenario))
+
+        self.assertEqual(decompose, (200, {"results": {
+            "你": "⿰亻尔", "亻": None, "?": None}}))
+        self.assertEqual(component, (200, {"results": {
+            "亻": ["们", "你"], "女": ["好"], "口": []}}))
+        self.assertEqual(categorize, (200, {"results": {
+            "你们": "HSK_1_V1", "好": "HSK_1_V1"}}))
+        self.assertEqual(frequency, (200, {"results": {
+            "你": 1.0, "你们": 1.5, "": None}}))
+        status, payload = toposort
+        self.assertEqual(status, 200)
+        self.assertCountEqual(payload["results"], ["你们", "们", "你"])
+        self.assertEqual(payload["results"][-1], "你们")
+        # 好 waits on its components, which are rarer than anything.
+        self.assertEqual(by_freq, (200, {"results": ["的", "是", "好"]}))
+
+    def test_errors_and_metrics(self):
+        async def scenario(port):
+            results = []
+            for args in [
+                ("POST", "/decompose", None, b"not json"),
+                ("POST", "/decompose", {"items": "你"}, None),
+                ("GET", "/decompose", None, None),
+                ("POST", "/nonexistent", {"items": []}, None),
+                ("POST", "/decompose", {"items": ["你"]}, None),
+            ]:
+                results.append(await _request(port, *args))
+            results.append(await _request(port, "GET", "/metrics"))
+            return results
+        *errors, ok, metrics = self._run(scenario)
+
+        self.assertEqual([status for status, _ in errors],
+                         [400, 400, 405, 404])
+        self.assertEqual(ok[0], 200)
+        status, payload = metrics
+        self.assertEqual(status, 200)
+        decompose = payload["endpoints"]["decompose"]
+        # The 405 was turned away before it counted.
+        self.assertEqual(decompose["requests"], 3)
+        self.assertEqual(decompose["errors"], 2)
+        self.assertEqual(decompose["items"], 1)
+        self.assertGreater(decompose["p99_us"], 0)
+
+    def test_keep_alive(self):
+        async def scenario(port):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            statuses = []
+            for c in ["你", "好"]:
+                body = json.dumps({"items": [c]}).encode("utf-8")
+                writer.write(b"POST /decompose HTTP/1.1\r\n"
+                             b"Content-Length: %d\r\n\r\n" % len(body) + body)
+                await writer.drain()
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = int(head.split(b"Content-Length: ")[1].split()[0])
+                statuses.append((head.split()[1],
+                                 json.loads(await reader.readexactly(length))))
+            writer.close()
+            return statuses
+        self.assertEqual(self._run(scenario), [
+            (b"200", {"results": {"你": "⿰亻尔"}}),
+            (b"200", {"results": {"好": "⿰女子"}}),
+        ])
+
+
+if __name__ == "__main__":
+    absltest.main()
@@ -0,0 +1,116 @@
+from absl import logging
+from concurrent import futures
+from typing import Dict, List, Mapping, Optional, Text
+import hashlib
+import json
+import os
+import re
+
+from src import categorizer as categorizer_lib
+
+_MANIFEST = "manifest.json"
+_HSK_RE = re.compile(r"HSK_(\d)_")
+
+
+def ShardName(deck: categorizer_lib.Deck, shard_by: Text) -> Text:
+    if shard_by == "deck":
+        return deck.name.lower()
+    if shard_by == "hsk":
+        m = _HSK_RE.match(deck.name)
+        return f"hsk_{m.group(1)}" if m else "other"
+    raise ValueError(f"Unknown shard_by '{shard_by}', expected deck or hsk.")
+
+
+def _digest(decks: List["genanki.Deck"]) -> Text:
+    # Over the notes rather than the .apkg bytes, which embed timestamps.
+    h = hashlib.sha256()
+    for deck in sorted(decks, key=lambda d: d.deck_id):
+        h.update(f"{deck.deck_id}\x1e{deck.name}\x1e".encode("utf-8"))
+        for note in deck.notes:
+            h.update("\x1f".join([note.guid, str(note.model.model_id)] +
+                                 list(note.fields)).encode("utf-8"))
+            h.update(b"\x1e")
+    return h.hexdigest()
+
+
+def _write_shard(path: Text, decks: List["genanki.Deck"]) -> Text:
+    # Runs in a worker process.
+    import genanki
+    genanki.Package(decks).write_to_file(path)
+    return path
+
+
+class ShardedPackager():
+    """
+    Writes one .apkg per deck, or per HSK band, on a process pool, plus a
+    manifest recording a digest of each shard's notes. Shards whose digest
+    matches the previous manifest are not rewritten, and are marked unchanged
+    so that learners only need to import the shards which changed. Shards of
+    the previous manifest which are now empty are deleted, and listed as
+    removed, so that no stale notes are left to import.
+    """
+
+    def __init__(self,
+                 out_dir: Text,
+                 shard_by: Text = "deck",
+                 max_workers: Optional[int] = None):
+        self._out_dir = out_dir
+        self._shard_by = shard_by
+        self._max_workers = max_workers
+
+    def _load_manifest(self) -> Dict[Text, Dict]:
+        path = os.path.join(self._out_dir, _MANIFEST)
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)["shards"]
+
+    def write(self,
+              decks: Mapping[categorizer_lib.Deck, "genanki.Deck"]
+              ) -> Dict[Text, Dict]:
+        """Writes the shards and the manifest, and returns the manifest."""
+        shards: Dict[Text, List["genanki.Deck"]] = {}
+        for deck_enum, deck_obj in sorted(decks.items()):
+            if deck_obj.notes:
+                shards.setdefault(
+                    ShardName(deck_enum, self._shard_by), []).append(deck_obj)
+
+        previous = self._load_manifest()
+        manifest = {}
+        with futures.ProcessPoolExecutor(
+                max_workers=self._max_workers) as executor:
+            pending = []
+            for name, shard_decks in shards.items():
+                filename = f"{name}.apkg"
+                digest = _digest(shard_decks)
+                changed = (previous.get(name, {}).get("digest") != digest or
+                           not os.path.exists(
+                               os.path.join(self._out_dir, filename)))
+                manifest[name] = {
+                    "file": filename,
+                    "digest": digest,
+                    "notes": sum(len(d.notes) for d in shard_decks),
+                    "changed": changed,
+                }
+                if changed:
+                    pending.append(executor.submit(
+                        _write_shard, os.path.join(self._out_dir, filename),
+                        shard_decks))
+            for future in futures.as_completed(pending):
+                logging.info(f"Wrote {future.result()}.")
+
+        removed = sorted(set(previous) - set(manifest))
+        for name in removed:
+            path = os.path.join(self._out_dir, previous[name]["file"])
+            if os.path.exists(path):
+                os.remove(path)
+                logging.info(f"Removed {path}, now empty.")
+
+        tmp = os.path.join(self._out_dir, f"{_MANIFEST}.tmp")
+        with open(tmp, "w") as f:
+            json.dump({"shard_by": self._shard_by, "shards": manifest,
+                       "removed": removed}, f, indent=2, sort_keys=True)
+        os.replace(tmp, os.path.join(self._out_dir, _MANIFEST))
+        logging.info(f"{sum(s['changed'] for s in manifest.values())} of "
+                     f"{len(manifest)} shards changed.")
+        return manifest
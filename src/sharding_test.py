@@ -0,0 +1,97 @@
+from src import categorizer as categorizer_lib
+from src import sharding as sharding_lib
+
+import genanki
+import json
+import os
+import tempfile
+import zipfile
+from absl.testing import absltest
+
+_MODEL = genanki.Model(
+    1234, "Test", fields=[{"name": "characters"}],
+    templates=[{"name": "Card", "qfmt": "{{characters}}", "afmt": "x"}])
+
+
+def _decks(headwords_by_deck):
+    decks = {}
+    for i, (deck_enum, headwords) in enumerate(headwords_by_deck.items()):
+        deck = genanki.Deck(1000 + i, str(deck_enum))
+        for headword in headwords:
+            deck.add_note(genanki.Note(_MODEL, [headword],
+                                       guid=genanki.guid_for(headword)))
+        decks[deck_enum] = deck
+    return decks
+
+
+class ShardingTest(absltest.TestCase):
+
+    def test_shard_name(self):
+        self.assertEqual(
+            sharding_lib.ShardName(categorizer_lib.Deck.HSK_1_V1, "deck"),
+            "hsk_1_v1")
+        self.assertEqual(
+            sharding_lib.ShardName(categorizer_lib.Deck.HSK_1_V1, "hsk"),
+            "hsk_1")
+        with self.assertRaises(ValueError):
+            sharding_lib.ShardName(categorizer_lib.Deck.HSK_1_V1, "tone")
+
+    def test_writes_only_changed_shards(self):
+        Deck = categorizer_lib.Deck
+        with tempfile.TemporaryDirectory() as d:
+            packager = sharding_lib.ShardedPackager(d, shard_by="deck",
+                                                    max_workers=2)
+            manifest = packager.write(_decks({
+                Deck.HSK_1_V1: ["我", "你"],
+                Deck.HSK_2_V1: ["他"],
+                Deck.HSK_3_V1: [],
+            }))
+            self.assertEqual(sorted(manifest), ["hsk_1_v1", "hsk_2_v1"])
+            self.assertTrue(all(s["changed"] for s in manifest.values()))
+            self.assertEqual(manifest["hsk_1_v1"]["notes"], 2)
+            for shard in manifest.values():
+                with zipfile.ZipFile(os.path.join(d, shard["file"])) as z:
+                    self.assertIn("collection.anki2", z.namelist())
+            with open(os.path.join(d, "manifest.json")) as f:
+                self.assertEqual(json.load(f)["shards"], manifest)
+
+            manifest = packager.write(_decks({
+                Deck.HSK_1_V1: ["我", "你"],
+                Deck.HSK_2_V1: ["他", "她"],
+            }))
+            self.assertFalse(manifest["hsk_1_v1"]["changed"])
+            self.assertTrue(manifest["hsk_2_v1"]["changed"])
+
+    def test_removes_emptied_shards(self):
+        Deck = categorizer_lib.Deck
+        with tempfile.TemporaryDirectory() as d:
+            packager = sharding_lib.ShardedPackager(d, shard_by="deck")
+            packager.write(_decks({Deck.HSK_1_V1: ["我"],
+                                   Deck.HSK_2_V1: ["他"]}))
+
+            manifest = packager.write(_decks({Deck.HSK_1_V1: ["我"],
+                                              Deck.HSK_2_V1: []}))
+
+            self.assertEqual(list(manifest), ["hsk_1_v1"])
+            self.assertFalse(os.path.exists(os.path.join(d, "hsk_2_v1.apkg")))
+            self.assertTrue(os.path.exists(os.path.join(d, "hsk_1_v1.apkg")))
+            with open(os.path.join(d, "manifest.json")) as f:
+                self.assertEqual(json.load(f)["removed"], ["hsk_2_v1"])
+
+            # Only removed the once.
+            packager.write(_decks({Deck.HSK_1_V1: ["我"]}))
+            with open(os.path.join(d, "manifest.json")) as f:
+                self.assertEqual(json.load(f)["removed"], [])
+
+    def test_shard_by_hsk(self):
+        Deck = categorizer_lib.Deck
+        with tempfile.TemporaryDirectory() as d:
+            decks = {e: [] for e in Deck}
+            decks[Deck.HSK_1_V1] = ["我"]
+            manifest = sharding_lib.ShardedPackager(d, shard_by="hsk").write(
+                _decks(decks))
+            self.assertEqual(list(manifest), ["hsk_1"])
+
+
+if __name__ == "__main__":
+    absltest.main()
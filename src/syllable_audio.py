@@ -0,0 +1,136 @@
+from absl import logging
+from concurrent import futures
+from typing import Iterable, Optional, Text, Tuple
+import numpy as np
+import os
+import unicodedata
+import wave
+
+from src import card as card_lib
+from src import tts as tts_lib
+
+_CROSSFADE_SECS = 0.02
+# Combining marks, by tone. Unlike Tone.apply_to's, the third is a caron, not
+# a breve, since these are read rather than displayed.
+_TONE_MARKS = {
+    card_lib.Tone.FLAT: "\u0304",
+    card_lib.Tone.RISING: "\u0301",
+    card_lib.Tone.USHAPED: "\u030c",
+    card_lib.Tone.FALLING: "\u0300",
+}
+
+
+def _tone_marked(syllable: Text, tone: card_lib.Tone) -> Text:
+    """Turns ("xie", Tone.FALLING) into "xiè", marking the vowel pinyin does."""
+    mark = _TONE_MARKS.get(tone)
+    vowels = [i for i, c in enumerate(syllable) if c in "aeiouü"]
+    if mark is None or not vowels:
+        return syllable
+    # a or e if present, o in ou, else the last vowel.
+    idx = next((i for i in vowels if syllable[i] in "ae"), None)
+    if idx is None:
+        ou = syllable.find("ou")
+        idx = ou if ou >= 0 else vowels[-1]
+    return unicodedata.normalize(
+        "NFC", syllable[:idx + 1] + mark + syllable[idx + 1:])
+
+
+class SyllableBank():
+    """
+    A directory of WAV clips, one per (syllable, tone), rendered once by an
+    underlying TTS backend. The bank can be built once and shared by every
+    build on a machine.
+    """
+
+    def __init__(self, directory: Text, backend: tts_lib.Backend):
+        self._directory = directory
+        self._backend = backend
+        os.makedirs(self._directory, exist_ok=True)
+
+    def get(self, syllable: Text, tone: card_lib.Tone) -> Text:
+        """Returns the path of the clip, rendering it first if necessary."""
+        numbered = f"{syllable}{int(tone)}"
+        path = os.path.join(self._directory, f"{numbered}.wav")
+        if not os.path.exists(path):
+            # Tone-marked, e.g. "mā": engines read the digit of "ma1" aloud.
+            tts_lib.RenderTo(self._backend, _tone_marked(syllable, tone),
+                             numbered, path)
+        return path
+
+    def build(self,
+              pairs: Iterable[Tuple[Text, card_lib.Tone]],
+              max_workers: Optional[int] = None):
+        with futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for _ in executor.map(lambda p: self.get(*p), pairs):
+                pass
+
+
+def _read_wav(path: Text) -> Tuple[np.ndarray, Tuple[int, int, int]]:
+    with wave.open(path, "rb") as w:
+        params = (w.getnchannels(), w.getsampwidth(), w.getframerate())
+        if params[1] != 2:
+            raise ValueError(f"Expected 16-bit PCM in {path}, got {params}.")
+        samples = np.frombuffer(w.readframes(w.getnframes()), dtype="<i2")
+    return samples.reshape(-1, params[0]).astype(np.float32), params
+
+
+def Concatenate(clip_paths, output_path: Text,
+                crossfade_secs: float = _CROSSFADE_SECS):
+    """Joins 16-bit PCM WAV clips, overlapping neighbours by a linear crossfade."""
+    clips = []
+    params = None
+    for path in clip_paths:
+        samples, clip_params = _read_wav(path)
+        if params is not None and clip_params != params:
+            raise ValueError(
+                f"{path} has format {clip_params}, expected {params}.")
+        params = clip_params
+        clips.append(samples)
+    if not clips:
+        raise ValueError("Nothing to concatenate.")
+    channels, sampwidth, framerate = params
+
+    fade = int(crossfade_secs * framerate)
+    out = np.zeros((sum(len(c) for c in clips), channels), dtype=np.float32)
+    ramp = np.linspace(0.0, 1.0, fade, dtype=np.float32)[:, np.newaxis]
+    pos = 0
+    for i, clip in enumerate(clips):
+        n = min(fade, len(clip), pos) if i > 0 else 0
+        if n:
+            # Fade out what is already there while fading this clip in.
+            out[pos - n:pos] *= 1.0 - ramp[-n:]
+            out[pos - n:pos] += clip[:n] * ramp[-n:]
+            pos -= n
+        out[pos + n:pos + len(clip)] += clip[n:]
+        pos += len(clip)
+
+    pcm = np.clip(out[:pos], -32768, 32767).astype("<i2")
+    with wave.open(output_path, "wb") as w:
+        w.setnchannels(channels)
+        w.setsampwidth(sampwidth)
+        w.setframerate(framerate)
+        w.writeframes(pcm.tobytes())
+
+
+class SyllableBackend(tts_lib.Backend):
+    """
+    Assembles word audio from a SyllableBank instead of synthesizing each word,
+    so that only the ~1,300 (syllable, tone) pairs are ever rendered. The
+    syllables are joined as WAV, then encoded to the path's format.
+    """
+    name = "syllables"
+
+    def __init__(self, bank: SyllableBank, backend: tts_lib.Backend):
+        self._bank = bank
+        self.voice = f"{backend.name}/{backend.voice}"
+
+    def render(self, headword: Text, pinyin_str: Text, path: Text):
+        pairs = card_lib._to_syllablepairs(card_lib._sanitize_pinyin(pinyin_str))
+        if not pairs:
+            raise ValueError(f"No syllables in '{pinyin_str}' for {headword}.")
+        clips = [self._bank.get(s, t) for s, t in pairs]
+        tts_lib.WriteViaWav(lambda wav: Concatenate(clips, wav), path)
+        logging.info(f"Assembled {path} from {len(pairs)} syllables.")
+
+    def cache_text(self, headword: Text, pinyin_str: Text) -> Text:
+        return pinyin_str
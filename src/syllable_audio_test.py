@@ -0,0 +1,118 @@
+from src import card as card_lib
+from src import syllable_audio as syllable_audio_lib
+from src import tts as tts_lib
+
+import numpy as np
+import os
+import shutil
+import tempfile
+import wave
+from absl.testing import absltest
+from unittest import mock
+
+_RATE = 8000
+
+
+def _write_wav(path, samples):
+    with wave.open(path, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(_RATE)
+        w.writeframes(np.asarray(samples, dtype="<i2").tobytes())
+
+
+def _read_wav(path):
+    with wave.open(path, "rb") as w:
+        return np.frombuffer(w.readframes(w.getnframes()), dtype="<i2")
+
+
+class _ToneBackend(tts_lib.StubBackend):
+    # One tenth of a second of a constant level, which depends on the tone.
+    def render(self, headword, pinyin_str, path):
+        with self._lock:
+            self.rendered.append(headword)
+        _write_wav(path, [1000 * int(pinyin_str[-1])] * (_RATE // 10))
+
+
+def _encode_wav(wav, path):
+    # Stands in for ffmpeg; the test reads the result back as WAV.
+    with open(path, "wb") as out, open(wav, "rb") as f:
+        out.write(b"FLAC")
+        shutil.copyfileobj(f, out)
+
+
+def _read_encoded(path):
+    with open(path, "rb") as f:
+        if f.read(4) != b"FLAC":
+            raise ValueError(f"{path} wasn't encoded.")
+        with wave.open(f, "rb") as w:
+            return np.frombuffer(w.readframes(w.getnframes()), dtype="<i2")
+
+
+class SyllableAudioTest(absltest.TestCase):
+
+    def test_concatenate(self):
+        with tempfile.TemporaryDirectory() as d:
+            a, b, out = [os.path.join(d, f) for f in ["a.wav", "b.wav", "o.wav"]]
+            _write_wav(a, [100] * 800)
+            _write_wav(b, [300] * 800)
+            syllable_audio_lib.Concatenate([a, b], out, crossfade_secs=0.01)
+            samples = _read_wav(out)
+            # 80 samples of overlap.
+            self.assertLen(samples, 1600 - 80)
+            self.assertEqual(samples[0], 100)
+            self.assertEqual(samples[-1], 300)
+            self.assertTrue(np.all(np.diff(samples.astype(int)) >= 0))
+
+    def test_concatenate_rejects_mismatched_clips(self):
+        with tempfile.TemporaryDirectory() as d:
+            a, b = os.path.join(d, "a.wav"), os.path.join(d, "b.wav")
+            _write_wav(a, [0] * 10)
+            with wave.open(b, "wb") as w:
+                w.setnchannels(2)
+                w.setsampwidth(2)
+                w.setframerate(_RATE)
+                w.writeframes(b"\0" * 40)
+            with self.assertRaisesRegex(ValueError, ".*has format.*"):
+                syllable_audio_lib.Concatenate([a, b], os.path.join(d, "o.wav"))
+
+    def test_tone_marked(self):
+        for syllable, tone, expected in [
+                ("ma", card_lib.Tone.FLAT, "mā"),
+                ("xie", card_lib.Tone.FALLING, "xiè"),
+                ("gou", card_lib.Tone.USHAPED, "gǒu"),
+                ("gui", card_lib.Tone.RISING, "guí"),
+                ("lü", card_lib.Tone.FALLING, "lǜ"),
+                ("ma", card_lib.Tone.NEUTRAL, "ma")]:
+            self.assertEqual(
+                syllable_audio_lib._tone_marked(syllable, tone), expected)
+
+    @mock.patch.object(tts_lib, "EncodeWav", _encode_wav)
+    def test_backend_renders_each_syllable_once(self):
+        inner = _ToneBackend()
+        with tempfile.TemporaryDirectory() as bank_dir, tempfile.TemporaryDirectory() as media:
+            backend = syllable_audio_lib.SyllableBackend(
+                syllable_audio_lib.SyllableBank(bank_dir, inner), inner)
+            with tts_lib.RenderPool(backend, max_workers=2) as pool:
+                pool.submit(card_lib.Card("妈妈", "ma1ma5", ""), media)
+                pool.submit(card_lib.Card("马", "ma3", ""), media)
+                pool.submit(card_lib.Card("马上", "ma3shang4", ""), media)
+            # Spoken tone-marked, not with the digit.
+            self.assertCountEqual(set(inner.rendered),
+                                  ["mā", "ma", "mǎ", "shàng"])
+            self.assertCountEqual(
+                os.listdir(media),
+                ["ma1ma5.flac", "ma3.flac", "ma3shang4.flac"])
+            self.assertEqual(
+                _read_encoded(os.path.join(media, "ma3.flac"))[0], 3000)
+
+    def test_build(self):
+        inner = _ToneBackend()
+        with tempfile.TemporaryDirectory() as bank_dir:
+            bank = syllable_audio_lib.SyllableBank(bank_dir, inner)
+            bank.build([("ma", card_lib.Tone.FLAT), ("ma", card_lib.Tone.RISING)])
+            self.assertCountEqual(os.listdir(bank_dir), ["ma1.wav", "ma2.wav"])
+
+
+if __name__ == "__main__":
+    absltest.main()
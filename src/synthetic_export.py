@@ -0,0 +1,176 @@
+from typing import Iterator, List, Set, Text, Tuple
+import csv
+import random
+import unicodedata
+import xml.etree.ElementTree as ET
+
+from src import definitions
+from third_party import ids
+
+_HSK_CSV = "third_party/hsk_{}.csv"
+
+_GLOSSES = [
+    "carry out", "proceed", "black", "dark", "secret", "again", "once more",
+    "catch cold", "be interested in", "dial", "watch face", "advance",
+    "illegal", "wicked", "conduct", "march", "common cold", "like",
+]
+
+# Fraction of cards which are HSK words, single IDS characters, and
+# compounds of two characters; the rest are malformed entries.
+_HSK_SHARE = 0.3
+_CHARACTER_SHARE = 0.4
+_COMPOUND_SHARE = 0.29
+
+
+_INITIALS = ["zh", "ch", "sh", "b", "p", "m", "f", "d", "t", "n", "l", "g",
+             "k", "h", "j", "q", "x", "r", "z", "c", "s", "y", "w", ""]
+_FINALS = ["a", "o", "e", "i", "u", "v", "ai", "ei", "ao", "ou", "an", "en",
+           "ang", "eng", "ong", "er", "ia", "ie", "iao", "iu", "ian", "in",
+           "iang", "ing", "iong", "ua", "uo", "uai", "ui", "uan", "un", "uang",
+           "ve", "van", "vn", "ue"]
+# A superset of the valid syllables, with ü spelled v; enough to segment.
+_SYLLABLES = frozenset(i + f for i in _INITIALS for f in _FINALS)
+_TONE_MARKS = {"\u0304": 1, "\u0301": 2, "\u030c": 3, "\u0300": 4}
+
+
+def _segment(plain: Text) -> List[Tuple[int, int]]:
+    # Splits toneless pinyin into the fewest syllables, as (start, end) spans.
+    best = [None] * (len(plain) + 1)
+    best[0] = []
+    for end in range(1, len(plain) + 1):
+        for start in range(max(0, end - 6), end):
+            if best[start] is not None and plain[start:end] in _SYLLABLES:
+                if best[end] is None or len(best[start]) + 1 < len(best[end]):
+                    best[end] = best[start] + [(start, end)]
+    return best[-1] or [(0, len(plain))]
+
+
+def _numbered(syllables: Text) -> Text:
+    # HSK lists spell pinyin with tone marks, sometimes with words run
+    # together, e.g. "bàba". Pleco exports use tone numbers, "ba4ba5", and
+    # spell ü as it is: "nü3".
+    out = []
+    for chunk in syllables.lower().replace("｜", " ").split():
+        plain, tones = [], {}
+        for c in unicodedata.normalize("NFD", chunk):
+            if c in _TONE_MARKS:
+                tones[len(plain) - 1] = _TONE_MARKS[c]
+            elif c == "\u0308":
+                plain[-1] = "v"
+            elif "a" <= c <= "z":
+                plain.append(c)
+        plain = "".join(plain)
+        for start, end in _segment(plain):
+            tone = next((t for i, t in tones.items() if start <= i < end), 5)
+            out.append(plain[start:end].replace("v", "ü") + str(tone))
+    return "".join(out)
+
+
+def _hsk_words() -> List[Tuple[Text, Text]]:
+    words = []
+    for n in range(1, 7):
+        with open(_HSK_CSV.format(n), encoding="utf-8") as f:
+            for row in csv.reader(f):
+                headword = row[2].split("（")[0].split("(")[0].split("｜")[0]
+                pinyin = _numbered(row[3].split("｜")[0])
+                if headword and pinyin:
+                    words.append((headword, pinyin))
+    return words
+
+
+def _ids_characters() -> List[Text]:
+    chars = []
+    with open(ids.PATH_TO_IDS_TXT, encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("#") or line.startswith("﻿"):
+                continue
+            cols = line.split("\t")
+            if len(cols) >= 2 and len(cols[1]) == 1:
+                chars.append(cols[1])
+    return chars
+
+
+def _defn(rng: random.Random) -> Text:
+    # Shaped like Pleco's: a part of speech, then numbered senses, some
+    # tagged, sometimes a second part of speech on its own line.
+    lines = []
+    for _ in range(rng.choice([1, 1, 1, 2])):
+        num_senses = rng.choice([1, 1, 2, 3, 5])
+        senses = []
+        for i in range(1, num_senses + 1):
+            gloss = "; ".join(rng.sample(_GLOSSES, rng.randint(1, 3)))
+            if rng.random() < 0.1:
+                gloss = f"{rng.choice(definitions.DIALECT_TAGS)} {gloss}"
+            senses.append(f"{i} {gloss}" if num_senses > 1 else gloss)
+        lines.append(
+            f"{rng.choice(definitions.POS_LABELS)} {' '.join(senses)}")
+    return " \n".join(lines)
+
+
+def _entries(num_cards: int, seed: int) -> Iterator[Tuple[Text, Text, Text]]:
+    rng = random.Random(seed)
+    words = _hsk_words()
+    chars = _ids_characters()
+    syllables = sorted(set(
+        s for _, p in words for s in _split_syllables(p)))
+    seen: Set[Text] = set()
+    emitted = 0
+    while emitted < num_cards:
+        r = rng.random()
+        if r < _HSK_SHARE:
+            headword, pinyin = rng.choice(words)
+        elif r < _HSK_SHARE + _CHARACTER_SHARE:
+            headword, pinyin = rng.choice(chars), rng.choice(syllables)
+        elif r < _HSK_SHARE + _CHARACTER_SHARE + _COMPOUND_SHARE:
+            headword = rng.choice(chars) + rng.choice(chars)
+            pinyin = rng.choice(syllables) + rng.choice(syllables)
+        else:
+            # No pron, which ExtractCards rejects unless backfilled.
+            headword, pinyin = rng.choice(chars), None
+        if headword in seen:
+            continue
+        seen.add(headword)
+        emitted += 1
+        yield headword, pinyin, _defn(rng)
+
+
+def _split_syllables(pinyin: Text) -> List[Text]:
+    out, start = [], 0
+    for i, c in enumerate(pinyin):
+        if c.isdigit():
+            out.append(pinyin[start:i + 1])
+            start = i + 1
+    return out
+
+
+def Generate(num_cards: int, seed: int = 0) -> ET.ElementTree:
+    """
+    Returns a plecoflash export of |num_cards| cards with distinct headwords,
+    drawn from the HSK lists and from IDS characters. The same |seed| always
+    gives the same export.
+    """
+    root = ET.Element("plecoflash", {
+        "formatversion": "2", "creator": "Pleco User -1",
+        "generator": "Pleco 2.0 Flashcard Exporter", "platform": "Android",
+        "created": "1605883885",
+    })
+    ET.SubElement(root, "categories")
+    cards = ET.SubElement(root, "cards")
+    for i, (headword, pinyin, defn) in enumerate(_entries(num_cards, seed)):
+        card = ET.SubElement(cards, "card", {"language": "chinese"})
+        entry = ET.SubElement(card, "entry")
+        for charset in ["sc", "tc"]:
+            ET.SubElement(entry, "headword", {"charset": charset}).text = (
+                headword)
+        if pinyin is not None:
+            ET.SubElement(entry, "pron", {
+                "type": "hypy", "tones": "numbers"}).text = pinyin
+        ET.SubElement(entry, "defn").text = defn
+        ET.SubElement(card, "dictref", {
+            "dictid": "PACE", "entryid": str(17000000 + i)})
+    return ET.ElementTree(root)
+
+
+def Write(path: Text, num_cards: int, seed: int = 0):
+    Generate(num_cards, seed).write(path, encoding="utf-8",
+                                    xml_declaration=True)
@@ -0,0 +1,42 @@
+from src import card as card_lib
+from src import converter as converter_lib
+from src import synthetic_export
+
+import os
+import tempfile
+from absl.testing import absltest
+
+
+class SyntheticExportTest(absltest.TestCase):
+
+    def test_numbered(self):
+        self.assertEqual(synthetic_export._numbered("ài hào"), "ai4hao4")
+        self.assertEqual(synthetic_export._numbered("bàba"), "ba4ba5")
+        self.assertEqual(synthetic_export._numbered("zhōngguó"), "zhong1guo2")
+        self.assertEqual(synthetic_export._numbered("nǚ ér"), "nü3er2")
+
+    def test_reproducible_and_parseable(self):
+        with tempfile.TemporaryDirectory() as d:
+            a, b, c = (os.path.join(d, n) for n in ["a.xml", "b.xml", "c.xml"])
+            synthetic_export.Write(a, 300, seed=1)
+            synthetic_export.Write(b, 300, seed=1)
+            synthetic_export.Write(c, 300, seed=2)
+            with open(a, "rb") as fa, open(b, "rb") as fb, open(c, "rb") as fc:
+                contents = fa.read()
+                self.assertEqual(contents, fb.read())
+                self.assertNotEqual(contents, fc.read())
+            self.assertEqual(contents.count(b"<card "), 300)
+
+            cards = converter_lib.ExtractCards(a)
+            # A few entries are malformed on purpose, and rejected.
+            self.assertBetween(len(cards), 280, 299)
+            for card_obj in cards.cards():
+                # As sanitized, so ü survives.
+                self.assertEqual(card_lib._sanitize_pinyin(
+                    card_obj._pinyin_str), card_obj._pinyin_str)
+                self.assertTrue(card_obj._pinyin_html)
+                self.assertTrue(card_obj._defn_html)
+
+
+if __name__ == "__main__":
+    absltest.main()
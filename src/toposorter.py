@@ -1,5 +1,4 @@
-import networkx as nx
-from typing import List, Text, Callable
+from typing import Callable, Iterable, List, Text
 
 from src import card as card_lib
 from src import decomposer as decomposer_lib
@@ -8,6 +7,7 @@ from src import decomposer as decomposer_lib
 class Toposorter():
     def __init__(self, decomposer: decomposer_lib.Decomposer,
                  cards: List[card_lib.Card]):
+        import networkx as nx
         self._decomposer = decomposer
         self._G = nx.DiGraph()  # G.add_edge(part, whole)
 
@@ -20,6 +20,15 @@ class Toposorter():
         except nx.NetworkXNoCycle:
             pass
 
+    @classmethod
+    def from_headwords(cls, decomposer: decomposer_lib.Decomposer,
+                       headwords: Iterable[Text]) -> "Toposorter":
+        """As if constructed with a card for each of |headwords|."""
+        toposorter = cls(decomposer, [])
+        for headword in headwords:
+            toposorter._add(headword)
+        return toposorter
+
     def _add(self, headword):
         if len(headword) > 1:
             # many characters
@@ -42,6 +51,7 @@ class Toposorter():
                 pass
 
     def get_sorted(self, key: Callable[[Text], float] = None) -> List[Text]:
+        import networkx as nx
         return list(
             nx.algorithms.dag.lexicographical_topological_sort(
                 self._G, key))
@@ -18,6 +18,13 @@ class ToposorterTest(absltest.TestCase):
 
         decomposer.decompose.assert_not_called()
 
+    def test_from_headwords(self):
+        decomposer = MagicMock()
+        decomposer.decompose.side_effect = ValueError
+
+        ts = toposorter_lib.Toposorter.from_headwords(decomposer, ["我们", "我"])
+        self.assertEqual(ts.get_sorted(), ["们", "我", "我们"])
+
     def test_one_card_no_decompositions(self):
         decomposer = MagicMock()
         decomposer.decompose.return_value({"我", ValueError("")})
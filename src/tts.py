@@ -0,0 +1,260 @@
+from absl import logging
+from concurrent import futures
+from typing import Callable, Dict, List, Optional, Set, Text
+import abc
+import os
+import subprocess
+import threading
+
+from src import audio_cache as audio_cache_lib
+from src import media_index as media_index_lib
+from src import metrics as metrics_lib
+
+
+class Backend(abc.ABC):
+    """A text-to-speech engine which renders one headword to one audio file."""
+    name = "base"
+    voice = ""
+
+    @abc.abstractmethod
+    def render(self, headword: Text, pinyin_str: Text, path: Text):
+        """Writes |headword| spoken to |path|, encoded by its extension."""
+
+    def cache_text(self, headword: Text, pinyin_str: Text) -> Text:
+        # What the backend actually speaks, for keying the audio cache.
+        return headword
+
+
+def EncodeWav(wav: Text, path: Text):
+    """Encodes the WAV file |wav| to |path|, by its extension, with ffmpeg."""
+    subprocess.run(
+        ["ffmpeg", "-nostdin", "-y", "-loglevel", "error", "-i", wav, path],
+        capture_output=True, check=True)
+
+
+def WriteViaWav(write_wav: Callable[[Text], None], path: Text):
+    """
+    For engines which only write WAV: calls |write_wav| with a WAV path
+    beside |path|, then encodes it to |path|, unless |path| is a WAV itself.
+    """
+    wav = f"{os.path.splitext(path)[0]}.wav"
+    if wav == path:
+        write_wav(path)
+        return
+    try:
+        write_wav(wav)
+        EncodeWav(wav, path)
+    finally:
+        if os.path.exists(wav):
+            os.remove(wav)
+
+
+class SayBackend(Backend):
+    # macOS only.
+    name = "say"
+    voice = "Ting-Ting"
+
+    def render(self, headword: Text, pinyin_str: Text, path: Text):
+        args = ["/usr/bin/say", "-v", self.voice, headword, "-o", path]
+        if path.endswith(".wav"):
+            # say defaults to float samples in WAV, we want 16-bit PCM.
+            args += ["--file-format=WAVE", "--data-format=LEI16@22050"]
+        output = subprocess.run(args, capture_output=True, check=True)
+        logging.info("%s", output)
+
+
+class EspeakNgBackend(Backend):
+    # espeak-ng only writes WAV.
+    name = "espeak-ng"
+    voice = "cmn"
+
+    def render(self, headword: Text, pinyin_str: Text, path: Text):
+        def write_wav(wav: Text):
+            output = subprocess.run(
+                ["espeak-ng", "-v", self.voice, "-w", wav, headword],
+                capture_output=True, check=True)
+            logging.info("%s", output)
+
+        WriteViaWav(write_wav, path)
+
+
+class StubBackend(Backend):
+    # Writes the headword itself as the "audio", for tests and benchmarks.
+    name = "stub"
+    voice = "stub"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.rendered: List[Text] = []
+
+    def render(self, headword: Text, pinyin_str: Text, path: Text):
+        with open(path, "wb") as f:
+            f.write(headword.encode("utf-8"))
+        with self._lock:
+            self.rendered.append(headword)
+
+
+_BACKENDS = {
+    SayBackend.name: SayBackend,
+    EspeakNgBackend.name: EspeakNgBackend,
+    StubBackend.name: StubBackend,
+}
+
+
+def MakeBackend(name: Text) -> Backend:
+    if name not in _BACKENDS:
+        raise ValueError(
+            f"Unknown TTS backend '{name}', expected one of {sorted(_BACKENDS)}.")
+    return _BACKENDS[name]()
+
+
+def _partial_path(path: Text) -> Text:
+    # Unique per process and thread, since two workers, possibly in processes
+    # sharing the directory, may render the same path at once. Keep the
+    # extension, since some backends pick the format from it.
+    directory, filename = os.path.split(path)
+    return os.path.join(
+        directory,
+        f".partial-{os.getpid()}-{threading.get_ident()}-{filename}")
+
+
+def RenderTo(backend: Backend, headword: Text, pinyin_str: Text, path: Text):
+    # Render beside the destination and rename, so that an interrupted render
+    # never leaves a truncated file which later runs would skip.
+    partial = _partial_path(path)
+    try:
+        backend.render(headword, pinyin_str, partial)
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+
+
+class RenderPool():
+    """
+    Renders audio on a bounded pool of worker threads. The backends shell out
+    to a subprocess, so the threads run in parallel. submit() blocks once
+    |max_pending| renders are queued, so the caller cannot run arbitrarily far
+    ahead of the renderers.
+    """
+
+    def __init__(self,
+                 backend: Backend,
+                 max_workers: Optional[int] = None,
+                 max_pending: Optional[int] = None,
+                 cache: Optional[audio_cache_lib.AudioCache] = None,
+                 media_index: Optional[media_index_lib.MediaIndex] = None,
+                 metrics: Optional[metrics_lib.Metrics] = None,
+                 cache_variant: Text = "",
+                 store_renders: bool = True):
+        """
+        With |cache|, clips are looked up under |cache_variant|, which names
+        the processing they should have had. If |store_renders| is False,
+        new renders aren't stored in the cache; the caller processes them
+        and stores them under their unstored() keys.
+        """
+        self._backend = backend
+        self._cache = cache
+        self._cache_variant = cache_variant
+        self._store_renders = store_renders
+        # Path => cache key, of renders not stored in the cache.
+        self._unstored: Dict[Text, Text] = {}
+        self._cache_hit_paths: Set[Text] = set()
+        # If set, answers existence checks for its directory without a stat().
+        self._media_index = media_index
+        self._lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._metrics = metrics or metrics_lib.Metrics(enabled=False)
+        max_workers = max_workers or os.cpu_count() or 1
+        self._executor = futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="tts")
+        self._pending = threading.BoundedSemaphore(
+            max_pending or 4 * max_workers)
+        self._futures: Dict[Text, futures.Future] = {}
+
+    def __enter__(self) -> "RenderPool":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def submit(self, card_obj, directory: Text) -> Optional[futures.Future]:
+        path = os.path.join(directory, card_obj._filename)
+        # Homophones share a filename; render each file once.
+        if path in self._futures or self._exists(directory, card_obj._filename):
+            return None
+        self._pending.acquire()
+        try:
+            future = self._executor.submit(
+                self._metrics.timed("render_audio", self._render),
+                card_obj._headword, card_obj._pinyin_str, path)
+        except BaseException:
+            self._pending.release()
+            raise
+        future.add_done_callback(lambda _: self._pending.release())
+        self._futures[path] = future
+        return future
+
+    def _indexed(self, directory: Text) -> bool:
+        return (self._media_index is not None and
+                os.path.abspath(directory) ==
+                os.path.abspath(self._media_index.directory))
+
+    def _exists(self, directory: Text, filename: Text) -> bool:
+        if self._indexed(directory):
+            return self._media_index.exists(filename)
+        return os.path.exists(os.path.join(directory, filename))
+
+    def _render(self, headword: Text, pinyin_str: Text, path: Text):
+        if self._cache is None:
+            RenderTo(self._backend, headword, pinyin_str, path)
+        else:
+            key = audio_cache_lib.AudioCache.Key(
+                self._backend.name, self._backend.voice,
+                self._backend.cache_text(headword, pinyin_str),
+                os.path.splitext(path)[1], self._cache_variant)
+            if self._cache.fetch(key, path):
+                with self._lock:
+                    self.cache_hits += 1
+                    self._cache_hit_paths.add(path)
+            else:
+                RenderTo(self._backend, headword, pinyin_str, path)
+                if self._store_renders:
+                    self._cache.store(key, path)
+                with self._lock:
+                    self.cache_misses += 1
+                    if not self._store_renders:
+                        self._unstored[path] = key
+
+        directory, filename = os.path.split(path)
+        if self._indexed(directory):
+            self._media_index.add(filename)
+
+    def wait(self) -> List[Text]:
+        """Blocks until every submitted render is done, returns failed paths."""
+        failed = []
+        for path, future in self._futures.items():
+            e = future.exception()
+            if e is not None:
+                logging.warning(f"Failed to render {path}: {e}")
+                failed.append(path)
+        return failed
+
+    def rendered(self, include_cache_hits: bool = True) -> List[Text]:
+        """Returns the paths written so far by this pool."""
+        with self._lock:
+            hits = set() if include_cache_hits else set(self._cache_hit_paths)
+        return [path for path, future in self._futures.items()
+                if future.done() and future.exception() is None and
+                path not in hits]
+
+    def unstored(self) -> Dict[Text, Text]:
+        """With store_renders=False, each new render's path => cache key."""
+        with self._lock:
+            return dict(self._unstored)
+
+    def close(self) -> List[Text]:
+        failed = self.wait()
+        self._executor.shutdown()
+        return failed
@@ -0,0 +1,118 @@
+from src import card as card_lib
+from src import media_index as media_index_lib
+from src import tts as tts_lib
+
+import os
+import subprocess
+import tempfile
+import time
+from absl.testing import absltest
+from unittest import mock
+
+
+class _SlowBackend(tts_lib.StubBackend):
+    def __init__(self):
+        super().__init__()
+        self.concurrent = 0
+        self.max_concurrent = 0
+
+    def render(self, headword, pinyin_str, path):
+        with self._lock:
+            self.concurrent += 1
+            self.max_concurrent = max(self.max_concurrent, self.concurrent)
+        time.sleep(0.05)
+        super().render(headword, pinyin_str, path)
+        with self._lock:
+            self.concurrent -= 1
+
+
+class _FailingBackend(tts_lib.Backend):
+    def render(self, headword, pinyin_str, path):
+        with open(path, "wb") as f:
+            f.write(b"truncated")
+        raise OSError("no speech for you")
+
+
+class TtsTest(absltest.TestCase):
+
+    def test_make_backend(self):
+        self.assertIsInstance(tts_lib.MakeBackend("stub"), tts_lib.StubBackend)
+        self.assertIsInstance(tts_lib.MakeBackend("espeak-ng"),
+                              tts_lib.EspeakNgBackend)
+        with self.assertRaisesRegex(ValueError, ".*Unknown TTS backend.*"):
+            tts_lib.MakeBackend("foo")
+
+    def test_backend_is_abstract(self):
+        with self.assertRaises(TypeError):
+            tts_lib.Backend()
+
+    def test_espeak_ng_encodes_by_extension(self):
+        d = tempfile.mkdtemp()
+        path = os.path.join(d, "hei1.flac")
+        calls = []
+
+        def run(args, **kwargs):
+            calls.append(args[0])
+            # ffmpeg writes its last argument, espeak-ng its -w one.
+            out = args[-1]
+            if args[0] == "espeak-ng":
+                out = args[args.index("-w") + 1]
+            with open(out, "wb") as f:
+                f.write(args[0].encode("utf-8"))
+            return subprocess.CompletedProcess(args, 0)
+
+        with mock.patch.object(subprocess, "run", side_effect=run):
+            tts_lib.EspeakNgBackend().render("黑", "hei1", path)
+
+        self.assertEqual(calls, ["espeak-ng", "ffmpeg"])
+        self.assertEqual(os.listdir(d), ["hei1.flac"])
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), b"ffmpeg")
+
+    def test_render_pool(self):
+        backend = _SlowBackend()
+        cards = [card_lib.Card(f"字{i}", f"zi{i % 5}", "") for i in range(10)]
+        with tempfile.TemporaryDirectory() as d:
+            with open(os.path.join(d, "zi0.flac"), "w") as f:
+                f.write("already rendered")
+            with tts_lib.RenderPool(backend, max_workers=4) as pool:
+                for c in cards:
+                    pool.submit(c, d)
+            # zi0 already existed, and homophones render once.
+            self.assertCountEqual(backend.rendered,
+                                  [f"字{i}" for i in range(1, 5)])
+            self.assertGreater(backend.max_concurrent, 1)
+            self.assertLessEqual(backend.max_concurrent, 4)
+            self.assertCountEqual(
+                os.listdir(d), [f"zi{i}.flac" for i in range(5)])
+
+    def test_failed_render_leaves_nothing_behind(self):
+        with tempfile.TemporaryDirectory() as d:
+            pool = tts_lib.RenderPool(_FailingBackend(), max_workers=1)
+            pool.submit(card_lib.Card("字", "zi4", ""), d)
+            self.assertEqual(pool.close(), [os.path.join(d, "zi4.flac")])
+            self.assertEmpty(os.listdir(d))
+
+    def test_render_pool_with_media_index(self):
+        backend = tts_lib.StubBackend()
+        with tempfile.TemporaryDirectory() as d:
+            with open(os.path.join(d, "zi0.flac"), "w") as f:
+                f.write("already rendered")
+            index = media_index_lib.MediaIndex(d)
+            with tts_lib.RenderPool(backend, media_index=index) as pool:
+                pool.submit(card_lib.Card("字", "zi0", ""), d)
+                pool.submit(card_lib.Card("字", "zi1", ""), d)
+            self.assertEqual(backend.rendered, ["字"])
+            self.assertIn("zi1.flac", index)
+
+    def test_write_soundfile(self):
+        backend = tts_lib.StubBackend()
+        with tempfile.TemporaryDirectory() as d:
+            card_lib.Card("字", "zi4", "").WriteSoundfile(d, backend)
+            card_lib.Card("自", "zi4", "").WriteSoundfile(d, backend)
+            self.assertEqual(backend.rendered, ["字"])
+            self.assertEqual(os.listdir(d), ["zi4.flac"])
+
+
+if __name__ == "__main__":
+    absltest.main()
@@ -0,0 +1,175 @@
+from absl import logging
+from typing import Dict, Iterator, List, Optional, Text, Tuple
+import ctypes
+import ctypes.util
+import fnmatch
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+# From <sys/inotify.h>.
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_Q_OVERFLOW = 0x00004000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+# struct inotify_event: wd, mask, cookie, len, then |len| bytes of name.
+_EVENT = struct.Struct("iIII")
+
+
+def _inotify_fd(directory: Text) -> Optional[int]:
+    # A non-blocking inotify descriptor watching |directory| for files
+    # finished being written or moved in, or None where that's unavailable.
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6",
+                           use_errno=True)
+        fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    if libc.inotify_add_watch(fd, os.fsencode(directory),
+                              _IN_CLOSE_WRITE | _IN_MOVED_TO) < 0:
+        logging.warning(f"inotify_add_watch({directory}) failed: "
+                        f"{os.strerror(ctypes.get_errno())}")
+        os.close(fd)
+        return None
+    return fd
+
+
+class ExportWatcher():
+    """
+    Reports files matching |pattern| as they land in |directory|, e.g. Pleco
+    exports saved or synced there.
+
+    Uses inotify where available, reporting a file once it is closed after
+    writing or renamed into place. Otherwise polls every |poll_secs| and
+    reports a file once its size and mtime held still across two polls, so
+    that a half-written export isn't picked up. Either way, a file written
+    again is reported again.
+
+    Files already there when watching starts are reported first only if
+    |include_existing|.
+    """
+
+    def __init__(self,
+                 directory: Text,
+                 pattern: Text = "flash-*.xml",
+                 poll_secs: float = 1.0,
+                 include_existing: bool = False,
+                 use_inotify: bool = True):
+        self._directory = directory
+        self._pattern = pattern
+        self._poll_secs = poll_secs
+        self._fd = _inotify_fd(directory) if use_inotify else None
+        logging.info(f"Watching {directory} for {pattern} by "
+                     f"{'inotify' if self._fd is not None else 'polling'}.")
+        # filename => (size, mtime_ns) when last listed.
+        self._listed = self._list()
+        # filename => (size, mtime_ns) when last reported.
+        self._reported = dict(self._listed)
+        self._backlog = sorted(self._listed) if include_existing else []
+
+    @property
+    def uses_inotify(self) -> bool:
+        return self._fd is not None
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self) -> "ExportWatcher":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _list(self) -> Dict[Text, Tuple[int, int]]:
+        listed = {}
+        with os.scandir(self._directory) as it:
+            for e in it:
+                if not fnmatch.fnmatch(e.name, self._pattern):
+                    continue
+                try:
+                    st = e.stat()
+                except FileNotFoundError:
+                    continue
+                if e.is_file():
+                    listed[e.name] = (st.st_size, st.st_mtime_ns)
+        return listed
+
+    def _poll(self) -> List[Text]:
+        # Files whose signature held since the last poll and which changed
+        # since they were last reported.
+        listed = self._list()
+        ready = sorted(
+            name for name, sig in listed.items()
+            if self._listed.get(name) == sig and
+            self._reported.get(name) != sig)
+        self._listed = listed
+        for name in ready:
+            self._reported[name] = listed[name]
+        return ready
+
+    def _read_events(self) -> List[Text]:
+        names: List[Text] = []
+        try:
+            buf = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return names
+        i = 0
+        while i + _EVENT.size <= len(buf):
+            _, mask, _, length = _EVENT.unpack_from(buf, i)
+            i += _EVENT.size
+            name = os.fsdecode(buf[i:i + length].rstrip(b"\0"))
+            i += length
+            if mask & _IN_Q_OVERFLOW:
+                # Events were dropped; fall back on a listing.
+                logging.warning("inotify queue overflowed; relisting.")
+                names.extend(n for n, sig in self._list().items()
+                             if self._reported.get(n) != sig)
+            elif fnmatch.fnmatch(name, self._pattern) and name not in names:
+                names.append(name)
+        ready = []
+        for name in names:
+            try:
+                st = os.stat(os.path.join(self._directory, name))
+            except FileNotFoundError:
+                continue
+            self._reported[name] = (st.st_size, st.st_mtime_ns)
+            ready.append(name)
+        return ready
+
+    def wait(self, timeout: Optional[float] = None) -> List[Text]:
+        """
+        Returns the paths of files which landed since the last call, waiting
+        up to |timeout| seconds, or indefinitely, for at least one.
+        """
+        if self._backlog:
+            ready, self._backlog = self._backlog, []
+            return [os.path.join(self._directory, n) for n in ready]
+        waited = 0.0
+        while True:
+            step = self._poll_secs
+            if timeout is not None:
+                step = min(step, max(0.0, timeout - waited))
+            if self._fd is not None:
+                readable, _, _ = select.select([self._fd], [], [], step)
+                ready = self._read_events() if readable else []
+            else:
+                time.sleep(step)
+                ready = self._poll()
+            waited += step
+            if ready or (timeout is not None and waited >= timeout):
+                return [os.path.join(self._directory, n) for n in ready]
+
+    def watch(self, stop: Optional[threading.Event] = None) -> Iterator[Text]:
+        """Yields the path of each file as it lands, until |stop| is set."""
+        while stop is None or not stop.is_set():
+            yield from self.wait(timeout=self._poll_secs)
@@ -0,0 +1,78 @@
+from src import watcher as watcher_lib
+
+import os
+import tempfile
+import threading
+from absl.testing import absltest
+
+
+def _write(path, contents=b"<plecoflash/>"):
+    with open(path, "wb") as f:
+        f.write(contents)
+
+
+class ExportWatcherTest(absltest.TestCase):
+
+    def _check_reports_new_exports(self, use_inotify):
+        with tempfile.TemporaryDirectory() as d:
+            _write(os.path.join(d, "flash-old.xml"))
+            with watcher_lib.ExportWatcher(
+                    d, poll_secs=0.05, use_inotify=use_inotify) as watcher:
+                self.assertEqual(watcher.wait(timeout=0.2), [])
+
+                _write(os.path.join(d, "flash-new.xml"))
+                _write(os.path.join(d, "notes.txt"))
+                self.assertEqual(watcher.wait(timeout=5),
+                                 [os.path.join(d, "flash-new.xml")])
+                self.assertEqual(watcher.wait(timeout=0.2), [])
+
+                # Renamed into place, as sync clients do.
+                _write(os.path.join(d, ".partial"))
+                os.rename(os.path.join(d, ".partial"),
+                          os.path.join(d, "flash-moved.xml"))
+                self.assertEqual(watcher.wait(timeout=5),
+                                 [os.path.join(d, "flash-moved.xml")])
+
+                # Written again.
+                _write(os.path.join(d, "flash-new.xml"), b"<plecoflash />")
+                self.assertEqual(watcher.wait(timeout=5),
+                                 [os.path.join(d, "flash-new.xml")])
+
+    def test_polling(self):
+        self._check_reports_new_exports(use_inotify=False)
+
+    def test_inotify(self):
+        with tempfile.TemporaryDirectory() as d:
+            with watcher_lib.ExportWatcher(d) as watcher:
+                if not watcher.uses_inotify:
+                    self.skipTest("inotify is unavailable.")
+        self._check_reports_new_exports(use_inotify=True)
+
+    def test_include_existing(self):
+        with tempfile.TemporaryDirectory() as d:
+            _write(os.path.join(d, "flash-b.xml"))
+            _write(os.path.join(d, "flash-a.xml"))
+            with watcher_lib.ExportWatcher(
+                    d, poll_secs=0.05, include_existing=True,
+                    use_inotify=False) as watcher:
+                self.assertEqual(watcher.wait(timeout=0.2), [
+                    os.path.join(d, "flash-a.xml"),
+                    os.path.join(d, "flash-b.xml"),
+                ])
+                self.assertEqual(watcher.wait(timeout=0.2), [])
+
+    def test_watch_until_stopped(self):
+        with tempfile.TemporaryDirectory() as d:
+            stop = threading.Event()
+            seen = []
+            with watcher_lib.ExportWatcher(
+                    d, poll_secs=0.05, use_inotify=False) as watcher:
+                _write(os.path.join(d, "flash-a.xml"))
+                for path in watcher.watch(stop):
+                    seen.append(path)
+                    stop.set()
+            self.assertEqual(seen, [os.path.join(d, "flash-a.xml")])
+
+
+if __name__ == "__main__":
+    absltest.main()
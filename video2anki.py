@@ -16,6 +16,10 @@ import pinyin
 import csv
 # 09
 import sox
+# 09b
+from src import audio_post as audio_post_lib
+# 10
+from src import media_index as media_index_lib
 
 FLAGS = flags.FLAGS
 flags.DEFINE_string("video", None,
@@ -24,6 +28,10 @@ flags.DEFINE_string("anki_collection", None,
                     "Full path to Anki collection.media")
 flags.DEFINE_string("output_csv_dir", None,
                     "Directory in which to write output csv")
+flags.DEFINE_enum("audio_format", "flac", ["flac", "ogg"],
+                  "Format of the audio clips written to the Anki collection.")
+flags.DEFINE_float("target_lufs", -16.0,
+                   "Integrated loudness to normalize audio clips to.")
 flags.DEFINE_string(
     "crop_command", "in_w:in_h/3:0:1.9*in_h/3",
     "The crop syntax to use to extract the bottom part of the video, which contains the subtitles."
@@ -260,9 +268,12 @@ def main(argv):
     logging.info("09 [Audio slice]")
     audio_dir = os.path.join(tmpdir, "09_audio_slices")
     os.makedirs(audio_dir, exist_ok=True)
+    audio_dir_index = media_index_lib.MediaIndex(audio_dir)
+    audio_ext = f".{FLAGS.audio_format}"
+    new_slices = []
     for [i, start_sec, end_sec, _] in scenes_deduped_list:
         output_trimmed_audio_path = os.path.join(audio_dir, f"{i}.flac")
-        if os.path.exists(output_trimmed_audio_path):
+        if audio_dir_index.exists(f"{i}{audio_ext}"):
             logging.warning(
                 f"09 [Audio slice] Output trimmed path {output_trimmed_audio_path} already exists, not writing."
             )
@@ -273,30 +284,42 @@ def main(argv):
             tfm.compand()
             success = tfm.build_file(output_flac_path,
                                      output_trimmed_audio_path)
+            new_slices.append(output_trimmed_audio_path)
             logging.info(f"09 [Audio slice] Wrote {i}: {success}")
 
+    logging.info("09b [Audio post]")
+    audio_post_lib.AudioPostProcessor(
+        os.path.join(tmpdir, "09b_audio_post.json"),
+        target_lufs=FLAGS.target_lufs).process(new_slices, extension=audio_ext)
+
     # 10. Write audio to Anki collection.
     logging.info("10 [Write to Anki]")
+    # collection.media can hold 100k+ files, often on slow storage. List it once
+    # rather than stat()ing every destination.
+    anki_collection_index = media_index_lib.MediaIndex(FLAGS.anki_collection)
     for (_, _, files) in os.walk(audio_dir):
         files.sort()
         for file in files:
+            if os.path.splitext(file)[1] != audio_ext:
+                continue
             scene_num = int(os.path.splitext(os.path.basename(file))[0])
-            dest_file = os.path.join(FLAGS.anki_collection,
-                                     f"{yt.video_id}-{scene_num:04}.flac")
-            if os.path.exists(dest_file):
+            dest_name = f"{yt.video_id}-{scene_num:04}{audio_ext}"
+            dest_file = os.path.join(FLAGS.anki_collection, dest_name)
+            if anki_collection_index.exists(dest_name):
                 logging.warning(
                     f"10 [Write to Anki] Not writing {dest_file}, already exists..."
                 )
             else:
                 copy_cmd = f'cp "{os.path.join(audio_dir, file)}" "{dest_file}"'
                 subprocess.call(copy_cmd, shell=True)
+                anki_collection_index.add(dest_name)
                 logging.info(f"10 [Write to Anki] Wrote to {dest_file}.")
 
     logging.info("11 [Write output csv]")
     # format: [sound:filepath.flac];hanzi;pinyin;sourceurl
     output_csv_rows = []
     for scene_num, _, _, _ in scenes_deduped_list:
-        ankifile = f"{yt.video_id}-{scene_num:04}.flac"
+        ankifile = f"{yt.video_id}-{scene_num:04}{audio_ext}"
         hanzi_txt = hanzi_by_scenenum[scene_num]
         pinyin_txt = pinyin_by_scenenum[scene_num]
         if hanzi_txt == "" or pinyin_txt == "":